@@ -0,0 +1,115 @@
+"""
+KONTAX - Analítica de cartera: agregaciones cross-entidad sobre el espejo columnar
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.analitica_service import AnaliticaService, leer_manifiesto
+from app.tasks.mantenimiento import refrescar_espejo_analitico
+from app.api.deps import require_admin
+
+router = APIRouter()
+
+# Período mensual YYYY-MM
+PATRON_MES = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+class AnaliticaResponse(BaseModel):
+    actualizado_al: str
+    items: List[Dict[str, Any]]
+
+
+def _analitica() -> AnaliticaService:
+    try:
+        return AnaliticaService()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/estado")
+async def estado_espejo(current_user=Depends(require_admin)):
+    """Estado del espejo columnar: marca del último refresco, base y deltas"""
+    manifiesto = leer_manifiesto()
+    if manifiesto is None:
+        return {"habilitada": settings.ANALITICA_HABILITADA, "construido": False}
+    return {
+        "habilitada": settings.ANALITICA_HABILITADA,
+        "construido": True,
+        "actualizado_al": manifiesto["marca"],
+        "reconstruido": manifiesto.get("reconstruido"),
+        "base": manifiesto["base"],
+        "deltas": len(manifiesto["deltas"]),
+    }
+
+
+@router.post("/refrescar", status_code=202)
+async def refrescar_espejo(
+    reconstruir: bool = False,
+    current_user=Depends(require_admin),
+):
+    """
+    Encolar un refresco del espejo (delta por updated_at) o, con
+    reconstruir, una copia completa desde todos los shards.
+    """
+    if not settings.ANALITICA_HABILITADA:
+        raise HTTPException(status_code=400, detail="Modo analítico deshabilitado")
+    refrescar_espejo_analitico.apply_async(kwargs={"reconstruir": reconstruir}, queue="importaciones")
+    return {"reconstruir": reconstruir, "status": "processing"}
+
+
+@router.get("/sectores", response_model=AnaliticaResponse)
+async def totales_por_sector(
+    periodo: str,
+    estado: str = "validado",
+    current_user=Depends(require_admin),
+):
+    """
+    Totales de la cartera por sector e intensidad de emisiones
+    (tCO2e por millón CLP de ventas anuales).
+
+    Períodos: YYYY-MM, YYYY-Qn o YYYY.
+    """
+    analitica = _analitica()
+    try:
+        items = analitica.sectores(periodo, estado)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AnaliticaResponse(actualizado_al=analitica.actualizado_al, items=items)
+
+
+@router.get("/tendencia", response_model=AnaliticaResponse)
+async def tendencia_cartera(
+    desde: str = Query(..., regex=PATRON_MES),
+    hasta: str = Query(..., regex=PATRON_MES),
+    sector: Optional[str] = None,
+    categoria: Optional[str] = None,
+    estado: str = "validado",
+    current_user=Depends(require_admin),
+):
+    """Serie mensual de emisiones, alcances y energía de la cartera (filtrable por sector/categoría)"""
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="desde posterior a hasta")
+    analitica = _analitica()
+    return AnaliticaResponse(
+        actualizado_al=analitica.actualizado_al,
+        items=analitica.tendencia(desde, hasta, sector, categoria, estado),
+    )
+
+
+@router.get("/intensidad", response_model=AnaliticaResponse)
+async def ranking_intensidad(
+    periodo: str,
+    sector: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    estado: str = "validado",
+    current_user=Depends(require_admin),
+):
+    """Entidades más intensivas en emisiones por millón CLP de ventas anuales"""
+    analitica = _analitica()
+    try:
+        items = analitica.intensidad(periodo, sector, limit, estado)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AnaliticaResponse(actualizado_al=analitica.actualizado_al, items=items)
@@ -1,21 +1,47 @@
 """
 Asientos Verdes Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from typing import List, Optional
+from sqlalchemy import extract
+from sqlalchemy.exc import DataError, IntegrityError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 from datetime import datetime
+import logging
+import uuid
 
-from app.core.database import get_db
+from app.config import settings
+from app.core.database import get_db, get_read_db
+from app.core.sharding import (
+    agrupar_por_shard,
+    buscar_en_shards,
+    datos_entidad,
+    get_entity_read_db,
+    read_sessionmaker_entidad,
+    sesion_shard,
+    ubicar_varias,
+)
+from app.core.pagination import NEXT_CURSOR_HEADER, keyset_page
+from app.integrations.minio_client import MinioClient
 from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.importacion_asientos import ImportacionAsientos
 from app.schemas.asiento_verde import (
     AsientoVerde,
     AsientoVerdeCreate,
     AsientoVerdeList
 )
-from app.api.deps import get_current_user
+from app.services.asiento_bulk_service import AsientoBulkService
+from app.services.exportacion_service import FORMATOS_EXPORTACION, HAS_PYARROW, ExportacionService
+from app.services.importacion_service import FORMATOS_IMPORTACION
+from app.services.reporte_service import expandir_periodo
+from app.services.rollup_service import RollupService
+from app.tasks.importaciones import encolar_importacion
+from app.api.deps import get_current_user, require_contador
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -39,7 +65,7 @@ async def create_asiento_verde(
     # Calcular perÃ­odo YYYY-MM
     periodo = asiento_data.fecha.strftime("%Y-%m")
     
-    # Crear asiento
+    # Crear asiento (en el shard de la entidad)
     db_asiento = AsientoModel(
         **asiento_data.model_dump(),
         periodo=periodo,
@@ -47,24 +73,245 @@ async def create_asiento_verde(
         estado="confirmado"
     )
     
-    db.add(db_asiento)
-    db.commit()
-    db.refresh(db_asiento)
+    with datos_entidad(db, asiento_data.entity_id, escritura=True) as shard_db:
+        shard_db.add(db_asiento)
+        shard_db.commit()
+        shard_db.refresh(db_asiento)
     
     return db_asiento
 
 
-@router.get("/", response_model=AsientoVerdeList)
+# Máximo de asientos por llamada bulk
+MAX_BULK_ASIENTOS = 50_000
+
+_asientos_adapter = TypeAdapter(List[AsientoVerdeCreate])
+
+
+class AsientoBulkResultado(BaseModel):
+    indice: int
+    ok: bool
+    id: Optional[UUID] = None
+    errores: List[str] = []
+
+
+class AsientoBulkResponse(BaseModel):
+    recibidos: int
+    creados: int
+    rechazados: int
+    resultados: List[AsientoBulkResultado]
+
+
+@router.post("/bulk", response_model=AsientoBulkResponse, status_code=201)
+async def create_asientos_bulk(
+    items: List[Dict[str, Any]] = Body(..., max_length=MAX_BULK_ASIENTOS),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Crear asientos verdes en lote (conectores ERP)
+
+    Valida todo el lote de una vez; los items inválidos, de entidades no
+    autorizadas o con FKs inexistentes se rechazan con su error y el resto
+    se inserta en una sola transacción por shard (INSERT multi-fila). Si
+    la transacción de un shard falla, sus items se informan con error y
+    los demás shards siguen: nunca se responde error con parte del lote
+    ya commiteada. Resultado por item en el orden recibido.
+    """
+    errores: Dict[int, List[str]] = {}
+    try:
+        validos = list(enumerate(_asientos_adapter.validate_python(items)))
+    except ValidationError as e:
+        for err in e.errors():
+            campo = ".".join(str(loc) for loc in err["loc"][1:])
+            errores.setdefault(err["loc"][0], []).append(f"{campo}: {err['msg']}" if campo else err["msg"])
+        validos = [
+            (i, AsientoVerdeCreate.model_validate(item))
+            for i, item in enumerate(items)
+            if i not in errores
+        ]
+
+    # Permiso por entidad: una vez por lote
+    if current_user.rol != "admin":
+        no_autorizadas = {a.entity_id for _, a in validos} - {current_user.entity_id}
+        for i, asiento in validos:
+            if asiento.entity_id in no_autorizadas:
+                errores[i] = ["No autorizado para la entidad"]
+        validos = [(i, a) for i, a in validos if i not in errores]
+
+    # Entidades en corte de migración de shard: reintentar esos items
+    ubicaciones = ubicar_varias({a.entity_id for _, a in validos})
+    for i, asiento in validos:
+        if ubicaciones[asiento.entity_id][1] == "bloqueado":
+            errores[i] = ["Entidad en migración de shard, reintentar"]
+    validos = [(i, a) for i, a in validos if i not in errores]
+
+    ids = []
+    for shard, entity_ids in agrupar_por_shard({a.entity_id for _, a in validos}).items():
+        entidades = set(entity_ids)
+        lote = [(i, a) for i, a in validos if a.entity_id in entidades]
+        with sesion_shard(db, shard) as shard_db:
+            service = AsientoBulkService(shard_db)
+            filas = [(i, asiento.model_dump()) for i, asiento in lote]
+            for j, errs in service.validar_fks([fila for _, fila in filas]).items():
+                errores[filas[j][0]] = errs
+            filas = [(i, fila) for i, fila in filas if i not in errores]
+            if not filas:
+                continue
+            try:
+                lote_ids = service.insertar(
+                    [fila for _, fila in filas],
+                    creado_por=current_user.email,
+                )
+                shard_db.commit()
+            except (IntegrityError, DataError) as e:
+                shard_db.rollback()
+                logger.warning(f"Bulk asientos: lote del shard {shard} rechazado: {e.orig}")
+                for i, _ in filas:
+                    errores[i] = [f"Error insertando lote: {e.orig}"]
+                continue
+        ids.extend(zip((i for i, _ in filas), lote_ids))
+
+    resultados = [
+        AsientoBulkResultado(indice=i, ok=False, errores=errs)
+        for i, errs in errores.items()
+    ]
+    resultados.extend(
+        AsientoBulkResultado(indice=i, ok=True, id=id_)
+        for i, id_ in ids
+    )
+    resultados.sort(key=lambda r: r.indice)
+
+    return AsientoBulkResponse(
+        recibidos=len(items),
+        creados=len(ids),
+        rechazados=len(errores),
+        resultados=resultados,
+    )
+
+
+class ImportacionResponse(BaseModel):
+    id: UUID
+    entity_id: UUID
+    formato: str
+    archivo_nombre: Optional[str] = None
+    estado: str
+    filas_procesadas: int = 0
+    filas_cargadas: int = 0
+    filas_rechazadas: int = 0
+    errores_json: List[dict] = []
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    completado_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+@router.post("/import", response_model=ImportacionResponse, status_code=202)
+async def importar_asientos_archivo(
+    entity_id: UUID = Form(...),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_contador)
+):
+    """
+    Importar libro histórico de asientos (CSV o Parquet)
+
+    Encabezados = columnas de asientos_verdes (fecha, tipo, categoria,
+    descripcion, cantidad_fisica, unidad_fisica obligatorias). El archivo
+    se sube en partes a MinIO y un worker lo carga por lotes con COPY;
+    seguir el avance en GET /asientos/import/{id}.
+    """
+    if current_user.rol != "admin" and current_user.entity_id != entity_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    formato = (file.filename or "").rsplit(".", 1)[-1].lower()
+    if formato not in FORMATOS_IMPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Válidos: {FORMATOS_IMPORTACION}")
+
+    importacion_id = uuid.uuid4()
+    job = ImportacionAsientos(
+        id=importacion_id,
+        entity_id=entity_id,
+        formato=formato,
+        archivo_nombre=file.filename,
+        objeto_key=f"{entity_id}/{importacion_id}.{formato}",
+        estado="pendiente",
+        creado_por=current_user.email,
+    )
+
+    # UploadFile ya está en un temporal: se sube por partes sin leerlo completo
+    MinioClient().subir_stream(settings.MINIO_BUCKET_IMPORTACIONES, job.objeto_key, file.file)
+
+    with datos_entidad(db, entity_id, escritura=True) as shard_db:
+        shard_db.add(job)
+        shard_db.commit()
+        shard_db.refresh(job)
+    encolar_importacion(job)
+    return job
+
+
+@router.get("/import/{importacion_id}", response_model=ImportacionResponse)
+async def get_importacion(
+    importacion_id: UUID,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """Estado y avance de una importación"""
+    job = buscar_en_shards(
+        lambda shard_db: shard_db.query(ImportacionAsientos).filter(ImportacionAsientos.id == importacion_id).first(),
+        entity_id=current_user.entity_id if current_user.rol != "admin" else None,
+        db=db,
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    if current_user.rol != "admin" and current_user.entity_id != job.entity_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return job
+
+
+@router.post("/import/{importacion_id}/reanudar", response_model=ImportacionResponse, status_code=202)
+async def reanudar_importacion(
+    importacion_id: UUID,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_contador)
+):
+    """Reanudar una importación en error desde el último lote confirmado"""
+    job = buscar_en_shards(
+        lambda shard_db: shard_db.query(ImportacionAsientos).filter(ImportacionAsientos.id == importacion_id).first(),
+        entity_id=current_user.entity_id if current_user.rol != "admin" else None,
+        db=db,
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    if current_user.rol != "admin" and current_user.entity_id != job.entity_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if job.estado == "completo":
+        raise HTTPException(status_code=409, detail="La importación ya está completa")
+
+    encolar_importacion(job)
+    return job
+
+
+class AsientoVerdePage(AsientoVerdeList):
+    total: Optional[int] = None  # None si no se pidió (incluir_total=false)
+    pages: Optional[int] = None
+
+
+@router.get("/", response_model=AsientoVerdePage)
 async def list_asientos_verdes(
     entity_id: UUID,
+    response: Response,
     periodo: Optional[str] = Query(None, regex=r"^\d{4}-\d{2}$"),
     fecha_desde: Optional[datetime] = None,
     fecha_hasta: Optional[datetime] = None,
     categoria: Optional[str] = None,
     tipo: Optional[str] = None,
+    cursor: Optional[str] = None,
+    incluir_total: bool = True,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_entity_read_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -75,6 +322,11 @@ async def list_asientos_verdes(
     - fecha_desde / fecha_hasta: Rango fechas
     - categoria: energia, combustible, agua, etc
     - tipo: consumo_energia, transporte, etc
+    
+    Paginación por cursor: seguir el header X-Next-Cursor en ?cursor=
+    (orden fecha, id descendente; sin header = última página). page > 1 sin cursor usa OFFSET (obsoleto, lento en
+    páginas profundas). El total sale del rollup si solo se filtra por
+    período/categoría; con incluir_total=false no se calcula.
     """
     # Verificar permiso
     if current_user.rol != "admin" and current_user.entity_id != entity_id:
@@ -102,22 +354,93 @@ async def list_asientos_verdes(
     if tipo:
         query = query.filter(AsientoModel.tipo == tipo)
     
-    # Total count
-    total = query.count()
+    # Total: rollup si los filtros lo permiten, COUNT solo si se pide
+    total = None
+    if not (fecha_desde or fecha_hasta or tipo):
+        total = RollupService(db).contar(entity_id, "confirmado", periodo=periodo, categoria=categoria)
+    elif incluir_total:
+        total = query.count()
     
     # PaginaciÃ³n
-    skip = (page - 1) * page_size
-    items = query.order_by(AsientoModel.fecha.desc()).offset(skip).limit(page_size).all()
-    
-    # Calcular pÃ¡ginas
-    pages = (total + page_size - 1) // page_size
+    next_cursor = None
+    if cursor or page == 1:
+        try:
+            items, next_cursor = keyset_page(query, AsientoModel.fecha, AsientoModel.id, cursor, page_size)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        skip = (page - 1) * page_size
+        items = (
+            query.order_by(AsientoModel.fecha.desc(), AsientoModel.id.desc())
+            .offset(skip)
+            .limit(page_size)
+            .all()
+        )
     
-    return AsientoVerdeList(
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return AsientoVerdePage(
         items=items,
         total=total,
         page=page,
         page_size=page_size,
-        pages=pages
+        pages=(total + page_size - 1) // page_size if total is not None else None,
+    )
+
+
+@router.get("/export")
+async def export_asientos(
+    entity_id: UUID,
+    request: Request,
+    formato: str = "csv",
+    periodo: Optional[str] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    categoria: Optional[str] = None,
+    tipo: Optional[str] = None,
+    estado: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    Exportar libro de asientos filtrado (CSV, NDJSON o Parquet)
+
+    - periodo: YYYY-MM, YYYY-Qn o YYYY
+    - estado: por defecto confirmados y validados
+
+    Se transmite mientras se lee (cursor del servidor): memoria constante
+    aunque el período tenga millones de asientos.
+    """
+    if current_user.rol != "admin" and current_user.entity_id != entity_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Válidos: {list(FORMATOS_EXPORTACION)}")
+    if formato == "parquet" and not HAS_PYARROW:
+        raise HTTPException(status_code=400, detail="Exportación Parquet requiere pyarrow")
+
+    filtros = [AsientoModel.entity_id == entity_id]
+    if periodo:
+        try:
+            filtros.append(AsientoModel.periodo.in_(expandir_periodo(periodo)))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if fecha_desde:
+        filtros.append(AsientoModel.fecha >= fecha_desde)
+    if fecha_hasta:
+        filtros.append(AsientoModel.fecha <= fecha_hasta)
+    if categoria:
+        filtros.append(AsientoModel.categoria == categoria)
+    if tipo:
+        filtros.append(AsientoModel.tipo == tipo)
+    if estado:
+        filtros.append(AsientoModel.estado == estado)
+    else:
+        filtros.append(AsientoModel.estado.in_(["confirmado", "validado"]))
+
+    nombre = f"asientos_{entity_id}_{periodo or 'todo'}.{formato}"
+    return StreamingResponse(
+        ExportacionService(filtros, read_sessionmaker_entidad(request, entity_id)).exportar(formato),
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
     )
 
 
@@ -125,7 +448,7 @@ async def list_asientos_verdes(
 async def get_asientos_stats(
     entity_id: UUID,
     periodo: str = Query(..., regex=r"^\d{4}-\d{2}$"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_entity_read_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -135,82 +458,24 @@ async def get_asientos_stats(
     if current_user.rol != "admin" and current_user.entity_id != entity_id:
         raise HTTPException(status_code=403, detail="No autorizado")
     
-    # Consultas agregadas
-    stats = db.query(
-        func.count(AsientoModel.id).label("total_asientos"),
-        func.sum(AsientoModel.emisiones_tco2e).label("emisiones_totales"),
-        func.sum(AsientoModel.consumo_agua_m3).label("consumo_agua_total"),
-        func.sum(AsientoModel.residuos_kg).label("residuos_totales"),
-        func.sum(AsientoModel.debe_monto).label("pasivos_totales"),
-        func.sum(AsientoModel.haber_monto).label("activos_totales"),
-    ).filter(
-        AsientoModel.entity_id == entity_id,
-        AsientoModel.periodo == periodo,
-        AsientoModel.estado == "confirmado"
-    ).first()
-    
-    # Por categorÃ­a
-    por_categoria = db.query(
-        AsientoModel.categoria,
-        func.count(AsientoModel.id).label("count"),
-        func.sum(AsientoModel.emisiones_tco2e).label("emisiones")
-    ).filter(
-        AsientoModel.entity_id == entity_id,
-        AsientoModel.periodo == periodo,
-        AsientoModel.estado == "confirmado"
-    ).group_by(AsientoModel.categoria).all()
-    
-    # Por alcance GEI
-    por_alcance = db.query(
-        AsientoModel.alcance_gei,
-        func.sum(AsientoModel.emisiones_tco2e).label("emisiones")
-    ).filter(
-        AsientoModel.entity_id == entity_id,
-        AsientoModel.periodo == periodo,
-        AsientoModel.estado == "confirmado",
-        AsientoModel.alcance_gei.isnot(None)
-    ).group_by(AsientoModel.alcance_gei).all()
-    
-    return {
-        "periodo": periodo,
-        "totales": {
-            "asientos": stats.total_asientos or 0,
-            "emisiones_tco2e": float(stats.emisiones_totales or 0),
-            "agua_m3": float(stats.consumo_agua_total or 0),
-            "residuos_kg": float(stats.residuos_totales or 0),
-            "pasivos_clp": float(stats.pasivos_totales or 0),
-            "activos_clp": float(stats.activos_totales or 0),
-        },
-        "por_categoria": [
-            {
-                "categoria": cat.categoria,
-                "asientos": cat.count,
-                "emisiones_tco2e": float(cat.emisiones or 0)
-            }
-            for cat in por_categoria
-        ],
-        "por_alcance_gei": [
-            {
-                "alcance": alc.alcance_gei,
-                "emisiones_tco2e": float(alc.emisiones or 0)
-            }
-            for alc in por_alcance
-        ]
-    }
+    # Rollup mantenido al escribir asientos: una consulta sobre filas ya sumadas
+    return RollupService(db).stats(entity_id, periodo, estado="confirmado")
 
 
 @router.get("/{asiento_id}", response_model=AsientoVerde)
 async def get_asiento_verde(
     asiento_id: UUID,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """
     Obtener asiento verde por ID con evidencia vinculada
     """
-    asiento = db.query(AsientoModel).filter(
-        AsientoModel.id == asiento_id
-    ).first()
+    asiento = buscar_en_shards(
+        lambda shard_db: shard_db.query(AsientoModel).filter(AsientoModel.id == asiento_id).first(),
+        entity_id=current_user.entity_id if current_user.rol != "admin" else None,
+        db=db,
+    )
     
     if not asiento:
         raise HTTPException(status_code=404, detail="Asiento no encontrado")
@@ -3,17 +3,33 @@ Entities (Empresas) Endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from pydantic import BaseModel
+from typing import List, Optional
 from uuid import UUID
 
 from app.core.database import get_db
+from app.core.sharding import SHARD_PRINCIPAL, ShardSessions, shard_de
 from app.models.entity import Entity as EntityModel
 from app.schemas.entity import Entity, EntityCreate, EntityUpdate
+from app.services.shard_service import ShardService, replicar_entidad
+from app.tasks.mantenimiento import mover_entidad
 from app.api.deps import get_current_user, require_admin
 
 router = APIRouter()
 
 
+class EntityShardResponse(BaseModel):
+    entity_id: str
+    shard: str
+    estado: str
+    destino: Optional[str] = None
+    error: Optional[str] = None
+
+
+class EntityShardMover(BaseModel):
+    shard: str
+
+
 @router.post("/", response_model=Entity, status_code=201)
 async def create_entity(
     entity_data: EntityCreate,
@@ -43,6 +59,9 @@ async def create_entity(
     db.commit()
     db.refresh(db_entity)
     
+    # Shard de sus datos (SHARD_NUEVAS_ENTIDADES)
+    ShardService(db).asignar(db_entity)
+    
     return db_entity
 
 
@@ -132,6 +151,9 @@ async def update_entity(
     db.commit()
     db.refresh(entity)
     
+    # Copia de la fila en su shard
+    replicar_entidad(entity)
+    
     return entity
 
 
@@ -151,7 +173,55 @@ async def delete_entity(
     if not entity:
         raise HTTPException(status_code=404, detail="Entity no encontrada")
     
+    shard = shard_de(entity_id)
+    if shard != SHARD_PRINCIPAL:
+        with ShardSessions[shard]() as shard_db:
+            shard_db.query(EntityModel).filter(EntityModel.id == entity_id).delete()
+            shard_db.commit()
+    
     db.delete(entity)
     db.commit()
     
     return None
+
+
+@router.get("/{entity_id}/shard", response_model=EntityShardResponse)
+async def get_entity_shard(
+    entity_id: UUID,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_admin)
+):
+    """
+    Shard donde viven los datos de la entidad y migración en curso
+    
+    Requiere rol: admin
+    """
+    return ShardService(db).ubicacion(entity_id)
+
+
+@router.post("/{entity_id}/shard", response_model=EntityShardResponse, status_code=202)
+async def move_entity_shard(
+    entity_id: UUID,
+    data: EntityShardMover,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_admin)
+):
+    """
+    Mover los datos de la entidad a otro shard (online)
+    
+    Las escrituras siguen durante la copia; en el corte final se rechazan
+    con 503 unos segundos. Seguir el avance en GET /{entity_id}/shard.
+    
+    Requiere rol: admin
+    """
+    if not db.query(EntityModel.id).filter(EntityModel.id == entity_id).first():
+        raise HTTPException(status_code=404, detail="Entity no encontrada")
+    
+    service = ShardService(db)
+    try:
+        service.iniciar_migracion(entity_id, data.shard)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    mover_entidad.apply_async(args=[str(entity_id)], queue="importaciones")
+    return service.ubicacion(entity_id)
@@ -1,13 +1,16 @@
 """
 KONTAX - Evidencias Endpoints: Upload, List, Verify
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
 import hashlib
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, keyset_page
+from app.core.sharding import buscar_en_shards, datos_entidad, fan_out_entidades
+from app.models.entity import Entity as EntityModel
 from app.models.evidence import Evidence as EvidenceModel
 from app.api.deps import get_current_user, require_contador
 from pydantic import BaseModel
@@ -42,12 +45,14 @@ router = APIRouter()
 
 @router.get("/", response_model=List[EvidenceResponse])
 async def list_evidencias(
+    response: Response,
     entity_id: Optional[UUID] = None,
     tipo: Optional[str] = None,
     fuente: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """
@@ -55,27 +60,76 @@ async def list_evidencias(
 
     Tipos: factura, guia_despacho, certificado, medicion, nota_credito
     Fuentes: sii_api, manual, sensor, boostr, erp
-    """
-    query = db.query(EvidenceModel)
 
-    if entity_id:
-        query = query.filter(EvidenceModel.entity_id == entity_id)
-    if tipo:
-        query = query.filter(EvidenceModel.tipo == tipo)
-    if fuente:
-        query = query.filter(EvidenceModel.fuente == fuente)
-
-    return query.order_by(EvidenceModel.created_at.desc()).offset(skip).limit(limit).all()
+    Paginación por cursor (created_at, id): la página siguiente viene en el
+    header X-Next-Cursor, se pasa en ?cursor=. skip > 0 usa OFFSET (obsoleto).
+    Sin entity_id se consultan todos los shards en paralelo y se mezclan;
+    cada shard aporta solo las entidades que el directorio le asigna (una
+    entidad a medio mover tiene filas en ambos y no debe duplicarse).
+    """
+    def filtrar(shard_db: Session, entity_ids: Optional[List[UUID]] = None):
+        query = shard_db.query(EvidenceModel)
+        if entity_id:
+            query = query.filter(EvidenceModel.entity_id == entity_id)
+        if entity_ids is not None:
+            query = query.filter(EvidenceModel.entity_id.in_(entity_ids))
+        if tipo:
+            query = query.filter(EvidenceModel.tipo == tipo)
+        if fuente:
+            query = query.filter(EvidenceModel.fuente == fuente)
+        return query
+
+    def ordenar(query):
+        return query.order_by(EvidenceModel.created_at.desc(), EvidenceModel.id.desc())
+
+    orden = lambda e: (e.created_at, e.id)  # noqa: E731
+
+    def en_shards(fn):
+        entity_ids = [row.id for row in db.query(EntityModel.id)]
+        return fan_out_entidades(fn, entity_ids, db=db)
+
+    if skip and not cursor:
+        if entity_id:
+            with datos_entidad(db, entity_id) as shard_db:
+                return ordenar(filtrar(shard_db)).offset(skip).limit(limit).all()
+        partes = en_shards(
+            lambda shard_db, entity_ids: ordenar(filtrar(shard_db, entity_ids)).limit(skip + limit).all()
+        )
+        return sorted((e for parte in partes.values() for e in parte), key=orden, reverse=True)[skip:skip + limit]
+
+    def pagina(shard_db: Session, entity_ids: Optional[List[UUID]] = None):
+        return keyset_page(filtrar(shard_db, entity_ids), EvidenceModel.created_at, EvidenceModel.id, cursor, limit)
+
+    try:
+        if entity_id:
+            with datos_entidad(db, entity_id) as shard_db:
+                items, next_cursor = pagina(shard_db)
+        else:
+            # Cada shard entrega hasta limit después del cursor; la página
+            # global son los limit mayores y el cursor sigue al último
+            partes = list(en_shards(pagina).values())
+            todos = sorted((e for parte, _ in partes for e in parte), key=orden, reverse=True)
+            items = todos[:limit]
+            hay_mas = len(todos) > limit or any(siguiente for _, siguiente in partes)
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if items and hay_mas else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
 
 
 @router.get("/{evidence_id}", response_model=EvidenceResponse)
 async def get_evidencia(
     evidence_id: UUID,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """Obtener evidencia por ID"""
-    evidence = db.query(EvidenceModel).filter(EvidenceModel.id == evidence_id).first()
+    evidence = buscar_en_shards(
+        lambda shard_db: shard_db.query(EvidenceModel).filter(EvidenceModel.id == evidence_id).first(),
+        db=db,
+    )
     if not evidence:
         raise HTTPException(status_code=404, detail="Evidencia no encontrada")
     return evidence
@@ -92,11 +146,10 @@ async def create_evidencia(
     content = (data.xml_contenido or str(data.metadata_json_json or "")).encode("utf-8")
     hash_sha256 = hashlib.sha256(content).hexdigest()
 
-    # Verificar duplicado
-    existing = (
-        db.query(EvidenceModel)
-        .filter(EvidenceModel.hash_sha256 == hash_sha256)
-        .first()
+    # Verificar duplicado (en todos los shards: el hash es único global)
+    existing = buscar_en_shards(
+        lambda shard_db: shard_db.query(EvidenceModel.id).filter(EvidenceModel.hash_sha256 == hash_sha256).first(),
+        db=db,
     )
     if existing:
         raise HTTPException(
@@ -113,9 +166,10 @@ async def create_evidencia(
         xml_contenido=data.xml_contenido,
         metadata_json=data.metadata_json_json or {},
     )
-    db.add(evidence)
-    db.commit()
-    db.refresh(evidence)
+    with datos_entidad(db, data.entity_id, escritura=True) as shard_db:
+        shard_db.add(evidence)
+        shard_db.commit()
+        shard_db.refresh(evidence)
 
     return evidence
 
@@ -123,17 +177,16 @@ async def create_evidencia(
 @router.get("/verify/{hash_sha256}")
 async def verify_evidencia(
     hash_sha256: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """
     Verificar integridad de evidencia por hash SHA-256.
     Retorna si existe y su estado.
     """
-    evidence = (
-        db.query(EvidenceModel)
-        .filter(EvidenceModel.hash_sha256 == hash_sha256)
-        .first()
+    evidence = buscar_en_shards(
+        lambda shard_db: shard_db.query(EvidenceModel).filter(EvidenceModel.hash_sha256 == hash_sha256).first(),
+        db=db,
     )
 
     if evidence:
@@ -3,15 +3,17 @@ KONTAX - Financiamiento Verde Endpoints: Green Score + Pre-aprobación
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import or_
 from uuid import UUID
 
-from app.core.database import get_db
+from app.core.database import get_read_db
+from app.core.sharding import datos_entidad, fan_out_entidades
 from app.models.entity import Entity as EntityModel
-from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.green_score import GreenScoreComponentes, PERIODO_TOTAL
+from app.services.green_score_service import COMPONENTES_KEYS, TENDENCIA_KEYS, GreenScoreService, calcular_score
 from app.api.deps import get_current_user
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from decimal import Decimal
 
 router = APIRouter()
@@ -26,11 +28,157 @@ class GreenScoreResponse(BaseModel):
     metricas: dict
 
 
+# Máximo de entidades por consulta batch
+MAX_BATCH_ENTIDADES = 5000
+
+
+class GreenScoreBatchRequest(BaseModel):
+    entity_ids: List[UUID] = Field(default_factory=list)
+    ruts: List[str] = Field(default_factory=list)
+    periodo: Optional[str] = None
+    sector: Optional[str] = None
+    tamanio: Optional[str] = None
+    page: int = Field(1, ge=1)
+    page_size: int = Field(100, ge=1, le=1000)
+
+
+class GreenScoreRanking(BaseModel):
+    rank: int
+    entity_id: str
+    rut: str
+    razon_social: str
+    sector: Optional[str] = None
+    tamanio: Optional[str] = None
+    green_score: int
+    nivel: str
+    productos_elegibles: list
+
+
+class GreenScoreBatchResponse(BaseModel):
+    items: List[GreenScoreRanking]
+    total: int
+    page: int
+    page_size: int
+    pages: int
+
+
+# Máximo de escenarios por simulación
+MAX_ESCENARIOS = 100
+
+
+class AjusteSimulacion(BaseModel):
+    categoria: Optional[str] = None
+    subcategoria: Optional[str] = None
+    cuenta: Optional[str] = Field(None, max_length=4)  # Prefijo cuenta debe/haber
+    escala: float = Field(1.0, ge=0)  # Emisiones del segmento (0.7 = -30%); montos solo con cuenta
+    pct_verde: float = Field(0.0, ge=0, le=1)  # Asientos no verdes que pasan a verde
+
+
+class EscenarioSimulacion(BaseModel):
+    nombre: Optional[str] = None
+    ajustes: List[AjusteSimulacion] = Field(default_factory=list)
+
+
+class GreenScoreSimulacionRequest(BaseModel):
+    periodo: Optional[str] = None
+    escenarios: List[EscenarioSimulacion] = Field(..., min_length=1, max_length=MAX_ESCENARIOS)
+
+
+@router.post("/green-score/batch", response_model=GreenScoreBatchResponse)
+async def get_green_score_batch(
+    data: GreenScoreBatchRequest,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Green Score de una cartera de entidades (por ID o RUT), rankeado.
+
+    Entidades desde el principal y componentes precalculados desde cada
+    shard en paralelo (una consulta por shard); filtros sector/tamanio y
+    paginación por ranking (score descendente).
+    """
+    if not data.entity_ids and not data.ruts:
+        raise HTTPException(status_code=400, detail="Indicar entity_ids o ruts")
+    if len(data.entity_ids) + len(data.ruts) > MAX_BATCH_ENTIDADES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {MAX_BATCH_ENTIDADES} entidades por consulta",
+        )
+
+    query = (
+        db.query(
+            EntityModel.id,
+            EntityModel.rut,
+            EntityModel.razon_social,
+            EntityModel.sector,
+            EntityModel.tamanio,
+        )
+        .filter(or_(EntityModel.id.in_(data.entity_ids), EntityModel.rut.in_(data.ruts)))
+    )
+    if data.sector:
+        query = query.filter(EntityModel.sector == data.sector)
+    if data.tamanio:
+        query = query.filter(EntityModel.tamanio == data.tamanio)
+    entidades = query.all()
+
+    def componentes_shard(shard_db: Session, entity_ids: List[UUID]) -> List[GreenScoreComponentes]:
+        return (
+            shard_db.query(GreenScoreComponentes)
+            .filter(
+                GreenScoreComponentes.entity_id.in_(entity_ids),
+                GreenScoreComponentes.periodo == (data.periodo or PERIODO_TOTAL),
+            )
+            .all()
+        )
+
+    componentes = {
+        comp.entity_id: comp
+        for parte in fan_out_entidades(componentes_shard, [entity.id for entity in entidades], db=db).values()
+        for comp in parte
+    }
+
+    scores = []
+    for entity in entidades:
+        comp = componentes.get(entity.id)
+        if comp and comp.asientos:
+            score = calcular_score({k: getattr(comp, k) for k in COMPONENTES_KEYS + TENDENCIA_KEYS})
+        else:
+            score = {"green_score": 0, "nivel": "Sin datos", "productos_elegibles": []}
+        scores.append((entity, score))
+
+    scores.sort(key=lambda es: (-es[1]["green_score"], es[0].rut))
+
+    total = len(scores)
+    skip = (data.page - 1) * data.page_size
+    items = [
+        GreenScoreRanking(
+            rank=skip + i + 1,
+            entity_id=str(entity.id),
+            rut=entity.rut,
+            razon_social=entity.razon_social,
+            sector=entity.sector,
+            tamanio=entity.tamanio,
+            green_score=score["green_score"],
+            nivel=score["nivel"],
+            productos_elegibles=score["productos_elegibles"],
+        )
+        for i, (entity, score) in enumerate(scores[skip:skip + data.page_size])
+    ]
+
+    return GreenScoreBatchResponse(
+        items=items,
+        total=total,
+        page=data.page,
+        page_size=data.page_size,
+        pages=(total + data.page_size - 1) // data.page_size,
+    )
+
+
 @router.get("/green-score/{entity_id}", response_model=GreenScoreResponse)
 async def get_green_score(
     entity_id: UUID,
     periodo: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """
@@ -47,17 +195,11 @@ async def get_green_score(
     if not entity:
         raise HTTPException(status_code=404, detail="Entidad no encontrada")
 
-    # Obtener asientos
-    query = db.query(AsientoModel).filter(
-        AsientoModel.entity_id == entity_id,
-        AsientoModel.estado == "validado",
-    )
-    if periodo:
-        query = query.filter(AsientoModel.periodo == periodo)
-
-    asientos = query.all()
+    # Componentes precalculados (PK lookup), mantenidos al insertar/validar asientos
+    with datos_entidad(db, entity_id) as shard_db:
+        componentes = GreenScoreService(shard_db).componentes(entity_id, periodo)
 
-    if not asientos:
+    if not componentes["asientos"]:
         return GreenScoreResponse(
             entity_id=str(entity_id),
             razon_social=entity.razon_social,
@@ -67,73 +209,45 @@ async def get_green_score(
             metricas={"asientos": 0, "nota": "Sin asientos verdes para evaluar"},
         )
 
-    # Calcular componentes del score
-    total = len(asientos)
-    verdes = sum(1 for a in asientos if a.taxonomia_tmas == "verde")
-    transicion = sum(1 for a in asientos if a.taxonomia_tmas == "transicion")
-    activos = sum(float(a.monto_debe or 0) for a in asientos if str(a.cuenta_debe or "").startswith("1595"))
-    pasivos = sum(float(a.monto_haber or 0) for a in asientos if str(a.cuenta_haber or "").startswith("2630"))
-
-    # Score T-MAS (40 puntos max)
-    tmas_ratio = (verdes + transicion * 0.5) / total if total > 0 else 0
-    score_tmas = min(40, int(tmas_ratio * 40))
-
-    # Score inversión (20 puntos max)
-    inversion_ratio = activos / pasivos if pasivos > 0 else 0
-    score_inversion = min(20, int(inversion_ratio * 20))
-
-    # Score volumen (20 puntos max) - más asientos = más cobertura
-    score_volumen = min(20, int(min(total / 50, 1) * 20))
-
-    # Score base reportería + certificaciones (20 puntos)
-    score_base = 10  # Base por tener contabilidad ambiental
-
-    green_score = min(100, score_tmas + score_inversion + score_volumen + score_base)
-
-    # Determinar nivel y productos
-    if green_score >= 80:
-        nivel = "Excelente"
-        productos = [
-            "Bonos verdes",
-            "Tasa preferencial verde",
-            "Crédito inversión sostenible",
-            "Leasing verde",
-        ]
-    elif green_score >= 60:
-        nivel = "Bueno"
-        productos = [
-            "Crédito verde",
-            "Leasing verde",
-            "Línea capital trabajo verde",
-        ]
-    elif green_score >= 40:
-        nivel = "Transición"
-        productos = [
-            "Financiamiento mejora ambiental",
-            "Crédito transición energética",
-        ]
-    else:
-        nivel = "Inicial"
-        productos = ["Plan asesoría ambiental", "Diagnóstico gratuito"]
-
     return GreenScoreResponse(
         entity_id=str(entity_id),
         razon_social=entity.razon_social,
-        green_score=green_score,
-        nivel=nivel,
-        productos_elegibles=productos,
-        metricas={
-            "total_asientos": total,
-            "asientos_verdes_tmas": verdes,
-            "asientos_transicion_tmas": transicion,
-            "ratio_tmas_verde": round(tmas_ratio, 3),
-            "activos_ambientales_clp": round(activos, 2),
-            "pasivos_ambientales_clp": round(pasivos, 2),
-            "componentes_score": {
-                "tmas": score_tmas,
-                "inversion": score_inversion,
-                "volumen": score_volumen,
-                "base": score_base,
-            },
-        },
+        **calcular_score(componentes),
     )
+
+
+@router.post("/green-score/{entity_id}/simular")
+async def simular_green_score(
+    entity_id: UUID,
+    data: GreenScoreSimulacionRequest,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Simular el Green Score bajo escenarios hipotéticos.
+
+    Ej: reemplazar 30% del diésel por electricidad renovable =
+    [{categoria: combustible, subcategoria: diesel, escala: 0.7},
+     {categoria: energia, subcategoria: electricidad, pct_verde: 0.3}].
+    Se calcula sobre los componentes y segmentos persistidos, sin leer
+    ni modificar asientos.
+    """
+    entity = db.query(EntityModel).filter(EntityModel.id == entity_id).first()
+    if not entity:
+        raise HTTPException(status_code=404, detail="Entidad no encontrada")
+
+    with datos_entidad(db, entity_id) as shard_db:
+        service = GreenScoreService(shard_db)
+        if not service.componentes(entity_id, data.periodo)["asientos"]:
+            raise HTTPException(status_code=400, detail="Sin asientos verdes para simular")
+
+        try:
+            resultado = service.simular(
+                entity_id,
+                [escenario.model_dump() for escenario in data.escenarios],
+                data.periodo,
+            )
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    return {"razon_social": entity.razon_social, **resultado}
@@ -1,34 +1,87 @@
 """
 KONTAX - Reportes Endpoints: CRUD + Generación
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.orm import Session, defer
+from pydantic import BaseModel
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
-
-from app.core.database import get_db
+import csv
+import io
+import re
+
+from app.config import settings
+from app.core.database import get_db, get_read_db
+from app.core.pagination import NEXT_CURSOR_HEADER, keyset_page
+from app.integrations.minio_client import MinioClient
+from app.models.portfolio_reporte import PortfolioReporte
 from app.models.reporte import Reporte as ReporteModel
-from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.reporte_cache import ReporteCache
 from app.schemas.reporte import Reporte, ReporteCreate, ReporteList
-from app.api.deps import get_current_user, require_contador
+from app.services.reporte_render import objeto_key
+from app.services.reporte_service import AGREGADOS_KEYS, ReporteService, expandir_periodo, periodos_comparables
+from app.tasks.reportes import PRIORIDAD_PORTFOLIO, encolar_reporte, generar_portfolio, renderizar_reporte
+from app.api.deps import get_current_user, require_admin, require_contador
 
 router = APIRouter()
 
+# Máximo de rutas en ?fields= del detalle
+MAX_FIELDS = 50
+
+TIPOS_VALIDOS = [
+    "huella_carbono", "esg", "ifrs_s1", "ifrs_s2",
+    "ley_rep", "balance_ambiental", "dashboard_ods",
+]
+
+
+class PortfolioCreate(BaseModel):
+    tipo: str = "huella_carbono"
+    periodo: str
+    usar_espejo: bool = False  # Calcular sobre el espejo analítico (cifras al último refresco)
+
+
+class PortfolioJob(BaseModel):
+    id: UUID
+    tipo: str
+    periodo: str
+    estado: str
+    total_entidades: int = 0
+    entidades_procesadas: int = 0
+    resumen_json: Optional[dict] = None
+    error: Optional[str] = None
+    usar_espejo: bool = False
+    actualizado_al: Optional[datetime] = None  # Marca del espejo usado; None = datos en vivo
+    created_at: Optional[datetime] = None
+    completado_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 
 @router.get("/", response_model=List[ReporteList])
 async def list_reportes(
+    response: Response,
     entity_id: Optional[UUID] = None,
     tipo: Optional[str] = None,
     estado: Optional[str] = None,
+    cursor: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
-    """Listar reportes con filtros"""
-    query = db.query(ReporteModel)
+    """
+    Listar reportes con filtros (solo metadata, sin data_json)
+
+    Paginación por cursor (created_at, id) vía header X-Next-Cursor y
+    ?cursor=; skip > 0 usa OFFSET (obsoleto).
+    """
+    query = db.query(ReporteModel).options(
+        defer(ReporteModel.data_json),
+        defer(ReporteModel.parametros_json),
+    )
 
     if entity_id:
         query = query.filter(ReporteModel.entity_id == entity_id)
@@ -37,26 +90,158 @@ async def list_reportes(
     if estado:
         query = query.filter(ReporteModel.estado == estado)
 
-    return query.order_by(ReporteModel.created_at.desc()).offset(skip).limit(limit).all()
+    if skip and not cursor:
+        return (
+            query.order_by(ReporteModel.created_at.desc(), ReporteModel.id.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+
+    try:
+        items, next_cursor = keyset_page(query, ReporteModel.created_at, ReporteModel.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
+
+@router.get("/comparar")
+async def comparar_periodos(
+    entity_id: UUID,
+    periodo: str,
+    comparar_con: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Comparar un período contra otros (variación absoluta y %).
+
+    comparar_con: períodos separados por coma. Por defecto, período
+    anterior y mismo período del año anterior.
+    Desglose por categoría, alcance GEI y cuenta.
+    """
+    if current_user.rol != "admin" and current_user.entity_id != entity_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    try:
+        otros = (
+            [p.strip() for p in comparar_con.split(",") if p.strip()]
+            if comparar_con
+            else periodos_comparables(periodo)
+        )
+        for p in [periodo, *otros]:
+            expandir_periodo(p)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return ReporteService(db).comparar(entity_id, periodo, otros)
 
 
 @router.get("/{reporte_id}", response_model=Reporte)
 async def get_reporte(
     reporte_id: UUID,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Obtener reporte por ID con datos completos.
+
+    fields: rutas separadas por coma dentro de data_json
+    (ej: total_tco2e,alcance_1.total_tco2e). Se extraen en SQL, sin
+    transferir el documento completo.
+    """
+    if not fields:
+        reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
+        if not reporte:
+            raise HTTPException(status_code=404, detail="Reporte no encontrado")
+        return reporte
+
+    paths = [f.strip() for f in fields.split(",") if f.strip()]
+    if len(paths) > MAX_FIELDS or not all(re.fullmatch(r"\w+(\.\w+)*", p) for p in paths):
+        raise HTTPException(status_code=400, detail=f"fields inválido (máximo {MAX_FIELDS} rutas a.b.c)")
+
+    # Columnas explícitas sin data_json: solo viajan las rutas proyectadas
+    columnas = [col for col in ReporteModel.__table__.columns if col.key != "data_json"]
+    row = (
+        db.query(
+            *columnas,
+            *[ReporteModel.data_json[tuple(p.split("."))].label(f"f{i}") for i, p in enumerate(paths)],
+        )
+        .filter(ReporteModel.id == reporte_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+
+    data = {}
+    for path, value in zip(paths, row[len(columnas):]):
+        if value is None:
+            continue
+        *padres, hoja = path.split(".")
+        nodo = data
+        for padre in padres:
+            nodo = nodo.setdefault(padre, {})
+        nodo[hoja] = value
+
+    return Reporte.model_validate({
+        **{col.key: value for col, value in zip(columnas, row)},
+        "data_json": data,
+    })
+
+
+@router.post("/{reporte_id}/render", status_code=202)
+async def render_reporte(
+    reporte_id: UUID,
+    formato: str = Query("pdf", regex=r"^(pdf|xlsx)$"),
     db: Session = Depends(get_db),
+    current_user=Depends(require_contador),
+):
+    """
+    Renderizar reporte completo a PDF o XLSX en el worker.
+    El archivo queda en MinIO; descargar con GET /{reporte_id}/download.
+    """
+    reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
+    if not reporte:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    if reporte.estado != "completo":
+        raise HTTPException(status_code=400, detail=f"Reporte en estado {reporte.estado}")
+
+    renderizar_reporte.apply_async(args=[str(reporte.id), formato], queue="reportes")
+
+    return {"reporte_id": str(reporte.id), "formato": formato, "status": "processing"}
+
+
+@router.get("/{reporte_id}/download")
+async def download_reporte(
+    reporte_id: UUID,
+    formato: str = Query("pdf", regex=r"^(pdf|xlsx)$"),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
-    """Obtener reporte por ID con datos completos"""
+    """
+    Descargar archivo renderizado.
+    Redirige a una URL prefirmada de MinIO: el archivo no pasa por la API.
+    """
     reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
     if not reporte:
         raise HTTPException(status_code=404, detail="Reporte no encontrado")
-    return reporte
+
+    client = MinioClient()
+    key = objeto_key(reporte, formato)
+    if not client.existe(settings.MINIO_BUCKET_REPORTES, key):
+        raise HTTPException(status_code=404, detail=f"Reporte sin archivo {formato.upper()} renderizado")
+
+    return RedirectResponse(
+        client.url_descarga(settings.MINIO_BUCKET_REPORTES, key, settings.REPORTES_URL_EXPIRE_MINUTES)
+    )
 
 
 @router.post("/generate", response_model=Reporte, status_code=201)
 async def generate_reporte(
     data: ReporteCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user=Depends(require_contador),
 ):
@@ -70,25 +255,28 @@ async def generate_reporte(
     - ifrs_s2: IFRS S2 Climate
     - ley_rep: Declaración Ley REP
     - balance_ambiental: Balance Ambiental KONTAX
+
+    Períodos: YYYY-MM, YYYY-Qn (trimestral) o YYYY (anual).
+
+    Si ya existe un reporte completo con las mismas entradas (entidad,
+    período, tipo, parámetros, asientos y factores) se retorna sin regenerar.
+    Requests idénticos concurrentes reciben el mismo reporte en curso.
     """
-    tipos_validos = [
-        "huella_carbono", "esg", "ifrs_s1", "ifrs_s2",
-        "ley_rep", "balance_ambiental", "dashboard_ods",
-    ]
-    if data.tipo not in tipos_validos:
+    if data.tipo not in TIPOS_VALIDOS:
         raise HTTPException(
             status_code=400,
-            detail=f"Tipo inválido. Válidos: {tipos_validos}",
+            detail=f"Tipo inválido. Válidos: {TIPOS_VALIDOS}",
         )
 
-    # Verificar que hay asientos para el período
-    count = (
-        db.query(func.count(AsientoModel.id))
-        .filter(
-            AsientoModel.entity_id == data.entity_id,
-            AsientoModel.periodo == data.periodo,
-        )
-        .scalar()
+    try:
+        expandir_periodo(data.periodo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Fingerprint de entradas (también cuenta los asientos del período)
+    service = ReporteService(db)
+    fingerprint, count = service.fingerprint(
+        data.entity_id, data.periodo, data.tipo, data.parametros
     )
 
     if count == 0:
@@ -97,131 +285,128 @@ async def generate_reporte(
             detail=f"No hay asientos verdes para {data.periodo}",
         )
 
-    # Crear reporte en estado generando
+    # Reutilizar reporte completo si nada cambió desde su generación
+    cached = service.buscar_cache(fingerprint)
+    if cached:
+        return cached
+
+    # Crear reporte pendiente; el worker lo lleva a generando/completo/error
     reporte = ReporteModel(
         entity_id=data.entity_id,
         tipo=data.tipo,
         periodo=data.periodo,
-        estado="generando",
+        estado="pendiente",
         parametros_json=data.parametros or {},
         data_json={},
         generado_por=str(current_user.id),
     )
     db.add(reporte)
+    db.flush()
+    db.add(ReporteCache(reporte_id=reporte.id, fingerprint=fingerprint))
     db.commit()
     db.refresh(reporte)
 
-    # Lanzar generación en background
-    background_tasks.add_task(_generate_report_data, str(reporte.id), data.tipo)
+    # Single-flight: si otro request ya está generando lo mismo, adjuntarse
+    owner_id = service.adquirir_generacion(fingerprint, reporte.id)
+    if owner_id != str(reporte.id):
+        owner = db.query(ReporteModel).filter(ReporteModel.id == owner_id).first()
+        if owner:
+            db.delete(reporte)
+            db.commit()
+            return owner
+
+    # Encolar generación en worker Celery (cola reportes)
+    encolar_reporte(reporte)
 
     return reporte
 
 
-async def _generate_report_data(reporte_id: str, tipo: str):
-    """
-    Genera datos del reporte en background.
-    En producción, esto se delega a Celery.
+# ═══ PORTFOLIO (todas las entidades) ═══
+
+@router.post("/portfolio", response_model=PortfolioJob, status_code=202)
+async def create_portfolio(
+    data: PortfolioCreate,
+    db: Session = Depends(get_db),
+    current_user=Depends(require_admin),
+):
     """
-    from app.core.database import SessionLocal
+    Generar reporte de un período para todas las entidades activas.
 
-    db = SessionLocal()
+    Con usar_espejo se calcula sobre el espejo analítico si está
+    disponible (sin carga en Postgres); el job informa en actualizado_al
+    la antigüedad de las cifras.
+
+    Requiere rol: admin
+    """
+    if data.tipo not in TIPOS_VALIDOS:
+        raise HTTPException(status_code=400, detail=f"Tipo inválido. Válidos: {TIPOS_VALIDOS}")
     try:
-        reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
-        if not reporte:
-            return
-
-        # Obtener asientos del período
-        asientos = (
-            db.query(AsientoModel)
-            .filter(
-                AsientoModel.entity_id == reporte.entity_id,
-                AsientoModel.periodo == reporte.periodo,
-                AsientoModel.estado == "validado",
-            )
-            .all()
-        )
+        expandir_periodo(data.periodo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = PortfolioReporte(
+        tipo=data.tipo,
+        periodo=data.periodo,
+        estado="pendiente",
+        usar_espejo=data.usar_espejo,
+        generado_por=str(current_user.id),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    generar_portfolio.apply_async(args=[str(job.id)], queue="reportes", priority=PRIORIDAD_PORTFOLIO)
+
+    return job
 
-        if tipo == "huella_carbono":
-            data = _build_huella_carbono(asientos)
-        elif tipo == "balance_ambiental":
-            data = _build_balance_ambiental(asientos)
-        elif tipo == "esg":
-            data = _build_esg(asientos)
-        else:
-            data = _build_generic(asientos, tipo)
-
-        reporte.data_json = data
-        reporte.estado = "completo"
-        reporte.completado_at = datetime.utcnow()
-        db.commit()
-    except Exception as e:
-        reporte.estado = "error"
-        reporte.data_json = {"error": str(e)}
-        db.commit()
-    finally:
-        db.close()
-
-
-def _build_huella_carbono(asientos) -> dict:
-    """Construir reporte Huella de Carbono GHG Protocol"""
-    alcance1 = sum(float(a.emisiones_tco2e or 0) for a in asientos if a.alcance_gei == 1)
-    alcance2 = sum(float(a.emisiones_tco2e or 0) for a in asientos if a.alcance_gei == 2)
-    alcance3 = sum(float(a.emisiones_tco2e or 0) for a in asientos if a.alcance_gei == 3)
-
-    return {
-        "estandar": "GHG Protocol Corporate Standard",
-        "alcance_1": {"total_tco2e": round(alcance1, 3), "fuentes": "Combustión directa, vehículos propios"},
-        "alcance_2": {"total_tco2e": round(alcance2, 3), "fuentes": "Electricidad comprada"},
-        "alcance_3": {"total_tco2e": round(alcance3, 3), "fuentes": "Transporte terceros, residuos, cadena valor"},
-        "total_tco2e": round(alcance1 + alcance2 + alcance3, 3),
-        "asientos_procesados": len(asientos),
-    }
-
-
-def _build_balance_ambiental(asientos) -> dict:
-    """Construir Balance Ambiental KONTAX"""
-    activos = sum(float(a.monto_debe or 0) for a in asientos if str(a.cuenta_debe or "").startswith("1595"))
-    pasivos = sum(float(a.monto_haber or 0) for a in asientos if str(a.cuenta_haber or "").startswith("2630"))
-    costos = sum(float(a.monto_debe or 0) for a in asientos if str(a.cuenta_debe or "").startswith("5190"))
-
-    return {
-        "activos_ambientales_clp": round(activos, 2),
-        "pasivos_ambientales_clp": round(pasivos, 2),
-        "costos_ambientales_clp": round(costos, 2),
-        "patrimonio_ambiental_neto_clp": round(activos - pasivos, 2),
-        "asientos_procesados": len(asientos),
-    }
-
-
-def _build_esg(asientos) -> dict:
-    """Construir reporte ESG básico"""
-    total_emisiones = sum(float(a.emisiones_tco2e or 0) for a in asientos)
-    total_energia = sum(
-        float(a.cantidad_fisica or 0)
-        for a in asientos
-        if a.tipo and "energia" in a.tipo
+
+@router.get("/portfolio/{portfolio_id}", response_model=PortfolioJob)
+async def get_portfolio(
+    portfolio_id: UUID,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(require_admin),
+):
+    """Estado y avance (entidades_procesadas / total_entidades) del job portfolio"""
+    job = (
+        db.query(PortfolioReporte)
+        .options(defer(PortfolioReporte.resultados_json))
+        .filter(PortfolioReporte.id == portfolio_id)
+        .first()
     )
+    if not job:
+        raise HTTPException(status_code=404, detail="Reporte portfolio no encontrado")
+    return job
+
 
-    return {
-        "estandar": "GRI / SASB",
-        "ambiental": {
-            "emisiones_totales_tco2e": round(total_emisiones, 3),
-            "consumo_energia_kwh": round(total_energia, 2),
-        },
-        "social": {"nota": "Requiere datos adicionales no contables"},
-        "gobernanza": {"nota": "Requiere datos adicionales corporativos"},
-        "asientos_procesados": len(asientos),
-    }
-
-
-def _build_generic(asientos, tipo) -> dict:
-    """Reporte genérico para tipos aún no implementados completamente"""
-    return {
-        "tipo": tipo,
-        "asientos_procesados": len(asientos),
-        "total_emisiones_tco2e": round(
-            sum(float(a.emisiones_tco2e or 0) for a in asientos), 3
-        ),
-        "estado": "generado_basico",
-        "nota": f"Reporte {tipo} generado con datos básicos de asientos verdes",
-    }
+@router.get("/portfolio/{portfolio_id}/csv")
+async def export_portfolio_csv(
+    portfolio_id: UUID,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(require_admin),
+):
+    """Exportar resultados por entidad del job portfolio en CSV"""
+    job = db.query(PortfolioReporte).filter(PortfolioReporte.id == portfolio_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Reporte portfolio no encontrado")
+    if job.estado != "completo":
+        raise HTTPException(status_code=400, detail=f"Reporte portfolio en estado {job.estado}")
+
+    columnas = ["entity_id", "rut", "razon_social", "sector", *AGREGADOS_KEYS]
+
+    def filas():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columnas, extrasaction="ignore")
+        writer.writeheader()
+        for resultado in job.resultados_json or []:
+            writer.writerow(resultado)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        filas(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="portfolio_{job.tipo}_{job.periodo}.csv"'},
+    )
@@ -1,22 +1,41 @@
 """
 Database configuration and session management
 """
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import NullPool
+from typing import Dict, Generator, List, Optional, Tuple
+from pathlib import Path
+import logging
+import random
+import time
+
+import redis
 
 from app.config import settings
+from app.core.pool import engine_kwargs, registrar_pool
+from app.core.redis import get_redis
+from app.core.security import decode_token
+
+logger = logging.getLogger(__name__)
 
 
-# Create engine
+# Create engine (pool según presupuesto de conexiones del nodo)
 engine = create_engine(
     settings.DATABASE_URL,
     echo=settings.DATABASE_ECHO,
-    pool_pre_ping=True,
-    pool_size=20,
-    max_overflow=40,
+    **engine_kwargs(),
 )
+registrar_pool(engine, "primario")
+
+# alembic.ini en la raíz del proyecto
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+# Clave pg_advisory_lock: un solo proceso migra a la vez
+MIGRATIONS_LOCK_ID = 4_621_001
 
 # Session factory
 SessionLocal = sessionmaker(
@@ -25,6 +44,37 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Réplicas de lectura (streaming replication); cada pool con su parte del presupuesto
+replica_engines = [
+    create_engine(
+        url,
+        echo=settings.DATABASE_ECHO,
+        **engine_kwargs(),
+    )
+    for url in settings.DATABASE_REPLICA_URLS
+]
+for indice, replica_engine in enumerate(replica_engines):
+    registrar_pool(replica_engine, f"replica_{indice}")
+ReplicaSessions = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    for replica_engine in replica_engines
+]
+
+# Segundos sin aplicar WAL; 0 si la réplica ya reprodujo todo lo recibido
+# (un primario sin escrituras no hace ver atrasada a la réplica)
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+# Marca "escribió hace poco" por usuario
+ESCRITURA_RECIENTE_KEY = "kontax:db:escritura:{usuario}"
+
+# índice réplica -> (instante medición, lag en segundos o None si no responde)
+_replica_lag: Dict[int, Tuple[float, Optional[float]]] = {}
+
 # Base class for models
 Base = declarative_base()
 
@@ -45,6 +95,125 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def replica_lag(indice: int) -> Optional[float]:
+    """Lag de la réplica (cacheado DATABASE_REPLICA_LAG_CHECK s); None si no responde"""
+    ahora = time.monotonic()
+    medido = _replica_lag.get(indice)
+    if medido and ahora - medido[0] < settings.DATABASE_REPLICA_LAG_CHECK:
+        return medido[1]
+
+    try:
+        with replica_engines[indice].connect() as connection:
+            lag = float(connection.execute(text(REPLICA_LAG_SQL)).scalar())
+    except SQLAlchemyError as e:
+        logger.warning(f"Réplica {indice} no disponible: {e}")
+        lag = None
+    _replica_lag[indice] = (ahora, lag)
+    return lag
+
+
+def elegir_replica() -> Optional[sessionmaker]:
+    """Session factory de una réplica al día (al azar entre las sanas), o None"""
+    sanas: List[int] = []
+    for indice in range(len(replica_engines)):
+        lag = replica_lag(indice)
+        if lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG:
+            sanas.append(indice)
+    if not sanas:
+        return None
+    return ReplicaSessions[random.choice(sanas)]
+
+
+def _usuario(request: Request) -> Optional[str]:
+    """sub del bearer token, sin consultar la base"""
+    auth = request.headers.get("authorization", "")
+    if not auth.lower().startswith("bearer "):
+        return None
+    payload = decode_token(auth[7:])
+    return payload.get("sub") if payload else None
+
+
+def marcar_escritura(request: Request) -> None:
+    """Enviar al primario las lecturas del usuario durante DATABASE_REPLICA_STICKY s"""
+    usuario = _usuario(request)
+    if not usuario:
+        return
+    try:
+        get_redis().set(
+            ESCRITURA_RECIENTE_KEY.format(usuario=usuario), "1", ex=settings.DATABASE_REPLICA_STICKY
+        )
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo marcar escritura reciente: {e}")
+
+
+def escritura_reciente(request: Request) -> bool:
+    """El usuario escribió hace poco (ante la duda, True: leer del primario)"""
+    usuario = _usuario(request)
+    if not usuario:
+        return False
+    try:
+        return bool(get_redis().exists(ESCRITURA_RECIENTE_KEY.format(usuario=usuario)))
+    except redis.RedisError:
+        return True
+
+
+def read_sessionmaker(request: Request) -> sessionmaker:
+    """Session factory para lecturas del request: réplica al día o primario"""
+    if replica_engines and not escritura_reciente(request):
+        return elegir_replica() or SessionLocal
+    return SessionLocal
+
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """
+    Dependency para endpoints de solo lectura (listas, stats, reportes)
+
+    Usa una réplica con lag <= DATABASE_REPLICA_MAX_LAG; si no hay réplicas
+    sanas, o el usuario escribió hace menos de DATABASE_REPLICA_STICKY s
+    (lee lo que acaba de escribir), usa el primario. session.info["replica"]
+    indica a los servicios que no pueden escribir en esta sesión.
+    """
+    factory = read_sessionmaker(request)
+    db = factory()
+    db.info["replica"] = factory is not SessionLocal
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def init_db() -> None:
-    """Initialize database (create tables)"""
-    Base.metadata.create_all(bind=engine)
+    """
+    Initialize database: aplicar migraciones pendientes (alembic upgrade head)
+
+    Varios workers pueden iniciar a la vez; el advisory lock serializa y
+    los que llegan después no encuentran migraciones pendientes. El lock
+    es de sesión: tras pgbouncer (pool por transacción) se migra por
+    DATABASE_DIRECT_URL. Los shards adicionales se migran a continuación.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    if settings.DATABASE_PGBOUNCER and not settings.DATABASE_DIRECT_URL:
+        logger.warning("DATABASE_PGBOUNCER sin DATABASE_DIRECT_URL: migraciones a través de pgbouncer")
+    migraciones = (
+        create_engine(settings.DATABASE_DIRECT_URL, poolclass=NullPool)
+        if settings.DATABASE_DIRECT_URL
+        else engine
+    )
+
+    # Cada shard tiene el esquema completo (DATABASE_SHARDS, sin pgbouncer)
+    destinos = [migraciones] + [
+        create_engine(url, poolclass=NullPool) for url in settings.DATABASE_SHARDS.values()
+    ]
+    for destino in destinos:
+        config = Config(str(ALEMBIC_INI))
+        with destino.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+            connection.commit()
+            try:
+                config.attributes["connection"] = connection
+                command.upgrade(config, "head")
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+                connection.commit()
@@ -0,0 +1,155 @@
+"""
+Instrumentación SQL por request: sentencias, tiempo en DB, lentas y N+1
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+import logging
+import re
+import time
+
+try:
+    from prometheus_client import Counter as PromCounter, Histogram
+    HAS_PROMETHEUS = True
+except ImportError:
+    HAS_PROMETHEUS = False
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Headers de diagnóstico (solo con DEBUG)
+DB_STATEMENTS_HEADER = "X-DB-Statements"
+DB_TIME_HEADER = "X-DB-Time-Ms"
+DB_N1_HEADER = "X-DB-N1"
+
+# Largo máximo de sentencia en logs
+MAX_SQL_LOG = 500
+
+# Forma de la sentencia: parámetros y literales → ?, listas IN colapsadas
+_PARAMETRO = re.compile(r"%\(\w+\)s|%s|\$\d+|:\w+")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTA = re.compile(r"\?(?:\s*,\s*\?)+")
+_ESPACIOS = re.compile(r"\s+")
+
+if HAS_PROMETHEUS:
+    SENTENCIAS_REQUEST = Histogram(
+        "kontax_db_statements_per_request",
+        "Sentencias SQL por request",
+        ["route"],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 250, 1000),
+    )
+    TIEMPO_DB_REQUEST = Histogram(
+        "kontax_db_time_seconds_per_request",
+        "Tiempo total en la base por request",
+        ["route"],
+    )
+    SENTENCIAS_LENTAS = PromCounter(
+        "kontax_db_slow_statements_total",
+        "Sentencias sobre SQL_SLOW_MS",
+        ["route"],
+    )
+    CANDIDATOS_N1 = PromCounter(
+        "kontax_db_n_plus_one_total",
+        "Formas de sentencia repetidas >= SQL_N1_UMBRAL veces en un request",
+        ["route"],
+    )
+
+
+def forma_sentencia(statement: str) -> str:
+    """Sentencia sin valores: agrupa repeticiones y no expone parámetros"""
+    forma = _PARAMETRO.sub("?", statement)
+    forma = _LITERAL.sub("?", forma)
+    forma = _LISTA.sub("?, ...", forma)
+    return _ESPACIOS.sub(" ", forma).strip()
+
+
+class SQLStats:
+    """Acumulado de las sentencias ejecutadas durante un request"""
+
+    def __init__(self):
+        self.sentencias = 0
+        self.tiempo = 0.0
+        self.formas: Counter = Counter()
+        self.lentas: List[Tuple[str, float]] = []
+
+    def registrar(self, statement: str, duracion: float) -> None:
+        forma = forma_sentencia(statement)
+        self.sentencias += 1
+        self.tiempo += duracion
+        self.formas[forma] += 1
+        if duracion * 1000 >= settings.SQL_SLOW_MS:
+            self.lentas.append((forma, duracion))
+
+    def candidatos_n1(self) -> List[Tuple[str, int]]:
+        """Formas repetidas SQL_N1_UMBRAL veces o más (consultas en bucle)"""
+        return [
+            (forma, veces)
+            for forma, veces in self.formas.most_common()
+            if veces >= settings.SQL_N1_UMBRAL
+        ]
+
+
+_stats_request: ContextVar[Optional[SQLStats]] = ContextVar("kontax_sql_stats", default=None)
+
+
+def iniciar_request() -> SQLStats:
+    """
+    Abrir el acumulado del request actual
+
+    El objeto se comparte (no se copia) con las tareas y threads que
+    Starlette crea para el endpoint: todos registran en el mismo.
+    """
+    stats = SQLStats()
+    _stats_request.set(stats)
+    return stats
+
+
+def cerrar_request(stats: SQLStats, route: str) -> None:
+    """Exportar métricas y loguear lentas y candidatos N+1 del request"""
+    candidatos = stats.candidatos_n1()
+
+    for forma, duracion in stats.lentas:
+        logger.warning(f"SQL lenta ({duracion * 1000:.0f} ms) en {route}: {forma[:MAX_SQL_LOG]}")
+    for forma, veces in candidatos:
+        logger.warning(f"Posible N+1 en {route}: {veces}x {forma[:MAX_SQL_LOG]}")
+
+    if HAS_PROMETHEUS:
+        SENTENCIAS_REQUEST.labels(route).observe(stats.sentencias)
+        TIEMPO_DB_REQUEST.labels(route).observe(stats.tiempo)
+        if stats.lentas:
+            SENTENCIAS_LENTAS.labels(route).inc(len(stats.lentas))
+        if candidatos:
+            CANDIDATOS_N1.labels(route).inc(len(candidatos))
+
+
+def headers_debug(stats: SQLStats) -> dict:
+    return {
+        DB_STATEMENTS_HEADER: str(stats.sentencias),
+        DB_TIME_HEADER: f"{stats.tiempo * 1000:.1f}",
+        DB_N1_HEADER: str(len(stats.candidatos_n1())),
+    }
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_sentencia(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("kontax_sql_inicio", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_sentencia(conn, cursor, statement, parameters, context, executemany) -> None:
+    inicio = conn.info["kontax_sql_inicio"].pop()
+    stats = _stats_request.get()
+    if stats is not None:
+        stats.registrar(statement, time.perf_counter() - inicio)
+
+
+@event.listens_for(Engine, "handle_error")
+def _error_sentencia(exception_context) -> None:
+    """Una sentencia fallida no llega a after_cursor_execute: descartar su inicio"""
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("kontax_sql_inicio"):
+        conn.info["kontax_sql_inicio"].pop()
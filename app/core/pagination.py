@@ -0,0 +1,66 @@
+"""
+Paginación por cursor (keyset) sobre (columna de orden, id)
+"""
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+import base64
+import json
+
+
+# Header con el cursor de la página siguiente (todas las listas paginadas por cursor)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(valor: datetime, id_: UUID) -> str:
+    """Cursor opaco con la posición del último item entregado"""
+    raw = json.dumps([valor.isoformat(), str(id_)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Raises:
+        ValueError: cursor mal formado
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valor, id_ = json.loads(raw)
+        return datetime.fromisoformat(valor), UUID(id_)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def keyset_page(
+    query: Query,
+    orden,
+    id_col,
+    cursor: Optional[str],
+    limit: int,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Página descendente por (orden, id) a partir del cursor
+
+    WHERE (orden, id) < (cursor) usa el índice (entity_id, orden DESC, id DESC): el
+    costo no crece con la profundidad como OFFSET, y el orden es estable
+    aunque varias filas compartan fecha.
+
+    Returns:
+        (items, cursor siguiente o None si es la última página)
+
+    Raises:
+        ValueError: cursor mal formado
+    """
+    if cursor:
+        valor, id_ = decode_cursor(cursor)
+        query = query.filter(tuple_(orden, id_col) < tuple_(valor, id_))
+
+    items = query.order_by(orden.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    ultimo = items[-1]
+    return items, encode_cursor(getattr(ultimo, orden.key), getattr(ultimo, id_col.key))
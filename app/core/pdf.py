@@ -0,0 +1,104 @@
+"""
+PDF en streaming: cada página se comprime y escribe al cerrarse
+
+Escritor mínimo (texto con las fuentes estándar Helvetica, WinAnsi). En
+memoria vive la página en curso y el offset de cada objeto para la tabla
+xref (8 bytes por objeto); el resto ya está en out.
+"""
+from array import array
+from typing import BinaryIO, List, Tuple
+import zlib
+
+# Objetos fijos; las páginas ocupan (página, contenido) desde PRIMERA_PAGINA
+CATALOGO, PAGINAS, INFO = 1, 2, 3
+FUENTES = {"Helvetica": 4, "Helvetica-Bold": 5}
+PRIMERA_PAGINA = 6
+
+
+def _texto(value: str) -> bytes:
+    """String literal PDF en WinAnsi, con ( ) \\ escapados y sin saltos de línea"""
+    crudo = " ".join(value.splitlines()).encode("cp1252", errors="replace")
+    return b"(" + crudo.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class PdfStream:
+    """Escritor PDF página a página sobre un stream binario"""
+
+    def __init__(self, out: BinaryIO, pagesize: Tuple[float, float], titulo: str = ""):
+        self.out = out
+        self.ancho, self.alto = pagesize
+        self.titulo = titulo
+        self.escritos = 0
+        self.offsets = array("q", [0] * (PRIMERA_PAGINA - 1))
+        self.ops: List[bytes] = []
+        self.fuente = b"/F4 9 Tf"
+        self.fuente_pagina = None
+        self.paginas = 0
+
+        self._escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for nombre, numero in FUENTES.items():
+            self._objeto(
+                numero,
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /" + nombre.encode()
+                + b" /Encoding /WinAnsiEncoding >>",
+            )
+
+    def _escribir(self, data: bytes) -> None:
+        self.out.write(data)
+        self.escritos += len(data)
+
+    def _objeto(self, numero: int, cuerpo: bytes) -> None:
+        if numero > len(self.offsets):
+            self.offsets.extend([0] * (numero - len(self.offsets)))
+        self.offsets[numero - 1] = self.escritos
+        self._escribir(b"%d 0 obj\n" % numero + cuerpo + b"\nendobj\n")
+
+    def set_fuente(self, nombre: str, tamano: float) -> None:
+        self.fuente = b"/F%d %g Tf" % (FUENTES[nombre], tamano)
+
+    def texto(self, x: float, y: float, value: str) -> None:
+        if self.fuente != self.fuente_pagina:
+            self.ops.append(self.fuente)
+            self.fuente_pagina = self.fuente
+        self.ops.append(b"1 0 0 1 %g %g Tm %s Tj" % (x, y, _texto(value)))
+
+    def nueva_pagina(self) -> None:
+        """Cerrar la página en curso: se comprime, se escribe y se libera"""
+        contenido = zlib.compress(b"BT\n" + b"\n".join(self.ops) + b"\nET")
+        pagina = PRIMERA_PAGINA + 2 * self.paginas
+        self._objeto(
+            pagina,
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %g %g] /Contents %d 0 R"
+            b" /Resources << /Font << /F4 %d 0 R /F5 %d 0 R >> >> >>"
+            % (PAGINAS, self.ancho, self.alto, pagina + 1, FUENTES["Helvetica"], FUENTES["Helvetica-Bold"]),
+        )
+        self._objeto(
+            pagina + 1,
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(contenido) + contenido + b"\nendstream",
+        )
+        self.paginas += 1
+        self.ops = []
+        self.fuente_pagina = None
+
+    def cerrar(self) -> None:
+        """Árbol de páginas, catálogo y xref; cierra la página abierta si tiene contenido"""
+        if self.ops or not self.paginas:
+            self.nueva_pagina()
+
+        # Kids se deduce de la numeración: no hace falta guardar las páginas
+        self.offsets[PAGINAS - 1] = self.escritos
+        self._escribir(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (PAGINAS, self.paginas))
+        for i in range(self.paginas):
+            self._escribir(b"%d 0 R " % (PRIMERA_PAGINA + 2 * i))
+        self._escribir(b"] >>\nendobj\n")
+        self._objeto(CATALOGO, b"<< /Type /Catalog /Pages %d 0 R >>" % PAGINAS)
+        self._objeto(INFO, b"<< /Title %s /Producer (KONTAX) >>" % _texto(self.titulo))
+
+        xref = self.escritos
+        self._escribir(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.offsets) + 1))
+        for offset in self.offsets:
+            self._escribir(b"%010d 00000 n \n" % offset)
+        self._escribir(
+            b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self.offsets) + 1, CATALOGO, INFO, xref)
+        )
@@ -0,0 +1,159 @@
+"""
+Pool de conexiones: tamaño por presupuesto del nodo y telemetría
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+import logging
+import os
+import time
+import weakref
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+    HAS_PROMETHEUS = True
+except ImportError:
+    HAS_PROMETHEUS = False
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Mínimo de conexiones por engine aunque el presupuesto no alcance
+MIN_CONEXIONES_ENGINE = 2
+
+if HAS_PROMETHEUS:
+    POOL_SIZE = Gauge("kontax_db_pool_size", "Conexiones permanentes del pool", ["pool"])
+    POOL_CHECKED_OUT = Gauge("kontax_db_pool_checked_out", "Conexiones en uso", ["pool"])
+    POOL_OVERFLOW = Gauge("kontax_db_pool_overflow", "Conexiones abiertas sobre pool_size", ["pool"])
+    POOL_ESPERA = Histogram(
+        "kontax_db_pool_wait_seconds",
+        "Espera para obtener una conexión del pool",
+        ["pool"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+    )
+    POOL_USO = Histogram(
+        "kontax_db_pool_checkout_seconds",
+        "Tiempo que una conexión queda tomada (checkout a checkin)",
+        ["pool"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 300),
+    )
+    POOL_TIMEOUTS = Counter("kontax_db_pool_timeouts_total", "Esperas que agotaron pool_timeout", ["pool"])
+
+
+def procesos_nodo() -> int:
+    """Procesos del nodo que abren su propio pool (workers uvicorn o hijos celery)"""
+    return settings.DATABASE_PROCESOS_NODO or int(os.environ.get("WEB_CONCURRENCY", 1))
+
+
+def engines_proceso() -> int:
+    """Pools que abre cada proceso: primario, una por réplica y una por shard adicional"""
+    return 1 + len(settings.DATABASE_REPLICA_URLS) + len(settings.DATABASE_SHARDS)
+
+
+def tamano_pool() -> Tuple[int, int]:
+    """
+    (pool_size, max_overflow) de cada engine de este proceso
+
+    DATABASE_CONEXIONES_NODO se reparte entre los procesos del nodo y,
+    dentro de cada uno, entre sus engines: la suma de todos los pools
+    nunca pasa el presupuesto, y escalar procesos, réplicas o shards
+    achica cada pool en vez de agotar max_connections. Mitad permanente,
+    mitad overflow que se cierra al devolverse.
+    """
+    por_engine = max(
+        settings.DATABASE_CONEXIONES_NODO // (procesos_nodo() * engines_proceso()),
+        MIN_CONEXIONES_ENGINE,
+    )
+    pool_size = (por_engine + 1) // 2
+    return pool_size, por_engine - pool_size
+
+
+def engine_kwargs() -> Dict[str, Any]:
+    """
+    Argumentos de create_engine comunes (tamaño y modo pgbouncer)
+
+    Con DATABASE_PGBOUNCER (pooling por transacción) una conexión del
+    servidor no sobrevive a la transacción: sin pre-ping, que gastaría
+    una transacción extra por checkout.
+    """
+    pool_size, max_overflow = tamano_pool()
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_pre_ping": not settings.DATABASE_PGBOUNCER,
+    }
+
+
+def asyncpg_connect_args() -> Dict[str, Any]:
+    """connect_args de asyncpg: tras pgbouncer sin caché de prepared statements"""
+    if settings.DATABASE_PGBOUNCER:
+        return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    return {}
+
+
+# Inicio de la espera por conexión en el contexto actual: se marca al abrir
+# la transacción raíz de una sesión y la consume el checkout que la sigue
+_espera_desde: ContextVar[Optional[float]] = ContextVar("kontax_pool_espera", default=None)
+
+# engine -> nombre del pool en las métricas
+_nombres: "weakref.WeakKeyDictionary[Engine, str]" = weakref.WeakKeyDictionary()
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _marcar_espera(session, transaction) -> None:
+    if transaction.parent is None:
+        _espera_desde.set(time.perf_counter())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _sin_conexion(session, transaction) -> None:
+    """Transacción raíz que terminó sin checkout tras pool_timeout: timeout del pool"""
+    inicio = _espera_desde.get()
+    if transaction.parent is not None or inicio is None:
+        return
+    _espera_desde.set(None)
+    if time.perf_counter() - inicio < settings.DATABASE_POOL_TIMEOUT:
+        return
+    nombre = _nombres.get(session.bind, "desconocido")
+    if HAS_PROMETHEUS:
+        POOL_TIMEOUTS.labels(nombre).inc()
+    pool = getattr(session.bind, "pool", None)
+    if isinstance(pool, QueuePool):
+        logger.warning(f"Pool {nombre} agotado: {pool.checkedout()} en uso, overflow {max(pool.overflow(), 0)}")
+
+
+def registrar_pool(engine: Engine, nombre: str) -> None:
+    """
+    Exportar uso del pool del engine (leído al hacer scrape) y medir, con
+    los eventos checkout/checkin, la espera por conexión y el tiempo que
+    cada conexión queda tomada
+    """
+    _nombres[engine] = nombre
+    if not HAS_PROMETHEUS or not isinstance(engine.pool, QueuePool):
+        return
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        ahora = time.perf_counter()
+        inicio = _espera_desde.get()
+        if inicio is not None:
+            _espera_desde.set(None)
+            POOL_ESPERA.labels(nombre).observe(ahora - inicio)
+        connection_record.info["kontax_checkout"] = ahora
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record) -> None:
+        inicio = connection_record.info.pop("kontax_checkout", None)
+        if inicio is not None:
+            POOL_USO.labels(nombre).observe(time.perf_counter() - inicio)
+
+    # engine.pool en cada lectura: dispose() reemplaza el pool
+    POOL_SIZE.labels(nombre).set_function(lambda: engine.pool.size())
+    POOL_CHECKED_OUT.labels(nombre).set_function(lambda: engine.pool.checkedout())
+    POOL_OVERFLOW.labels(nombre).set_function(lambda: max(engine.pool.overflow(), 0))
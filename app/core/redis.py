@@ -0,0 +1,13 @@
+"""
+Redis client compartido (locks, single-flight, caches cortas)
+"""
+from functools import lru_cache
+import redis
+
+from app.config import settings
+
+
+@lru_cache()
+def get_redis() -> redis.Redis:
+    """Cliente Redis por proceso (pool de conexiones interno)"""
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -0,0 +1,234 @@
+"""
+Sharding por entidad: directorio entidad -> shard y sesiones por shard
+"""
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Generator, Iterable, Iterator, List, Optional, Tuple, TypeVar
+from uuid import UUID
+import contextvars
+import logging
+import time
+
+from app.config import settings
+from app.core.database import SessionLocal, engine, get_db, get_read_db, read_sessionmaker
+from app.core.pool import engine_kwargs, registrar_pool
+from app.models.entity_shard import EntityShard
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+# Shard de DATABASE_URL: también guarda el directorio y los datos globales
+# (entities, users, reportes)
+SHARD_PRINCIPAL = "principal"
+
+shard_engines = {SHARD_PRINCIPAL: engine}
+ShardSessions: Dict[str, sessionmaker] = {SHARD_PRINCIPAL: SessionLocal}
+for _nombre, _url in settings.DATABASE_SHARDS.items():
+    shard_engines[_nombre] = create_engine(
+        _url,
+        echo=settings.DATABASE_ECHO,
+        **engine_kwargs(),
+    )
+    registrar_pool(shard_engines[_nombre], f"shard_{_nombre}")
+    ShardSessions[_nombre] = sessionmaker(autocommit=False, autoflush=False, bind=shard_engines[_nombre])
+
+# entity_id -> (instante lectura, shard, estado)
+_directorio: Dict[UUID, Tuple[float, str, str]] = {}
+
+
+class ShardBloqueado(Exception):
+    """Entidad en el corte de una migración entre shards: escrituras rechazadas"""
+
+
+def ubicar_varias(entity_ids: Iterable[UUID]) -> Dict[UUID, Tuple[str, str]]:
+    """
+    (shard, estado) de cada entidad
+
+    El directorio se cachea SHARD_DIRECTORIO_TTL segundos por proceso; las
+    entidades sin caché vigente se leen en una consulta. Sin shards
+    adicionales configurados todo vive en el principal y no se consulta.
+    """
+    ids = set(entity_ids)
+    if not settings.DATABASE_SHARDS:
+        return {entity_id: (SHARD_PRINCIPAL, "activo") for entity_id in ids}
+
+    ahora = time.monotonic()
+    ubicadas: Dict[UUID, Tuple[str, str]] = {}
+    faltan = []
+    for entity_id in ids:
+        cache = _directorio.get(entity_id)
+        if cache and ahora - cache[0] < settings.SHARD_DIRECTORIO_TTL:
+            ubicadas[entity_id] = cache[1:]
+        else:
+            faltan.append(entity_id)
+
+    if faltan:
+        with engine.connect() as connection:
+            filas = {
+                row.entity_id: (row.shard, row.estado)
+                for row in connection.execute(
+                    select(EntityShard.entity_id, EntityShard.shard, EntityShard.estado)
+                    .where(EntityShard.entity_id.in_(faltan))
+                )
+            }
+        for entity_id in faltan:
+            shard, estado = filas.get(entity_id, (SHARD_PRINCIPAL, "activo"))
+            if shard not in ShardSessions:
+                raise RuntimeError(f"Shard '{shard}' de la entidad {entity_id} no está en DATABASE_SHARDS")
+            _directorio[entity_id] = (ahora, shard, estado)
+            ubicadas[entity_id] = (shard, estado)
+
+    return ubicadas
+
+
+def ubicar(entity_id: UUID) -> Tuple[str, str]:
+    return ubicar_varias([entity_id])[entity_id]
+
+
+def shard_de(entity_id: UUID) -> str:
+    return ubicar(entity_id)[0]
+
+
+def agrupar_por_shard(entity_ids: Iterable[UUID]) -> Dict[str, List[UUID]]:
+    """Entidades agrupadas por shard (para consultas multi-entidad)"""
+    grupos: Dict[str, List[UUID]] = {}
+    for entity_id, (shard, _) in ubicar_varias(entity_ids).items():
+        grupos.setdefault(shard, []).append(entity_id)
+    return grupos
+
+
+def invalidar(entity_id: UUID) -> None:
+    """Olvidar la ubicación cacheada (tras cambiarla en este proceso)"""
+    _directorio.pop(entity_id, None)
+
+
+def verificar_escritura(entity_id: UUID) -> None:
+    """
+    Raises:
+        ShardBloqueado: la entidad está en el corte de una migración
+    """
+    if ubicar(entity_id)[1] == "bloqueado":
+        raise ShardBloqueado(f"Entidad {entity_id} en migración de shard, reintentar en unos segundos")
+
+
+@contextmanager
+def sesion_shard(db: Session, shard: str) -> Iterator[Session]:
+    """db si el shard es el principal; si no, una sesión propia del shard"""
+    if shard == SHARD_PRINCIPAL:
+        yield db
+        return
+    sesion = ShardSessions[shard]()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@contextmanager
+def datos_entidad(db: Session, entity_id: UUID, escritura: bool = False) -> Iterator[Session]:
+    """
+    Sesión donde viven los datos de la entidad
+
+    Sin shards (o entidad en el principal) es la misma db del request, sin
+    costo extra. Los commits sobre la sesión entregada son del llamador.
+
+    Raises:
+        ShardBloqueado: escritura durante el corte de una migración
+    """
+    if escritura:
+        verificar_escritura(entity_id)
+    with sesion_shard(db, shard_de(entity_id)) as sesion:
+        yield sesion
+
+
+def get_entity_db(entity_id: UUID, db: Session = Depends(get_db)) -> Generator[Session, None, None]:
+    """Dependency: sesión de escritura en el shard de ?entity_id / {entity_id}"""
+    with datos_entidad(db, entity_id, escritura=True) as sesion:
+        yield sesion
+
+
+def get_entity_read_db(entity_id: UUID, db: Session = Depends(get_read_db)) -> Generator[Session, None, None]:
+    """Dependency: lecturas en el shard de la entidad (réplica si es el principal)"""
+    with datos_entidad(db, entity_id) as sesion:
+        yield sesion
+
+
+def read_sessionmaker_entidad(request: Request, entity_id: UUID) -> sessionmaker:
+    """Session factory para lecturas fuera del request (streaming) de una entidad"""
+    shard = shard_de(entity_id)
+    if shard == SHARD_PRINCIPAL:
+        return read_sessionmaker(request)
+    return ShardSessions[shard]
+
+
+def _en_paralelo(tareas: Dict[str, Callable[[Session], T]], db: Optional[Session]) -> Dict[str, T]:
+    """Una tarea por shard, cada una con su sesión en un thread"""
+
+    def correr(nombre: str) -> T:
+        if nombre == SHARD_PRINCIPAL and db is not None:
+            return tareas[nombre](db)
+        with ShardSessions[nombre]() as sesion:
+            return tareas[nombre](sesion)
+
+    if len(tareas) <= 1:
+        return {nombre: correr(nombre) for nombre in tareas}
+
+    with ThreadPoolExecutor(max_workers=len(tareas)) as pool:
+        futuros = {nombre: pool.submit(contextvars.copy_context().run, correr, nombre) for nombre in tareas}
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+
+def fan_out(
+    fn: Callable[[Session], T],
+    shards: Optional[Iterable[str]] = None,
+    db: Optional[Session] = None,
+) -> Dict[str, T]:
+    """
+    Ejecutar fn(sesión) en cada shard en paralelo (consultas cross-entidad)
+
+    Cada shard usa su propia sesión en un thread; el principal usa db si
+    se entrega (la del request, quizás una réplica). El contexto del
+    request (instrumentación SQL) se propaga a los threads. El merge es
+    del llamador.
+
+    Returns:
+        {shard: resultado}
+    """
+    nombres = list(shards) if shards is not None else list(ShardSessions)
+    return _en_paralelo({nombre: fn for nombre in nombres}, db)
+
+
+def fan_out_entidades(
+    fn: Callable[[Session, List[UUID]], T],
+    entity_ids: Iterable[UUID],
+    db: Optional[Session] = None,
+) -> Dict[str, T]:
+    """fn(sesión, entidades del shard) en paralelo, solo en los shards involucrados"""
+    return _en_paralelo(
+        {shard: partial(fn, entity_ids=ids) for shard, ids in agrupar_por_shard(entity_ids).items()},
+        db,
+    )
+
+
+def buscar_en_shards(
+    fn: Callable[[Session], Optional[T]],
+    entity_id: Optional[UUID] = None,
+    db: Optional[Session] = None,
+) -> Optional[T]:
+    """
+    Primer resultado no nulo de fn (búsqueda por ID sin entidad conocida)
+
+    Con entity_id (ej: usuario no admin, que solo ve su entidad) se busca
+    solo en su shard.
+    """
+    shards = [shard_de(entity_id)] if entity_id else None
+    for resultado in fan_out(fn, shards, db).values():
+        if resultado is not None:
+            return resultado
+    return None
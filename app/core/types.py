@@ -0,0 +1,38 @@
+"""
+Tipos de columna SQLAlchemy propios
+"""
+from sqlalchemy.types import TypeDecorator, LargeBinary
+import json
+import zlib
+
+
+# Payloads bajo este tamaño se guardan sin comprimir
+COMPRESS_MIN_BYTES = 4096
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    JSON guardado como bytea, comprimido con zlib si supera COMPRESS_MIN_BYTES.
+
+    Primer byte marca el formato: b"z" zlib, b"j" JSON plano. Para payloads
+    grandes (resultados por entidad, reportes con detalle) reduce el tamaño
+    en tabla/TOAST y el tráfico DB varias veces.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        raw = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+        if len(raw) >= COMPRESS_MIN_BYTES:
+            return b"z" + zlib.compress(raw, 6)
+        return b"j" + raw
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        value = bytes(value)
+        if value[:1] == b"z":
+            return json.loads(zlib.decompress(value[1:]))
+        return json.loads(value[1:])
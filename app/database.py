@@ -1,25 +1,42 @@
 # app/database.py
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import NullPool
+from typing import Optional
 from app.config import settings
+from app.core.pool import asyncpg_connect_args
 
-# Crear engine asíncrono
-engine = create_async_engine(
-    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=settings.DEBUG,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
-)
-
-# Session maker
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False
-)
+# Engine asíncrono legado: se crea al primer uso y sin pool propio, así no
+# reserva conexiones del presupuesto del nodo (lo usan los engines de app.core)
+_engine: Optional[AsyncEngine] = None
+_session_local: Optional[async_sessionmaker] = None
+
+
+def get_engine() -> AsyncEngine:
+    """Engine asíncrono (NullPool), creado la primera vez que se pide"""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+            echo=settings.DEBUG,
+            poolclass=NullPool,
+            connect_args=asyncpg_connect_args(),
+        )
+    return _engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Session asíncrona sobre el engine legado"""
+    global _session_local
+    if _session_local is None:
+        _session_local = async_sessionmaker(
+            get_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False
+        )
+    return _session_local()
 
 # Base para models
 Base = declarative_base()
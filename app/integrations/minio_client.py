@@ -0,0 +1,102 @@
+"""
+MinIO Client - Almacenamiento de objetos S3 (evidencias, reportes)
+"""
+from minio import Minio
+from minio.error import S3Error
+from datetime import timedelta
+from typing import BinaryIO
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de parte multipart (MinIO exige >= 5 MiB)
+PART_SIZE = 10 * 1024 * 1024
+
+
+class MinioClient:
+    """Cliente MinIO / S3"""
+
+    def __init__(self):
+        self.client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+        )
+
+    def subir_stream(
+        self,
+        bucket: str,
+        key: str,
+        data: BinaryIO,
+        content_type: str = "application/octet-stream"
+    ) -> None:
+        """
+        Subir archivo en partes (S3 multipart) sin cargarlo completo en memoria
+
+        Args:
+            bucket: Bucket destino
+            key: Nombre del objeto
+            data: File-like posicionado al inicio
+            content_type: MIME type del objeto
+        """
+        try:
+            if not self.client.bucket_exists(bucket):
+                self.client.make_bucket(bucket)
+
+            self.client.put_object(
+                bucket,
+                key,
+                data,
+                length=-1,
+                part_size=PART_SIZE,
+                content_type=content_type,
+            )
+
+            logger.info(f"Objeto subido a MinIO: {bucket}/{key}")
+
+        except S3Error as e:
+            logger.error(f"Error subiendo {bucket}/{key} a MinIO: {e}")
+            raise
+
+    def abrir(self, bucket: str, key: str):
+        """
+        Stream de lectura de un objeto (file-like)
+
+        El llamador debe cerrar la respuesta: resp.close(); resp.release_conn()
+        """
+        return self.client.get_object(bucket, key)
+
+    def descargar(self, bucket: str, key: str, path: str) -> None:
+        """Descargar un objeto a un archivo local (por partes, sin memoria)"""
+        self.client.fget_object(bucket, key, path)
+
+    def existe(self, bucket: str, key: str) -> bool:
+        """Verificar si existe un objeto"""
+        try:
+            self.client.stat_object(bucket, key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchBucket", "NoSuchObject"):
+                return False
+            raise
+
+    def url_descarga(self, bucket: str, key: str, expira_minutos: int) -> str:
+        """
+        URL prefirmada de descarga directa desde MinIO
+
+        Args:
+            bucket: Bucket
+            key: Nombre del objeto
+            expira_minutos: Vigencia de la URL
+
+        Returns:
+            URL GET prefirmada
+        """
+        return self.client.presigned_get_object(
+            bucket,
+            key,
+            expires=timedelta(minutes=expira_minutos),
+        )
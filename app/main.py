@@ -4,12 +4,15 @@ Primer Estudio Contable Ambiental de Chile
 """
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 import logging
 
 from app.config import settings
-from app.core.database import init_db
+from app.core import instrumentation
+from app.core.database import init_db, marcar_escritura, replica_engines
+from app.core.sharding import ShardBloqueado
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,8 +40,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-DB-Statements", "X-DB-Time-Ms", "X-DB-N1"],
 )
 
+# Comprimir respuestas grandes (listas, reportes)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Tras una escritura exitosa, las lecturas del usuario van al primario"""
+    response = await call_next(request)
+    if (
+        replica_engines
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        marcar_escritura(request)
+    return response
+
+
+@app.middleware("http")
+async def sql_por_request(request: Request, call_next):
+    """Sentencias y tiempo en DB del request (headers con DEBUG, métricas siempre)"""
+    stats = instrumentation.iniciar_request()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    instrumentation.cerrar_request(stats, route.path if route else "sin_ruta")
+    if settings.DEBUG:
+        response.headers.update(instrumentation.headers_debug(stats))
+    return response
+
+
+@app.exception_handler(ShardBloqueado)
+async def shard_bloqueado_handler(request: Request, exc: ShardBloqueado):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(settings.SHARD_MOVER_ESPERA)},
+        content={"detail": str(exc)},
+    )
+
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -52,13 +93,22 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas Prometheus (requiere prometheus_client)"""
+    if not instrumentation.HAS_PROMETHEUS:
+        return JSONResponse(status_code=404, content={"detail": "Métricas requieren prometheus_client"})
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "app": settings.APP_NAME, "version": settings.APP_VERSION}
 
 
 # ═══ ROUTERS ═══
-from app.api.v1 import auth, entities, asientos, reportes, evidencias, factores, financiamiento, ai, valorizador
+from app.api.v1 import auth, entities, asientos, reportes, evidencias, factores, financiamiento, ai, valorizador, analitica
 from app.api.v1.integrations import sii as sii_integration, boostr as boostr_integration
 
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
@@ -69,6 +119,7 @@ app.include_router(reportes.router, prefix="/api/v1/reportes", tags=["reportes"]
 app.include_router(evidencias.router, prefix="/api/v1/evidencias", tags=["evidencias"])
 app.include_router(factores.router, prefix="/api/v1/factores", tags=["factores-mma"])
 app.include_router(financiamiento.router, prefix="/api/v1/financiamiento", tags=["financiamiento-verde"])
+app.include_router(analitica.router, prefix="/api/v1/analitica", tags=["analitica"])
 app.include_router(sii_integration.router, prefix="/api/v1/integrations/sii", tags=["integrations-sii"])
 app.include_router(boostr_integration.router, prefix="/api/v1/integrations/boostr", tags=["integrations-boostr"])
 app.include_router(ai.router, prefix="/api/v1/ai", tags=["ai"])
@@ -90,6 +141,7 @@ async def root():
             "evidencias": "/api/v1/evidencias",
             "factores": "/api/v1/factores",
             "financiamiento": "/api/v1/financiamiento",
+            "analitica": "/api/v1/analitica",
             "sii": "/api/v1/integrations/sii",
             "boostr": "/api/v1/integrations/boostr",
         },
@@ -0,0 +1,186 @@
+"""
+Baseline: esquema creado hasta ahora por init_db (create_all)
+
+Congelado a las tablas tal como existían al introducir alembic: los
+cambios posteriores de los modelos los hacen las migraciones siguientes.
+users, factors y reportes (destino de FKs) vienen de modelos previos a
+este paquete y deben existir antes.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Bases ya creadas con create_all: solo se crean las tablas que falten
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "entities" not in existentes:
+        op.create_table(
+            "entities",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("rut", sa.String(12), nullable=False),
+            sa.Column("razon_social", sa.String(255), nullable=False),
+            sa.Column("nombre_fantasia", sa.String(255)),
+            sa.Column("giro", sa.String(500)),
+            sa.Column("direccion", sa.String(500)),
+            sa.Column("comuna", sa.String(100)),
+            sa.Column("region", sa.String(100)),
+            sa.Column("pais", sa.String(2)),
+            sa.Column("sector", sa.String(100)),
+            sa.Column("tamanio", sa.String(50)),
+            sa.Column("num_empleados", sa.Integer),
+            sa.Column("ventas_anuales", sa.Integer),
+            sa.Column("plan", sa.String(50)),
+            sa.Column("estado", sa.String(50)),
+            sa.Column("sii_configurado", sa.Boolean),
+            sa.Column("sii_rut", sa.String(12)),
+            sa.Column("sii_password_encrypted", sa.String(500)),
+            sa.Column("ultima_sync_sii", sa.DateTime),
+            sa.Column("metadata_json", sa.JSON),
+            sa.Column("created_at", sa.DateTime, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+        op.create_index("ix_entities_rut", "entities", ["rut"], unique=True)
+
+    if "evidences" not in existentes:
+        op.create_table(
+            "evidences",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), nullable=False),
+            sa.Column("tipo", sa.String(100), nullable=False),
+            sa.Column("source", sa.String(100), nullable=False),
+            sa.Column("source_id", sa.String(255)),
+            sa.Column("fecha", sa.DateTime, nullable=False),
+            sa.Column("descripcion", sa.Text),
+            sa.Column("archivo_url", sa.String(500)),
+            sa.Column("archivo_nombre", sa.String(255)),
+            sa.Column("archivo_tipo", sa.String(50)),
+            sa.Column("archivo_hash", sa.String(64)),
+            sa.Column("metadata_json", sa.JSON),
+            sa.Column("blockchain_hash", sa.String(64)),
+            sa.Column("blockchain_timestamp", sa.DateTime),
+            sa.Column("estado", sa.String(50)),
+            sa.Column("created_at", sa.DateTime, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+        op.create_index("ix_evidences_entity_id", "evidences", ["entity_id"])
+        op.create_index("ix_evidences_tipo", "evidences", ["tipo"])
+        op.create_index("ix_evidences_fecha", "evidences", ["fecha"])
+
+    if "asientos_verdes" not in existentes:
+        op.create_table(
+            "asientos_verdes",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), nullable=False),
+            sa.Column("fecha", sa.DateTime, nullable=False),
+            sa.Column("periodo", sa.String(7), nullable=False),
+            sa.Column("tipo", sa.String(100), nullable=False),
+            sa.Column("categoria", sa.String(100), nullable=False),
+            sa.Column("subcategoria", sa.String(100)),
+            sa.Column("descripcion", sa.Text, nullable=False),
+            sa.Column("cantidad_fisica", sa.Float, nullable=False),
+            sa.Column("unidad_fisica", sa.String(50), nullable=False),
+            sa.Column("factor_id", UUID(as_uuid=True), sa.ForeignKey("factors.id")),
+            sa.Column("factor_valor", sa.Float),
+            sa.Column("factor_unidad", sa.String(50)),
+            sa.Column("emisiones_tco2e", sa.Float),
+            sa.Column("consumo_agua_m3", sa.Float),
+            sa.Column("residuos_kg", sa.Float),
+            sa.Column("alcance_gei", sa.Integer),
+            sa.Column("debe_cuenta", sa.String(20)),
+            sa.Column("debe_nombre", sa.String(255)),
+            sa.Column("debe_monto", sa.Float),
+            sa.Column("haber_cuenta", sa.String(20)),
+            sa.Column("haber_nombre", sa.String(255)),
+            sa.Column("haber_monto", sa.Float),
+            sa.Column("evidencia_id", UUID(as_uuid=True), sa.ForeignKey("evidences.id")),
+            sa.Column("metadata_json", sa.JSON),
+            sa.Column("taxonomia_clasificacion", sa.String(50)),
+            sa.Column("taxonomia_criterio", sa.Text),
+            sa.Column("estado", sa.String(50)),
+            sa.Column("creado_por", sa.String(100)),
+            sa.Column("verificado_por", sa.String(100)),
+            sa.Column("verificado_at", sa.DateTime),
+            sa.Column("created_at", sa.DateTime, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+        op.create_index("ix_asientos_verdes_entity_id", "asientos_verdes", ["entity_id"])
+        op.create_index("ix_asientos_verdes_fecha", "asientos_verdes", ["fecha"])
+        op.create_index("ix_asientos_verdes_periodo", "asientos_verdes", ["periodo"])
+        op.create_index("ix_asientos_verdes_tipo", "asientos_verdes", ["tipo"])
+
+    if "agregados_mensuales" not in existentes:
+        op.create_table(
+            "agregados_mensuales",
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), primary_key=True),
+            sa.Column("periodo", sa.String(7), primary_key=True),
+            sa.Column("agregados", sa.JSON, nullable=False),
+            sa.Column("version", sa.String(64), nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+
+    if "green_score_componentes" not in existentes:
+        op.create_table(
+            "green_score_componentes",
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), primary_key=True),
+            sa.Column("periodo", sa.String(7), primary_key=True),
+            sa.Column("asientos", sa.Integer, nullable=False),
+            sa.Column("verdes", sa.Integer, nullable=False),
+            sa.Column("transicion", sa.Integer, nullable=False),
+            sa.Column("activos_clp", sa.Float, nullable=False),
+            sa.Column("pasivos_clp", sa.Float, nullable=False),
+            sa.Column("emisiones_tco2e", sa.Float, nullable=False),
+            sa.Column("tendencia_periodos", sa.Integer, nullable=False),
+            sa.Column("tendencia_pendiente", sa.Float),
+            sa.Column("tendencia_relativa", sa.Float),
+            sa.Column("updated_at", sa.DateTime),
+        )
+
+    if "portfolio_reportes" not in existentes:
+        op.create_table(
+            "portfolio_reportes",
+            sa.Column("id", UUID(as_uuid=True), primary_key=True),
+            sa.Column("tipo", sa.String(50), nullable=False),
+            sa.Column("periodo", sa.String(7), nullable=False),
+            sa.Column("estado", sa.String(50)),
+            sa.Column("total_entidades", sa.Integer),
+            sa.Column("entidades_procesadas", sa.Integer),
+            sa.Column("resumen_json", sa.JSON),
+            sa.Column("resultados_json", sa.LargeBinary),  # CompressedJSON
+            sa.Column("error", sa.String(500)),
+            sa.Column("generado_por", sa.String(100)),
+            sa.Column("created_at", sa.DateTime, nullable=False),
+            sa.Column("completado_at", sa.DateTime),
+        )
+
+    if "reportes_cache" not in existentes:
+        op.create_table(
+            "reportes_cache",
+            sa.Column("reporte_id", UUID(as_uuid=True), sa.ForeignKey("reportes.id"), primary_key=True),
+            sa.Column("fingerprint", sa.String(64), nullable=False),
+            sa.Column("created_at", sa.DateTime, nullable=False),
+        )
+        op.create_index("ix_reportes_cache_fingerprint", "reportes_cache", ["fingerprint"])
+
+
+def downgrade() -> None:
+    for tabla in [
+        "reportes_cache",
+        "portfolio_reportes",
+        "green_score_componentes",
+        "agregados_mensuales",
+        "asientos_verdes",
+        "evidences",
+        "entities",
+    ]:
+        op.drop_table(tabla)
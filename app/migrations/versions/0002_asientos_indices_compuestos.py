@@ -0,0 +1,89 @@
+"""
+Índices compuestos y parciales de asientos_verdes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+VIGENTE = sa.text("estado IN ('confirmado', 'validado')")
+
+# Columnas que suman stats: el índice parcial de período las cubre
+INCLUDE_STATS = [
+    "estado", "categoria", "alcance_gei", "emisiones_tco2e",
+    "consumo_agua_m3", "residuos_kg", "debe_monto", "haber_monto",
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY no bloquea escrituras, pero no corre dentro de transacción
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_asientos_verdes_entity_periodo_estado",
+            "asientos_verdes",
+            ["entity_id", "periodo", "estado"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_asientos_verdes_entity_fecha",
+            "asientos_verdes",
+            ["entity_id", sa.text("fecha DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_asientos_verdes_vigentes_periodo",
+            "asientos_verdes",
+            ["entity_id", "periodo"],
+            postgresql_where=VIGENTE,
+            postgresql_include=INCLUDE_STATS,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_asientos_verdes_vigentes_fecha",
+            "asientos_verdes",
+            ["entity_id", sa.text("fecha DESC")],
+            postgresql_where=VIGENTE,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Cubierto por los compuestos que empiezan por entity_id
+        op.drop_index(
+            "ix_asientos_verdes_entity_id",
+            table_name="asientos_verdes",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_asientos_verdes_entity_id",
+            "asientos_verdes",
+            ["entity_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        for nombre in (
+            "ix_asientos_verdes_vigentes_fecha",
+            "ix_asientos_verdes_vigentes_periodo",
+            "ix_asientos_verdes_entity_fecha",
+            "ix_asientos_verdes_entity_periodo_estado",
+        ):
+            op.drop_index(
+                nombre,
+                table_name="asientos_verdes",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,272 @@
+"""
+Particionar asientos_verdes por mes (RANGE sobre periodo)
+
+Conversión online: la tabla particionada se crea al lado y se llena por
+lotes (una transacción cada uno) mientras un trigger replica las
+escrituras concurrentes; el reemplazo final es un rename bajo un lock
+breve. Las escrituras solo esperan ese rename.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+from datetime import date
+import re
+import time
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+TABLA = "asientos_verdes"
+NUEVA = "asientos_verdes_particionada"
+ANTERIOR = "asientos_verdes_sin_particion"
+TRIGGER = "asientos_verdes_espejo"
+
+# Meses futuros con partición al migrar; después los crea mantenimiento.particiones
+MESES_ADELANTE = 3
+
+# Filas por lote de copia (una transacción por lote)
+LOTE_COPIA = 10000
+
+# Espera máxima por el lock del reemplazo y reintentos si se agota
+LOCK_TIMEOUT = "5s"
+INTENTOS_REEMPLAZO = 10
+
+
+def _sumar_meses(periodo: str, meses: int) -> str:
+    indice = int(periodo[:4]) * 12 + int(periodo[5:7]) - 1 + meses
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+def _periodo_actual() -> str:
+    hoy = date.today()
+    return f"{hoy.year:04d}-{hoy.month:02d}"
+
+
+def _crear_particiones(conn, padre: str, desde: str, hasta: str) -> None:
+    conn.execute(sa.text(f"CREATE TABLE IF NOT EXISTS {TABLA}_default PARTITION OF {padre} DEFAULT"))
+    periodo = desde
+    while periodo <= hasta:
+        conn.execute(
+            sa.text(
+                f"CREATE TABLE IF NOT EXISTS {TABLA}_p{periodo[:4]}_{periodo[5:7]} PARTITION OF {padre} "
+                f"FOR VALUES FROM ('{periodo}') TO ('{_sumar_meses(periodo, 1)}')"
+            )
+        )
+        periodo = _sumar_meses(periodo, 1)
+
+
+def _indices(conn, tabla: str) -> list:
+    return conn.execute(
+        sa.text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = :tabla AND indexname <> :pkey"
+        ),
+        {"tabla": tabla, "pkey": f"{tabla}_pkey"},
+    ).all()
+
+
+def _fks(conn, tabla: str) -> list:
+    return conn.execute(
+        sa.text(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = CAST(:tabla AS regclass) AND contype = 'f'"
+        ),
+        {"tabla": tabla},
+    ).all()
+
+
+def _crear_nueva(conn) -> None:
+    """
+    Tabla particionada vacía con las columnas, FKs e índices de la actual
+    (índices con sufijo _nuevo hasta el reemplazo). Crearlos sobre la
+    tabla vacía es instantáneo; la copia los mantiene.
+    """
+    if conn.execute(sa.text("SELECT to_regclass(:tabla)"), {"tabla": NUEVA}).scalar():
+        return
+
+    conn.execute(
+        sa.text(
+            f"CREATE TABLE {NUEVA} (LIKE {TABLA} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (periodo)"
+        )
+    )
+    # La clave de partición debe ser parte de la PK
+    conn.execute(sa.text(f"ALTER TABLE {NUEVA} ADD CONSTRAINT {NUEVA}_pkey PRIMARY KEY (id, periodo)"))
+
+    desde = conn.execute(
+        sa.text(f"SELECT min(periodo) FROM {TABLA} WHERE periodo ~ '^[0-9]{{4}}-[0-9]{{2}}$'")
+    ).scalar()
+    actual = _periodo_actual()
+    _crear_particiones(conn, NUEVA, min(desde or actual, actual), _sumar_meses(actual, MESES_ADELANTE))
+
+    for nombre, definicion in _fks(conn, TABLA):
+        conn.execute(sa.text(f"ALTER TABLE {NUEVA} ADD CONSTRAINT {nombre} {definicion}"))
+    for nombre, definicion in _indices(conn, TABLA):
+        conn.execute(
+            sa.text(
+                re.sub(
+                    r"^CREATE (UNIQUE )?INDEX \S+ ON (\S+\.)?\S+ ",
+                    lambda m: f"CREATE {m.group(1) or ''}INDEX {nombre}_nuevo ON {NUEVA} ",
+                    definicion,
+                )
+            )
+        )
+
+
+def _instalar_trigger(conn) -> None:
+    """Replicar en la tabla nueva las escrituras sobre la actual mientras se copia"""
+    conn.execute(
+        sa.text(
+            f"""
+            CREATE OR REPLACE FUNCTION {TRIGGER}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {NUEVA} WHERE id = OLD.id AND periodo = OLD.periodo;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {NUEVA} SELECT NEW.* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+    )
+    conn.execute(sa.text(f"DROP TRIGGER IF EXISTS {TRIGGER} ON {TABLA}"))
+    conn.execute(
+        sa.text(
+            f"CREATE TRIGGER {TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {TABLA} "
+            f"FOR EACH ROW EXECUTE FUNCTION {TRIGGER}()"
+        )
+    )
+
+
+def _copiar(conn) -> None:
+    """
+    Copiar por lotes en orden de id, una transacción por lote
+
+    FOR SHARE bloquea las filas del lote hasta su commit: un UPDATE/DELETE
+    concurrente espera y su trigger corrige la fila ya copiada (sin filas
+    fantasma). Lo que el trigger ya copió se salta (ON CONFLICT).
+    """
+    ultimo = None
+    while True:
+        desde = "WHERE id > CAST(:ultimo AS uuid) " if ultimo else ""
+        ultimo = conn.execute(
+            sa.text(
+                f"""
+                WITH lote AS (
+                    SELECT * FROM {TABLA} {desde}ORDER BY id LIMIT :lote FOR SHARE
+                ), copiadas AS (
+                    INSERT INTO {NUEVA} SELECT * FROM lote ON CONFLICT DO NOTHING
+                )
+                SELECT id FROM lote ORDER BY id DESC LIMIT 1
+                """
+            ),
+            {"ultimo": str(ultimo) if ultimo else None, "lote": LOTE_COPIA},
+        ).scalar()
+        if ultimo is None:
+            return
+
+
+def _reemplazar(conn) -> None:
+    """
+    Rename de la tabla actual por la nueva en una transacción breve
+
+    Con el trigger la nueva ya está al día: bajo el lock solo quedan
+    cambios de catálogo. lock_timeout evita encolar escrituras detrás de
+    una transacción larga; se reintenta.
+    """
+    sentencias = [
+        f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'",
+        f"LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE",
+        f"DROP TRIGGER {TRIGGER} ON {TABLA}",
+        f"ALTER TABLE {TABLA} RENAME TO {ANTERIOR}",
+        f"ALTER TABLE {ANTERIOR} RENAME CONSTRAINT {TABLA}_pkey TO {ANTERIOR}_pkey",
+        f"ALTER TABLE {NUEVA} RENAME TO {TABLA}",
+        f"ALTER TABLE {TABLA} RENAME CONSTRAINT {NUEVA}_pkey TO {TABLA}_pkey",
+    ]
+    for intento in range(1, INTENTOS_REEMPLAZO + 1):
+        try:
+            conn.exec_driver_sql("BEGIN; " + "; ".join(sentencias) + "; COMMIT")
+            return
+        except OperationalError:
+            conn.exec_driver_sql("ROLLBACK")
+            if intento == INTENTOS_REEMPLAZO:
+                raise
+            time.sleep(intento)
+
+
+def _limpiar(conn) -> None:
+    """Quitar la tabla anterior y el trigger, y dar a los índices sus nombres finales"""
+    conn.execute(sa.text(f"DROP TABLE IF EXISTS {ANTERIOR}"))
+    conn.execute(sa.text(f"DROP FUNCTION IF EXISTS {TRIGGER}()"))
+    for nombre, _ in _indices(conn, TABLA):
+        if nombre.endswith("_nuevo"):
+            conn.execute(sa.text(f"ALTER INDEX {nombre} RENAME TO {nombre[:-len('_nuevo')]}"))
+
+
+def _desparticionar(conn) -> None:
+    """
+    Reemplazar asientos_verdes por una copia sin particionar con las mismas
+    columnas, FKs e índices (downgrade; bloquea escrituras mientras copia).
+    """
+    indices = _indices(conn, TABLA)
+    fks = _fks(conn, TABLA)
+
+    for nombre, _ in indices:
+        conn.execute(sa.text(f"DROP INDEX {nombre}"))
+    conn.execute(sa.text(f"ALTER TABLE {TABLA} RENAME TO {ANTERIOR}"))
+    conn.execute(sa.text(f"ALTER TABLE {ANTERIOR} RENAME CONSTRAINT {TABLA}_pkey TO {ANTERIOR}_pkey"))
+    for nombre, _ in fks:
+        conn.execute(sa.text(f"ALTER TABLE {ANTERIOR} DROP CONSTRAINT {nombre}"))
+
+    conn.execute(sa.text(f"CREATE TABLE {TABLA} (LIKE {ANTERIOR} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(sa.text(f"ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY (id)"))
+    conn.execute(sa.text(f"INSERT INTO {TABLA} SELECT * FROM {ANTERIOR}"))
+    conn.execute(sa.text(f"DROP TABLE {ANTERIOR}"))
+
+    for nombre, definicion in fks:
+        conn.execute(sa.text(f"ALTER TABLE {TABLA} ADD CONSTRAINT {nombre} {definicion}"))
+    for _, definicion in indices:
+        conn.execute(sa.text(re.sub(r"^CREATE INDEX", "CREATE INDEX IF NOT EXISTS", definicion)))
+
+
+def _particionada(conn) -> bool:
+    return conn.execute(
+        sa.text("SELECT relkind = 'p' FROM pg_class WHERE relname = :tabla"),
+        {"tabla": TABLA},
+    ).scalar()
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if _particionada(conn):
+        # Base creada particionada (faltan las particiones), o conversión
+        # interrumpida después del reemplazo
+        actual = _periodo_actual()
+        _crear_particiones(conn, TABLA, actual, _sumar_meses(actual, MESES_ADELANTE))
+        _limpiar(conn)
+        return
+
+    # Cada paso en su propia transacción: reanudable si se interrumpe
+    with op.get_context().autocommit_block():
+        _crear_nueva(conn)
+        _instalar_trigger(conn)
+        _copiar(conn)
+        conn.execute(sa.text(f"ANALYZE {NUEVA}"))
+        _reemplazar(conn)
+        _limpiar(conn)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if _particionada(conn):
+        _desparticionar(conn)
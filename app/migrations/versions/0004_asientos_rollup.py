@@ -0,0 +1,74 @@
+"""
+Rollup asientos_rollup (reemplaza agregados_mensuales)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table("asientos_rollup"):
+        op.create_table(
+            "asientos_rollup",
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), primary_key=True),
+            sa.Column("periodo", sa.String(7), primary_key=True),
+            sa.Column("estado", sa.String(50), primary_key=True),
+            sa.Column("categoria", sa.String(100), primary_key=True),
+            sa.Column("alcance_gei", sa.Integer, primary_key=True),
+            sa.Column("cuenta_debe", sa.String(4), primary_key=True),
+            sa.Column("cuenta_haber", sa.String(4), primary_key=True),
+            sa.Column("asientos", sa.Integer, nullable=False),
+            sa.Column("emisiones_tco2e", sa.Float, nullable=False),
+            sa.Column("consumo_agua_m3", sa.Float, nullable=False),
+            sa.Column("residuos_kg", sa.Float, nullable=False),
+            sa.Column("debe_monto", sa.Float, nullable=False),
+            sa.Column("haber_monto", sa.Float, nullable=False),
+            sa.Column("energia_kwh", sa.Float, nullable=False),
+        )
+
+    # Carga inicial desde los asientos existentes (mismo cálculo que recalcular_rollup)
+    conn.execute(sa.text("DELETE FROM asientos_rollup"))
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO asientos_rollup
+            SELECT entity_id, periodo, coalesce(estado, ''), categoria,
+                   coalesce(alcance_gei, 0),
+                   coalesce(substr(debe_cuenta, 1, 4), ''),
+                   coalesce(substr(haber_cuenta, 1, 4), ''),
+                   count(id),
+                   coalesce(sum(emisiones_tco2e), 0),
+                   coalesce(sum(consumo_agua_m3), 0),
+                   coalesce(sum(residuos_kg), 0),
+                   coalesce(sum(debe_monto), 0),
+                   coalesce(sum(haber_monto), 0),
+                   coalesce(sum(CASE WHEN tipo LIKE '%energia%' THEN cantidad_fisica ELSE 0 END), 0)
+            FROM asientos_verdes
+            GROUP BY 1, 2, 3, 4, 5, 6, 7
+            """
+        )
+    )
+
+    op.execute("DROP TABLE IF EXISTS agregados_mensuales")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "agregados_mensuales",
+        sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), primary_key=True),
+        sa.Column("periodo", sa.String(7), primary_key=True),
+        sa.Column("agregados", sa.JSON, nullable=False),
+        sa.Column("version", sa.String(64), nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    op.drop_table("asientos_rollup")
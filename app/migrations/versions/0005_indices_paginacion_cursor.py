@@ -0,0 +1,42 @@
+"""
+Índices para paginación por cursor de evidencias y reportes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+# (índice, tabla): orden (created_at, id) descendente por entidad
+INDICES = [
+    ("ix_evidences_entity_created", "evidences"),
+    ("ix_reportes_entity_created", "reportes"),
+]
+
+
+def upgrade() -> None:
+    tablas = set(sa.inspect(op.get_bind()).get_table_names())
+    with op.get_context().autocommit_block():
+        for nombre, tabla in INDICES:
+            if tabla not in tablas:
+                continue
+            op.create_index(
+                nombre,
+                tabla,
+                ["entity_id", sa.text("created_at DESC"), sa.text("id DESC")],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for nombre, tabla in INDICES:
+            op.drop_index(nombre, table_name=tabla, postgresql_concurrently=True, if_exists=True)
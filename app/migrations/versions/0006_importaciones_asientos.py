@@ -0,0 +1,43 @@
+"""
+Jobs de importación masiva de asientos
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("importaciones_asientos"):
+        return
+    op.create_table(
+        "importaciones_asientos",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), nullable=False, index=True),
+        sa.Column("formato", sa.String(20), nullable=False),
+        sa.Column("archivo_nombre", sa.String(255)),
+        sa.Column("objeto_key", sa.String(500), nullable=False),
+        sa.Column("estado", sa.String(50)),
+        sa.Column("filas_procesadas", sa.Integer),
+        sa.Column("filas_cargadas", sa.Integer),
+        sa.Column("filas_rechazadas", sa.Integer),
+        sa.Column("errores_json", sa.JSON),
+        sa.Column("periodos_json", sa.JSON),
+        sa.Column("error", sa.String(500)),
+        sa.Column("creado_por", sa.String(100)),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("completado_at", sa.DateTime),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("importaciones_asientos")
@@ -0,0 +1,35 @@
+"""
+Directorio entidad -> shard
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("entity_shards"):
+        return
+    op.create_table(
+        "entity_shards",
+        sa.Column(
+            "entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True
+        ),
+        sa.Column("shard", sa.String(50), nullable=False),
+        sa.Column("estado", sa.String(20), nullable=False),
+        sa.Column("destino", sa.String(50)),
+        sa.Column("error", sa.String(500)),
+        sa.Column("updated_at", sa.DateTime),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("entity_shards")
@@ -0,0 +1,75 @@
+"""
+Índice asientos_verdes.updated_at (refresco incremental del espejo analítico)
+
+asientos_verdes está particionada: CONCURRENTLY no aplica sobre la padre.
+El índice se crea ON ONLY en la padre (inválido), CONCURRENTLY en cada
+partición y se adjunta; al adjuntar todas queda válido. Las escrituras no
+se bloquean mientras se construye.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+TABLA = "asientos_verdes"
+INDICE = "ix_asientos_verdes_updated_at"
+SUFIJO = "updated_at"
+
+
+def _particiones(conn) -> list:
+    return conn.execute(
+        sa.text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:tabla AS regclass)"
+        ),
+        {"tabla": TABLA},
+    ).scalars().all()
+
+
+def _adjunto(conn, hijo: str) -> bool:
+    return conn.execute(
+        sa.text(
+            "SELECT 1 FROM pg_inherits "
+            "WHERE inhrelid = to_regclass(:hijo) AND inhparent = to_regclass(:indice)"
+        ),
+        {"hijo": hijo, "indice": INDICE},
+    ).first() is not None
+
+
+def _valido(conn, indice: str):
+    """True/False según indisvalid; None si no existe"""
+    return conn.execute(
+        sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:indice)"),
+        {"indice": indice},
+    ).scalar()
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    # Reanudable: índices de partición inválidos (CONCURRENTLY interrumpido) se rehacen
+    with op.get_context().autocommit_block():
+        conn.execute(sa.text(f"CREATE INDEX IF NOT EXISTS {INDICE} ON ONLY {TABLA} (updated_at)"))
+        if _valido(conn, INDICE):
+            # Ya completo (todas las particiones adjuntas, o creado antes sobre la padre)
+            return
+        for particion in _particiones(conn):
+            hijo = f"{particion}_{SUFIJO}"
+            if _valido(conn, hijo) is False:
+                conn.execute(sa.text(f"DROP INDEX CONCURRENTLY {hijo}"))
+            conn.execute(sa.text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {hijo} ON {particion} (updated_at)"))
+            if not _adjunto(conn, hijo):
+                conn.execute(sa.text(f"ALTER INDEX {INDICE} ATTACH PARTITION {hijo}"))
+
+
+def downgrade() -> None:
+    # DROP INDEX de un índice particionado no admite CONCURRENTLY: lock breve
+    op.drop_index(INDICE, table_name=TABLA, if_exists=True)
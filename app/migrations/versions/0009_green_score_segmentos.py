@@ -0,0 +1,62 @@
+"""
+Segmentos green score (desglose persistido para simulaciones)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table("green_score_segmentos"):
+        op.create_table(
+            "green_score_segmentos",
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), primary_key=True),
+            sa.Column("periodo", sa.String(7), primary_key=True),
+            sa.Column("categoria", sa.String(100), primary_key=True),
+            sa.Column("subcategoria", sa.String(100), primary_key=True),
+            sa.Column("cuenta_debe", sa.String(4), primary_key=True),
+            sa.Column("cuenta_haber", sa.String(4), primary_key=True),
+            sa.Column("asientos", sa.Integer, nullable=False),
+            sa.Column("verdes", sa.Integer, nullable=False),
+            sa.Column("transicion", sa.Integer, nullable=False),
+            sa.Column("activos_clp", sa.Float, nullable=False),
+            sa.Column("pasivos_clp", sa.Float, nullable=False),
+            sa.Column("emisiones_tco2e", sa.Float, nullable=False),
+        )
+
+    # Carga inicial desde los asientos validados (mismo cálculo que _insertar_segmentos)
+    conn.execute(sa.text("DELETE FROM green_score_segmentos"))
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO green_score_segmentos
+            SELECT entity_id, periodo, categoria,
+                   coalesce(subcategoria, ''),
+                   coalesce(substr(debe_cuenta, 1, 4), ''),
+                   coalesce(substr(haber_cuenta, 1, 4), ''),
+                   count(id),
+                   coalesce(sum(CASE WHEN taxonomia_clasificacion = 'verde' THEN 1 ELSE 0 END), 0),
+                   coalesce(sum(CASE WHEN taxonomia_clasificacion = 'transicion' THEN 1 ELSE 0 END), 0),
+                   coalesce(sum(CASE WHEN debe_cuenta LIKE '1595%' THEN debe_monto ELSE 0 END), 0),
+                   coalesce(sum(CASE WHEN haber_cuenta LIKE '2630%' THEN haber_monto ELSE 0 END), 0),
+                   coalesce(sum(emisiones_tco2e), 0)
+            FROM asientos_verdes
+            WHERE estado = 'validado'
+            GROUP BY 1, 2, 3, 4, 5, 6
+            """
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("green_score_segmentos")
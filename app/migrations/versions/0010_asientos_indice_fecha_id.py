@@ -0,0 +1,98 @@
+"""
+Índices (entity_id, fecha DESC, id DESC) para la paginación por cursor de asientos
+
+El cursor es (fecha, id): con id en el índice el desempate y el
+ORDER BY ... LIMIT salen del índice sin ordenar. Reemplaza
+ix_asientos_verdes_entity_fecha y ix_asientos_verdes_vigentes_fecha.
+
+asientos_verdes está particionada: CONCURRENTLY no aplica sobre la padre.
+El índice se crea ON ONLY en la padre (inválido), CONCURRENTLY en cada
+partición y se adjunta; al adjuntar todas queda válido.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+TABLA = "asientos_verdes"
+VIGENTE = "estado IN ('confirmado', 'validado')"
+
+# (índice nuevo, sufijo en particiones, índice que reemplaza, WHERE)
+INDICES = [
+    ("ix_asientos_verdes_entity_fecha_id", "entity_fecha_id", "ix_asientos_verdes_entity_fecha", None),
+    ("ix_asientos_verdes_vigentes_fecha_id", "vigentes_fecha_id", "ix_asientos_verdes_vigentes_fecha", VIGENTE),
+]
+
+
+def _particiones(conn) -> list:
+    return conn.execute(
+        sa.text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:tabla AS regclass)"
+        ),
+        {"tabla": TABLA},
+    ).scalars().all()
+
+
+def _adjunto(conn, indice: str, hijo: str) -> bool:
+    return conn.execute(
+        sa.text(
+            "SELECT 1 FROM pg_inherits "
+            "WHERE inhrelid = to_regclass(:hijo) AND inhparent = to_regclass(:indice)"
+        ),
+        {"hijo": hijo, "indice": indice},
+    ).first() is not None
+
+
+def _valido(conn, indice: str):
+    """True/False según indisvalid; None si no existe"""
+    return conn.execute(
+        sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:indice)"),
+        {"indice": indice},
+    ).scalar()
+
+
+def crear_indice_particionado(conn, nombre: str, sufijo: str, columnas: str, where: str = None) -> None:
+    """
+    Índice en la padre y en cada partición sin bloquear escrituras
+
+    Reanudable: índices de partición inválidos (CONCURRENTLY
+    interrumpido) se rehacen.
+    """
+    condicion = f" WHERE {where}" if where else ""
+    conn.execute(sa.text(f"CREATE INDEX IF NOT EXISTS {nombre} ON ONLY {TABLA} ({columnas}){condicion}"))
+    for particion in _particiones(conn):
+        hijo = f"{particion}_{sufijo}"
+        if _valido(conn, hijo) is False:
+            conn.execute(sa.text(f"DROP INDEX CONCURRENTLY {hijo}"))
+        conn.execute(
+            sa.text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {hijo} ON {particion} ({columnas}){condicion}")
+        )
+        if not _adjunto(conn, nombre, hijo):
+            conn.execute(sa.text(f"ALTER INDEX {nombre} ATTACH PARTITION {hijo}"))
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        for nombre, sufijo, anterior, where in INDICES:
+            crear_indice_particionado(conn, nombre, sufijo, "entity_id, fecha DESC, id DESC", where)
+            # DROP INDEX de un índice particionado no admite CONCURRENTLY: lock breve
+            conn.execute(sa.text(f"DROP INDEX IF EXISTS {anterior}"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        for nombre, sufijo, anterior, where in INDICES:
+            crear_indice_particionado(conn, anterior, sufijo.replace("_id", ""), "entity_id, fecha DESC", where)
+            conn.execute(sa.text(f"DROP INDEX IF EXISTS {nombre}"))
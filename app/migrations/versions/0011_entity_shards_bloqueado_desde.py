@@ -0,0 +1,26 @@
+"""
+Inicio del bloqueo en entity_shards (corte de migración reanudable)
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columnas = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("entity_shards")}
+    if "bloqueado_desde" not in columnas:
+        op.add_column("entity_shards", sa.Column("bloqueado_desde", sa.DateTime))
+    # Entidades bloqueadas por la versión anterior (corte con sleep): contar desde ahora
+    op.execute("UPDATE entity_shards SET bloqueado_desde = now() AT TIME ZONE 'utc' WHERE estado = 'bloqueado'")
+
+
+def downgrade() -> None:
+    op.drop_column("entity_shards", "bloqueado_desde")
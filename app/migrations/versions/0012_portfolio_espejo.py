@@ -0,0 +1,30 @@
+"""
+Espejo analítico opt-in por job portfolio y marca del espejo usado
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columnas = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("portfolio_reportes")}
+    if "usar_espejo" not in columnas:
+        op.add_column(
+            "portfolio_reportes",
+            sa.Column("usar_espejo", sa.Boolean, nullable=False, server_default=sa.false()),
+        )
+    if "actualizado_al" not in columnas:
+        op.add_column("portfolio_reportes", sa.Column("actualizado_al", sa.DateTime))
+
+
+def downgrade() -> None:
+    op.drop_column("portfolio_reportes", "actualizado_al")
+    op.drop_column("portfolio_reportes", "usar_espejo")
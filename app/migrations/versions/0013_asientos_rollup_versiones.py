@@ -0,0 +1,45 @@
+"""
+Versión por (entidad, período) de los asientos (fingerprint de reportes)
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table("asientos_rollup_versiones"):
+        op.create_table(
+            "asientos_rollup_versiones",
+            sa.Column("entity_id", UUID(as_uuid=True), sa.ForeignKey("entities.id"), primary_key=True),
+            sa.Column("periodo", sa.String(7), primary_key=True),
+            sa.Column("asientos", sa.Integer, nullable=False),
+            sa.Column("version", sa.Integer, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+
+    # Carga inicial desde los asientos existentes
+    conn.execute(sa.text("DELETE FROM asientos_rollup_versiones"))
+    conn.execute(
+        sa.text(
+            """
+            INSERT INTO asientos_rollup_versiones
+            SELECT entity_id, periodo, count(id), 1, max(updated_at)
+            FROM asientos_verdes
+            GROUP BY 1, 2
+            """
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("asientos_rollup_versiones")
@@ -0,0 +1,56 @@
+"""
+Asiento Rollup Model - Sumas de asientos por entidad/período/dimensiones
+"""
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+
+
+class AsientoRollup(Base):
+    """
+    Asientos agrupados por (entidad, período, estado, categoría, alcance GEI,
+    prefijo 4 dígitos de cuentas debe/haber). Se recalcula en la misma
+    transacción que inserta/edita/anula asientos (rollup_service); stats,
+    reportes y comparaciones leen de aquí en vez de asientos_verdes.
+    """
+    __tablename__ = "asientos_rollup"
+
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), primary_key=True)
+    periodo = Column(String(7), primary_key=True)  # YYYY-MM
+    estado = Column(String(50), primary_key=True)
+    categoria = Column(String(100), primary_key=True)
+    alcance_gei = Column(Integer, primary_key=True)  # 1, 2, 3; 0 = sin alcance
+    cuenta_debe = Column(String(4), primary_key=True)  # "" = sin cuenta
+    cuenta_haber = Column(String(4), primary_key=True)
+
+    asientos = Column(Integer, nullable=False, default=0)
+    emisiones_tco2e = Column(Float, nullable=False, default=0)
+    consumo_agua_m3 = Column(Float, nullable=False, default=0)
+    residuos_kg = Column(Float, nullable=False, default=0)
+    debe_monto = Column(Float, nullable=False, default=0)
+    haber_monto = Column(Float, nullable=False, default=0)
+    energia_kwh = Column(Float, nullable=False, default=0)  # cantidad_fisica de tipos energía
+
+    def __repr__(self):
+        return f"<AsientoRollup {self.entity_id} - {self.periodo} - {self.categoria}>"
+
+
+class AsientoRollupVersion(Base):
+    """
+    Versión de los asientos de un (entidad, período): la mantienen las
+    mismas sumas de deltas del rollup en cada transacción que toca el mes.
+    El fingerprint de reportes lee estas filas (una por mes) en vez de
+    recorrer asientos_verdes.
+    """
+    __tablename__ = "asientos_rollup_versiones"
+
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), primary_key=True)
+    periodo = Column(String(7), primary_key=True)  # YYYY-MM
+
+    asientos = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0)  # +1 por transacción que cambia el mes
+    updated_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<AsientoRollupVersion {self.entity_id} - {self.periodo} v{self.version}>"
@@ -1,7 +1,7 @@
 """
 Asiento Verde (Green Entry) Model
 """
-from sqlalchemy import Column, String, Integer, Numeric, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, Numeric, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,20 +10,50 @@ import uuid
 from app.core.database import Base
 
 
+# Predicado de índices parciales: asientos vigentes
+_VIGENTE = text("estado IN ('confirmado', 'validado')")
+
+
 class AsientoVerde(Base):
     """
     Asiento contable ambiental (partida doble verde)
     """
     __tablename__ = "asientos_verdes"
+    __table_args__ = (
+        # Listados, stats, reportes y green score filtran entidad + período + estado
+        Index("ix_asientos_verdes_entity_periodo_estado", "entity_id", "periodo", "estado"),
+        # Paginación por cursor (fecha, id): el desempate por id sale del índice
+        Index("ix_asientos_verdes_entity_fecha_id", "entity_id", text("fecha DESC"), text("id DESC")),
+        # Parciales sobre asientos vigentes; el de período cubre las sumas de
+        # stats (index-only scan sin leer la tabla)
+        Index(
+            "ix_asientos_verdes_vigentes_periodo",
+            "entity_id", "periodo",
+            postgresql_where=_VIGENTE,
+            postgresql_include=[
+                "estado", "categoria", "alcance_gei", "emisiones_tco2e",
+                "consumo_agua_m3", "residuos_kg", "debe_monto", "haber_monto",
+            ],
+        ),
+        Index(
+            "ix_asientos_verdes_vigentes_fecha_id",
+            "entity_id", text("fecha DESC"), text("id DESC"),
+            postgresql_where=_VIGENTE,
+        ),
+        # Refresco incremental del espejo analítico (analitica_service)
+        Index("ix_asientos_verdes_updated_at", "updated_at"),
+        # Particionada por mes (migración 0003, particiones_service)
+        {"postgresql_partition_by": "RANGE (periodo)"},
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
     # RelaciÃ³n entidad
-    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), nullable=False, index=True)
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), nullable=False)
     
     # Fecha contable
     fecha = Column(DateTime, nullable=False, index=True)
-    periodo = Column(String(7), nullable=False, index=True)  # YYYY-MM
+    periodo = Column(String(7), primary_key=True, index=True)  # YYYY-MM, clave de partición
     
     # ClasificaciÃ³n
     tipo = Column(String(100), nullable=False, index=True)
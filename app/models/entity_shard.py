@@ -0,0 +1,31 @@
+"""
+Entity Shard Model - Directorio entidad -> shard (solo en la base principal)
+"""
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+
+from app.core.database import Base
+
+
+class EntityShard(Base):
+    """
+    Shard donde viven los datos de una entidad (asientos, evidencias,
+    rollup, green score, importaciones). Una entidad sin fila vive en el
+    shard principal. Durante una migración entre shards estado pasa por
+    moviendo (copia, escrituras permitidas) y bloqueado (corte, escrituras
+    rechazadas) antes de volver a activo en el destino.
+    """
+    __tablename__ = "entity_shards"
+
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(String(50), nullable=False)
+    estado = Column(String(20), nullable=False, default="activo")  # activo, moviendo, bloqueado
+    destino = Column(String(50))  # Shard destino de la migración en curso
+    error = Column(String(500))  # Última migración fallida
+    bloqueado_desde = Column(DateTime)  # Inicio del bloqueo de escrituras (corte en curso)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EntityShard {self.entity_id} - {self.shard} ({self.estado})>"
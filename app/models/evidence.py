@@ -1,7 +1,7 @@
 """
 Evidence (Evidencia) Model
 """
-from sqlalchemy import Column, String, Integer, Numeric, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, Numeric, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,6 +15,10 @@ class Evidence(Base):
     Evidencia documental que respalda asientos verdes
     """
     __tablename__ = "evidences"
+    __table_args__ = (
+        # Listado paginado por cursor (created_at, id)
+        Index("ix_evidences_entity_created", "entity_id", text("created_at DESC"), text("id DESC")),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
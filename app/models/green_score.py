@@ -0,0 +1,69 @@
+"""
+Green Score Componentes Model - Agregados por entidad/período para el Green Score
+"""
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+
+from app.core.database import Base
+
+
+# Período de la fila que acumula todos los períodos de la entidad
+PERIODO_TOTAL = "*"
+
+
+class GreenScoreComponentes(Base):
+    """
+    Componentes del Green Score de una entidad en un período (asientos
+    validados). Se mantienen al insertar/validar asientos, así leer un score
+    es una búsqueda por clave primaria.
+    """
+    __tablename__ = "green_score_componentes"
+
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), primary_key=True)
+    periodo = Column(String(7), primary_key=True)  # YYYY-MM o "*" (todos)
+
+    asientos = Column(Integer, nullable=False, default=0)
+    verdes = Column(Integer, nullable=False, default=0)  # Taxonomía verde
+    transicion = Column(Integer, nullable=False, default=0)  # Taxonomía transición
+    activos_clp = Column(Float, nullable=False, default=0)  # Cuentas 1595
+    pasivos_clp = Column(Float, nullable=False, default=0)  # Cuentas 2630
+    emisiones_tco2e = Column(Float, nullable=False, default=0)
+
+    # Tendencia emisiones: pendiente móvil de los últimos 12 meses hasta este
+    # período (fila "*": la del último mes cerrado)
+    tendencia_periodos = Column(Integer, nullable=False, default=0)
+    tendencia_pendiente = Column(Float)  # tCO2e por mes
+    tendencia_relativa = Column(Float)  # pendiente / promedio ventana
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GreenScoreComponentes {self.entity_id} - {self.periodo}>"
+
+
+class GreenScoreSegmento(Base):
+    """
+    Componentes del Green Score desglosados por categoría, subcategoría y
+    prefijo 4 dígitos de cuentas debe/haber (asientos validados). Se
+    mantienen junto a GreenScoreComponentes; las simulaciones leen de aquí
+    en vez de agrupar asientos.
+    """
+    __tablename__ = "green_score_segmentos"
+
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), primary_key=True)
+    periodo = Column(String(7), primary_key=True)  # YYYY-MM
+    categoria = Column(String(100), primary_key=True)
+    subcategoria = Column(String(100), primary_key=True)  # "" = sin subcategoría
+    cuenta_debe = Column(String(4), primary_key=True)  # "" = sin cuenta
+    cuenta_haber = Column(String(4), primary_key=True)
+
+    asientos = Column(Integer, nullable=False, default=0)
+    verdes = Column(Integer, nullable=False, default=0)
+    transicion = Column(Integer, nullable=False, default=0)
+    activos_clp = Column(Float, nullable=False, default=0)
+    pasivos_clp = Column(Float, nullable=False, default=0)
+    emisiones_tco2e = Column(Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<GreenScoreSegmento {self.entity_id} - {self.periodo} - {self.categoria}>"
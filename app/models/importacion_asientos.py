@@ -0,0 +1,46 @@
+"""
+Importación Asientos Model - Job de carga masiva de un libro CSV/Parquet
+"""
+from sqlalchemy import Column, String, Integer, DateTime, JSON, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.core.database import Base
+
+
+class ImportacionAsientos(Base):
+    """
+    Importación de un libro histórico subido a MinIO. Se procesa por lotes;
+    cada lote se carga y confirma junto con filas_procesadas, así un job
+    interrumpido se reanuda desde el último lote confirmado.
+    """
+    __tablename__ = "importaciones_asientos"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("entities.id"), nullable=False, index=True)
+
+    # Archivo fuente
+    formato = Column(String(20), nullable=False)  # csv, parquet
+    archivo_nombre = Column(String(255))
+    objeto_key = Column(String(500), nullable=False)  # Key en MINIO_BUCKET_IMPORTACIONES
+
+    # Estado
+    estado = Column(String(50), default="pendiente")  # pendiente, procesando, completo, error
+    filas_procesadas = Column(Integer, default=0)  # Filas fuente consumidas (checkpoint)
+    filas_cargadas = Column(Integer, default=0)
+    filas_rechazadas = Column(Integer, default=0)
+    errores_json = Column(JSON, default=[])  # Muestra [{fila, motivo}]
+    periodos_json = Column(JSON, default=[])  # Meses cargados
+    error = Column(String(500))
+
+    # Auditoría
+    creado_por = Column(String(100))
+
+    # Fechas
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completado_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<ImportacionAsientos {self.id} - {self.estado}>"
@@ -0,0 +1,47 @@
+"""
+Portfolio Reporte Model - Reporte de un período para todas las entidades
+"""
+from sqlalchemy import Boolean, Column, String, Integer, DateTime, JSON
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+
+from app.core.database import Base
+from app.core.types import CompressedJSON
+
+
+class PortfolioReporte(Base):
+    """
+    Job admin que calcula un tipo de reporte para todas las entidades activas
+    de un período y guarda el resultado combinado (una fila por entidad).
+    """
+    __tablename__ = "portfolio_reportes"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    tipo = Column(String(50), nullable=False)  # huella_carbono, balance_ambiental, esg
+    periodo = Column(String(7), nullable=False)  # YYYY-MM, YYYY-Qn, YYYY
+
+    # Estado
+    estado = Column(String(50), default="pendiente")  # pendiente, generando, completo, error
+    total_entidades = Column(Integer, default=0)
+    entidades_procesadas = Column(Integer, default=0)
+
+    # Resultado
+    resumen_json = Column(JSON, default={})  # Reporte sobre el total del portfolio
+    resultados_json = Column(CompressedJSON, default=[])  # [{entity_id, rut, razon_social, sector, agregados...}]
+    error = Column(String(500))
+
+    # Espejo analítico: opt-in por job; actualizado_al = marca del espejo usado
+    usar_espejo = Column(Boolean, nullable=False, default=False)
+    actualizado_al = Column(DateTime)  # None: calculado sobre datos en vivo
+
+    # Auditoría
+    generado_por = Column(String(100))
+
+    # Fechas
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completado_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<PortfolioReporte {self.tipo} {self.periodo} - {self.estado}>"
@@ -0,0 +1,26 @@
+"""
+Reporte Cache Model - Fingerprint de entradas de reportes generados
+"""
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+
+from app.core.database import Base
+from app.models.reporte import Reporte
+
+
+class ReporteCache(Base):
+    """
+    Fingerprint (SHA-256) de las entradas con que se generó un reporte:
+    entidad, período, tipo, parámetros y versión de datos (asientos + factores).
+    Mismo fingerprint = mismo data_json, se reutiliza sin regenerar.
+    """
+    __tablename__ = "reportes_cache"
+
+    reporte_id = Column(UUID(as_uuid=True), ForeignKey(Reporte.id, ondelete="CASCADE"), primary_key=True)
+    fingerprint = Column(String(64), nullable=False, index=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ReporteCache {self.fingerprint[:12]} - {self.reporte_id}>"
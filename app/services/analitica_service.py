@@ -0,0 +1,515 @@
+"""
+KONTAX - Analítica de cartera: espejo columnar del libro (Parquet) consultado con DuckDB
+"""
+from sqlalchemy import DateTime, Float, Integer, Numeric, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+import json
+import logging
+import os
+import uuid
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+from app.config import settings
+from app.core.sharding import agrupar_por_shard, shard_engines
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.entity import Entity as EntityModel
+from app.services.reporte_service import (
+    CUENTA_ACTIVOS_AMBIENTALES,
+    CUENTA_COSTOS_AMBIENTALES,
+    CUENTA_PASIVOS_AMBIENTALES,
+    expandir_periodo,
+    sumar_agregados,
+)
+
+logger = logging.getLogger(__name__)
+
+
+MANIFIESTO = "manifiesto.json"
+
+# Lock Redis del escritor (un refresco/reconstrucción a la vez en la flota)
+LOCK_ESPEJO = "kontax:analitica:espejo"
+LOCK_ESPEJO_TTL = 4 * 3600
+
+# Filas por vuelta del cursor del servidor (y por row group en deltas)
+LOTE_ESPEJO = 50_000
+
+# Holgura del delta por updated_at (relojes de procesos distintos)
+MARGEN_REFRESCO = timedelta(minutes=1)
+
+# Columnas del espejo: lo que usan las agregaciones de cartera, sin textos libres
+COLUMNAS_ASIENTOS = [
+    AsientoModel.id,
+    AsientoModel.entity_id,
+    AsientoModel.periodo,
+    AsientoModel.fecha,
+    AsientoModel.tipo,
+    AsientoModel.categoria,
+    AsientoModel.subcategoria,
+    AsientoModel.estado,
+    AsientoModel.alcance_gei,
+    AsientoModel.debe_cuenta,
+    AsientoModel.haber_cuenta,
+    AsientoModel.cantidad_fisica,
+    AsientoModel.emisiones_tco2e,
+    AsientoModel.consumo_agua_m3,
+    AsientoModel.residuos_kg,
+    AsientoModel.debe_monto,
+    AsientoModel.haber_monto,
+    AsientoModel.taxonomia_clasificacion,
+    AsientoModel.updated_at,
+]
+
+COLUMNAS_ENTIDADES = [
+    EntityModel.id.label("entity_id"),
+    EntityModel.rut,
+    EntityModel.razon_social,
+    EntityModel.sector,
+    EntityModel.tamanio,
+    EntityModel.region,
+    EntityModel.ventas_anuales,
+    EntityModel.estado.label("entidad_estado"),
+]
+
+# Mismas cifras que agregados_columns() sobre asientos_rollup, calculadas
+# desde los asientos (alias a)
+AGREGADOS_SQL = f"""
+    count(a.id) AS asientos,
+    coalesce(sum(a.emisiones_tco2e), 0) AS emisiones_tco2e,
+    coalesce(sum(a.emisiones_tco2e) FILTER (WHERE a.alcance_gei = 1), 0) AS alcance_1_tco2e,
+    coalesce(sum(a.emisiones_tco2e) FILTER (WHERE a.alcance_gei = 2), 0) AS alcance_2_tco2e,
+    coalesce(sum(a.emisiones_tco2e) FILTER (WHERE a.alcance_gei = 3), 0) AS alcance_3_tco2e,
+    coalesce(sum(a.debe_monto) FILTER (WHERE left(a.debe_cuenta, 4) = '{CUENTA_ACTIVOS_AMBIENTALES}'), 0) AS activos_clp,
+    coalesce(sum(a.haber_monto) FILTER (WHERE left(a.haber_cuenta, 4) = '{CUENTA_PASIVOS_AMBIENTALES}'), 0) AS pasivos_clp,
+    coalesce(sum(a.debe_monto) FILTER (WHERE left(a.debe_cuenta, 4) = '{CUENTA_COSTOS_AMBIENTALES}'), 0) AS costos_clp,
+    coalesce(sum(a.cantidad_fisica) FILTER (WHERE a.tipo LIKE '%energia%'), 0) AS energia_kwh
+"""
+
+
+def _ruta(archivo: str) -> str:
+    return os.path.join(settings.ANALITICA_DIR, archivo)
+
+
+def _nombre(prefijo: str) -> str:
+    return f"{prefijo}-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def _literal(valor: str) -> str:
+    return "'" + valor.replace("'", "''") + "'"
+
+
+def _lista_archivos(archivos: List[str]) -> str:
+    return "[" + ", ".join(_literal(_ruta(archivo)) for archivo in archivos) + "]"
+
+
+def leer_manifiesto() -> Optional[Dict[str, Any]]:
+    """Manifiesto vigente del espejo (None si nunca se construyó)"""
+    try:
+        with open(_ruta(MANIFIESTO)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def disponible() -> bool:
+    """Modo analítico activo y espejo construido"""
+    return settings.ANALITICA_HABILITADA and HAS_DUCKDB and leer_manifiesto() is not None
+
+
+def _esquema(columnas: list) -> "pa.Schema":
+    """Esquema Parquet desde los tipos SQLAlchemy (UUID y textos como string)"""
+    def tipo(columna) -> "pa.DataType":
+        if isinstance(columna.type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(columna.type, (Float, Numeric)):
+            return pa.float64()
+        if isinstance(columna.type, Integer):
+            return pa.int64()
+        return pa.string()
+
+    return pa.schema([(columna.key, tipo(columna)) for columna in columnas])
+
+
+def _escribir_parquet(archivo: str, esquema: "pa.Schema", lotes: Iterator[List[tuple]]) -> int:
+    """
+    Escribir lotes en un archivo nuevo del espejo (temporal + rename)
+
+    Returns:
+        Filas escritas
+    """
+    temporal = _ruta(archivo) + ".tmp"
+    filas = 0
+    with pq.ParquetWriter(temporal, esquema, compression="zstd") as writer:
+        for lote in lotes:
+            if not lote:
+                continue
+            columnas = list(zip(*lote))
+            arrays = [
+                pa.array(
+                    [str(v) if v is not None else None for v in valores]
+                    if campo.type == pa.string() else valores,
+                    type=campo.type,
+                )
+                for campo, valores in zip(esquema, columnas)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=esquema))
+            filas += len(lote)
+    os.replace(temporal, _ruta(archivo))
+    return filas
+
+
+def _lotes(engine: Engine, query) -> Iterator[List[tuple]]:
+    """Filas de la consulta en lotes de LOTE_ESPEJO con cursor del servidor"""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=LOTE_ESPEJO).execute(query)
+        for lote in result.partitions():
+            yield [tuple(row) for row in lote]
+
+
+def conectar(manifiesto: Dict[str, Any], deduplicar_base: bool = False) -> "duckdb.DuckDBPyConnection":
+    """
+    Conexión DuckDB en memoria con las vistas asientos y entidades
+
+    Un asiento vale en su versión con updated_at mayor. Los deltas (chicos)
+    se deduplican en una tabla temporal y reemplazan a sus ids de la base;
+    la base solo se deduplica completa al compactar.
+    """
+    con = duckdb.connect()
+    con.execute(f"SET threads = {int(settings.ANALITICA_DUCKDB_THREADS)}")
+    con.execute(f"SET memory_limit = {_literal(settings.ANALITICA_DUCKDB_MEMORIA)}")
+    con.execute(f"CREATE TEMP VIEW entidades AS SELECT * FROM read_parquet({_literal(_ruta(manifiesto['entidades']))})")
+
+    ultima_version = "QUALIFY row_number() OVER (PARTITION BY id ORDER BY updated_at DESC) = 1"
+    if deduplicar_base:
+        archivos = _lista_archivos(manifiesto["base"] + manifiesto["deltas"])
+        con.execute(f"CREATE TEMP VIEW asientos AS SELECT * FROM read_parquet({archivos}) {ultima_version}")
+    elif manifiesto["deltas"]:
+        con.execute(
+            f"CREATE TEMP TABLE asientos_delta AS "
+            f"SELECT * FROM read_parquet({_lista_archivos(manifiesto['deltas'])}) {ultima_version}"
+        )
+        con.execute(
+            f"CREATE TEMP VIEW asientos AS "
+            f"SELECT * FROM read_parquet({_lista_archivos(manifiesto['base'])}) "
+            f"WHERE id NOT IN (SELECT id FROM asientos_delta) "
+            f"UNION ALL BY NAME SELECT * FROM asientos_delta"
+        )
+    else:
+        con.execute(f"CREATE TEMP VIEW asientos AS SELECT * FROM read_parquet({_lista_archivos(manifiesto['base'])})")
+    return con
+
+
+class EspejoAnaliticoService:
+    """
+    Espejo columnar del libro de asientos para analítica de cartera
+
+    Archivos Parquet inmutables en ANALITICA_DIR (volumen compartido entre
+    worker y API) listados en manifiesto.json:
+    - base: copia completa de todos los shards
+    - deltas: asientos con updated_at desde la marca anterior
+    - entidades: dimensión completa, reescrita en cada refresco
+
+    El manifiesto se reemplaza atómicamente; los archivos que salen de él
+    se borran después de ANALITICA_GRACIA_MINUTOS (consultas en curso con
+    el manifiesto anterior). Un solo escritor a la vez (LOCK_ESPEJO).
+
+    Cambios que no pasan por updated_at (entidades borradas, particiones
+    archivadas, transacciones que confirman más tarde que el margen) se
+    corrigen en la reconstrucción diaria.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        if not HAS_PYARROW:
+            raise RuntimeError("Espejo analítico requiere pyarrow")
+        os.makedirs(settings.ANALITICA_DIR, exist_ok=True)
+
+    def refrescar(self) -> Dict[str, Any]:
+        """Agregar un delta con lo cambiado desde la marca; compactar si hay demasiados"""
+        manifiesto = leer_manifiesto()
+        if manifiesto is None:
+            return self.reconstruir()
+
+        inicio = datetime.utcnow()
+        desde = datetime.fromisoformat(manifiesto["marca"]) - MARGEN_REFRESCO
+        query = select(*COLUMNAS_ASIENTOS).where(AsientoModel.updated_at >= desde)
+
+        delta = _nombre("delta")
+        filas = _escribir_parquet(
+            delta,
+            _esquema(COLUMNAS_ASIENTOS),
+            chain.from_iterable(_lotes(shard_engine, query) for shard_engine in shard_engines.values()),
+        )
+        retirados = [manifiesto["entidades"]]
+        nuevo = {
+            **manifiesto,
+            "entidades": self._escribir_entidades(),
+            "marca": inicio.isoformat(),
+        }
+        if filas:
+            nuevo["deltas"] = manifiesto["deltas"] + [delta]
+        else:
+            os.remove(_ruta(delta))
+        self._publicar(nuevo, retirados)
+
+        logger.info(f"Espejo analítico: delta de {filas} asientos desde {desde.isoformat()}")
+        resultado = {"modo": "delta", "asientos": filas, "deltas": len(nuevo["deltas"]), "marca": nuevo["marca"]}
+        if len(nuevo["deltas"]) >= settings.ANALITICA_MAX_DELTAS:
+            resultado["compactacion"] = self.compactar()
+        return resultado
+
+    def reconstruir(self) -> Dict[str, Any]:
+        """
+        Copia completa de todos los shards en una base nueva
+
+        Cada shard aporta solo las entidades que el directorio le asigna:
+        una entidad a medio mover no queda duplicada.
+        """
+        inicio = datetime.utcnow()
+        entity_ids = [row.id for row in self.db.execute(select(EntityModel.id))]
+        consultas = [
+            (shard_engines[shard], select(*COLUMNAS_ASIENTOS).where(AsientoModel.entity_id.in_(ids)))
+            for shard, ids in agrupar_por_shard(entity_ids).items()
+        ]
+
+        base = _nombre("base")
+        filas = _escribir_parquet(
+            base,
+            _esquema(COLUMNAS_ASIENTOS),
+            chain.from_iterable(_lotes(shard_engine, query) for shard_engine, query in consultas),
+        )
+        anterior = leer_manifiesto()
+        nuevo = {
+            "base": [base],
+            "deltas": [],
+            "entidades": self._escribir_entidades(),
+            "marca": inicio.isoformat(),
+            "reconstruido": inicio.isoformat(),
+            "retirados": anterior.get("retirados", {}) if anterior else {},
+        }
+        retirados = anterior["base"] + anterior["deltas"] + [anterior["entidades"]] if anterior else []
+        self._publicar(nuevo, retirados)
+
+        logger.info(f"Espejo analítico reconstruido: {filas} asientos")
+        return {"modo": "reconstruccion", "asientos": filas, "marca": nuevo["marca"]}
+
+    def compactar(self) -> Dict[str, Any]:
+        """Fundir base y deltas en una base deduplicada, ordenada por período y entidad"""
+        if not HAS_DUCKDB:
+            raise RuntimeError("Compactar el espejo analítico requiere duckdb")
+        manifiesto = leer_manifiesto()
+
+        base = _nombre("base")
+        con = conectar(manifiesto, deduplicar_base=True)
+        try:
+            con.execute(
+                f"COPY (SELECT * FROM asientos ORDER BY periodo, entity_id) "
+                f"TO {_literal(_ruta(base) + '.tmp')} (FORMAT PARQUET, COMPRESSION ZSTD)"
+            )
+        finally:
+            con.close()
+        os.replace(_ruta(base) + ".tmp", _ruta(base))
+
+        self._publicar({**manifiesto, "base": [base], "deltas": []}, manifiesto["base"] + manifiesto["deltas"])
+        logger.info(f"Espejo analítico compactado: {len(manifiesto['deltas'])} deltas en {base}")
+        return {"base": base, "deltas_fundidos": len(manifiesto["deltas"])}
+
+    def _escribir_entidades(self) -> str:
+        archivo = _nombre("entidades")
+        _escribir_parquet(
+            archivo,
+            _esquema(COLUMNAS_ENTIDADES),
+            iter([[tuple(row) for row in self.db.execute(select(*COLUMNAS_ENTIDADES))]]),
+        )
+        return archivo
+
+    def _publicar(self, manifiesto: Dict[str, Any], retirados: List[str]) -> None:
+        """Reemplazar el manifiesto y borrar los archivos retirados hace más de la gracia"""
+        ahora = datetime.utcnow()
+        limite = ahora - timedelta(minutes=settings.ANALITICA_GRACIA_MINUTOS)
+        pendientes = {**manifiesto.get("retirados", {}), **{archivo: ahora.isoformat() for archivo in retirados}}
+        borrar = [archivo for archivo, desde in pendientes.items() if datetime.fromisoformat(desde) < limite]
+        manifiesto["retirados"] = {archivo: desde for archivo, desde in pendientes.items() if archivo not in borrar}
+
+        temporal = _ruta(MANIFIESTO) + ".tmp"
+        with open(temporal, "w") as f:
+            json.dump(manifiesto, f)
+        os.replace(temporal, _ruta(MANIFIESTO))
+
+        for archivo in borrar:
+            try:
+                os.remove(_ruta(archivo))
+            except FileNotFoundError:
+                pass
+
+
+class AnaliticaService:
+    """
+    Agregaciones de cartera sobre el espejo columnar (sin carga en Postgres)
+
+    Cada consulta abre una conexión DuckDB en memoria sobre los archivos del
+    manifiesto vigente. Las cifras tienen la antigüedad del último refresco
+    (actualizado_al).
+    """
+
+    def __init__(self):
+        if not settings.ANALITICA_HABILITADA:
+            raise RuntimeError("Modo analítico deshabilitado (ANALITICA_HABILITADA)")
+        if not HAS_DUCKDB:
+            raise RuntimeError("Modo analítico requiere duckdb")
+        self.manifiesto = leer_manifiesto()
+        if self.manifiesto is None:
+            raise RuntimeError("Espejo analítico aún no construido")
+
+    @property
+    def actualizado_al(self) -> str:
+        return self.manifiesto["marca"]
+
+    def _consultar(self, sql: str, params: list) -> List[Dict[str, Any]]:
+        con = conectar(self.manifiesto)
+        try:
+            cursor = con.execute(sql, params)
+            columnas = [descripcion[0] for descripcion in cursor.description]
+            return [dict(zip(columnas, row)) for row in cursor.fetchall()]
+        finally:
+            con.close()
+
+    def agregar_portfolio(self, entity_ids: List[UUID], periodo: str) -> List[Dict[str, Any]]:
+        """
+        Agregados por entidad en una consulta (mismo resultado que
+        ReporteService.agregar_portfolio); sin asientos validados = ceros.
+        """
+        rows = self._consultar(
+            f"""
+            SELECT e.entity_id, e.rut, e.razon_social, e.sector, {AGREGADOS_SQL}
+            FROM entidades e
+            LEFT JOIN asientos a
+                ON a.entity_id = e.entity_id
+                AND list_contains(?, a.periodo)
+                AND a.estado = 'validado'
+            WHERE list_contains(?, e.entity_id)
+            GROUP BY e.entity_id, e.rut, e.razon_social, e.sector
+            """,
+            [expandir_periodo(periodo), [str(entity_id) for entity_id in entity_ids]],
+        )
+        return [
+            {
+                "entity_id": row["entity_id"],
+                "rut": row["rut"],
+                "razon_social": row["razon_social"],
+                "sector": row["sector"],
+                **sumar_agregados([row]),
+            }
+            for row in rows
+        ]
+
+    def sectores(self, periodo: str, estado: str = "validado") -> List[Dict[str, Any]]:
+        """
+        Totales por sector e intensidad de emisiones (tCO2e por millón CLP
+        de ventas anuales, sobre las entidades con ventas informadas)
+        """
+        return self._consultar(
+            f"""
+            WITH por_entidad AS (
+                SELECT a.entity_id, {AGREGADOS_SQL}
+                FROM asientos a
+                WHERE list_contains(?, a.periodo) AND a.estado = ?
+                GROUP BY a.entity_id
+            )
+            SELECT
+                coalesce(e.sector, 'sin_sector') AS sector,
+                count(*) AS entidades,
+                sum(p.asientos) AS asientos,
+                sum(p.emisiones_tco2e) AS emisiones_tco2e,
+                sum(p.alcance_1_tco2e) AS alcance_1_tco2e,
+                sum(p.alcance_2_tco2e) AS alcance_2_tco2e,
+                sum(p.alcance_3_tco2e) AS alcance_3_tco2e,
+                sum(p.energia_kwh) AS energia_kwh,
+                sum(e.ventas_anuales) AS ventas_anuales_clp,
+                sum(p.emisiones_tco2e) FILTER (WHERE e.ventas_anuales > 0)
+                    / nullif(sum(e.ventas_anuales) FILTER (WHERE e.ventas_anuales > 0), 0) * 1e6
+                    AS intensidad_tco2e_mm_clp
+            FROM por_entidad p
+            JOIN entidades e USING (entity_id)
+            GROUP BY 1
+            ORDER BY emisiones_tco2e DESC
+            """,
+            [expandir_periodo(periodo), estado],
+        )
+
+    def tendencia(
+        self,
+        desde: str,
+        hasta: str,
+        sector: Optional[str] = None,
+        categoria: Optional[str] = None,
+        estado: str = "validado",
+    ) -> List[Dict[str, Any]]:
+        """Serie mensual de la cartera entre dos períodos YYYY-MM (inclusive)"""
+        filtros, params = ["a.periodo BETWEEN ? AND ?", "a.estado = ?"], [desde, hasta, estado]
+        if sector:
+            filtros.append("e.sector = ?")
+            params.append(sector)
+        if categoria:
+            filtros.append("a.categoria = ?")
+            params.append(categoria)
+        return self._consultar(
+            f"""
+            SELECT a.periodo, count(DISTINCT a.entity_id) AS entidades, {AGREGADOS_SQL}
+            FROM asientos a
+            JOIN entidades e USING (entity_id)
+            WHERE {" AND ".join(filtros)}
+            GROUP BY a.periodo
+            ORDER BY a.periodo
+            """,
+            params,
+        )
+
+    def intensidad(
+        self,
+        periodo: str,
+        sector: Optional[str] = None,
+        limit: int = 50,
+        estado: str = "validado",
+    ) -> List[Dict[str, Any]]:
+        """Entidades con ventas informadas rankeadas por intensidad de emisiones (mayor primero)"""
+        filtros, params = ["list_contains(?, a.periodo)", "a.estado = ?", "e.ventas_anuales > 0"], [
+            expandir_periodo(periodo),
+            estado,
+        ]
+        if sector:
+            filtros.append("e.sector = ?")
+            params.append(sector)
+        return self._consultar(
+            f"""
+            SELECT
+                e.entity_id, e.rut, e.razon_social, e.sector, e.tamanio,
+                sum(a.emisiones_tco2e) AS emisiones_tco2e,
+                e.ventas_anuales AS ventas_anuales_clp,
+                sum(a.emisiones_tco2e) / e.ventas_anuales * 1e6 AS intensidad_tco2e_mm_clp
+            FROM asientos a
+            JOIN entidades e USING (entity_id)
+            WHERE {" AND ".join(filtros)}
+            GROUP BY e.entity_id, e.rut, e.razon_social, e.sector, e.tamanio, e.ventas_anuales
+            HAVING sum(a.emisiones_tco2e) IS NOT NULL
+            ORDER BY intensidad_tco2e_mm_clp DESC
+            LIMIT ?
+            """,
+            params + [limit],
+        )
@@ -0,0 +1,96 @@
+"""
+KONTAX - Asientos Bulk Service: inserción masiva en una transacción
+"""
+from sqlalchemy import column, insert, select, table
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List
+from uuid import UUID
+from datetime import datetime
+import uuid
+
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.services.green_score_service import aplicar_componentes
+from app.services.rollup_service import ATRIBUTOS, aplicar_rollup
+
+
+# Filas por sentencia INSERT multi-VALUES
+LOTE_INSERT = 1000
+
+
+def periodos(fechas: Iterable[datetime]) -> List[str]:
+    """Período YYYY-MM de cada fecha"""
+    return [f"{fecha.year:04d}-{fecha.month:02d}" for fecha in fechas]
+
+
+class AsientoBulkService:
+    """Alta masiva de asientos sin pasar por el flush ORM fila a fila"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def validar_fks(self, filas: List[Dict[str, Any]]) -> Dict[int, List[str]]:
+        """
+        FKs de asientos_verdes que apuntan a filas inexistentes, por fila
+
+        Una consulta por FK con los IDs distintos del lote, en la base donde
+        se insertará: así un ID inválido rechaza su item en vez de abortar
+        el INSERT del lote completo.
+
+        Returns:
+            {índice en filas: errores}
+        """
+        errores: Dict[int, List[str]] = {}
+        for fk in AsientoModel.__table__.foreign_keys:
+            campo = fk.parent.name
+            ids = {fila[campo] for fila in filas if fila.get(campo) is not None}
+            if not ids:
+                continue
+            tabla_ref, columna_ref = fk.target_fullname.split(".")
+            destino = table(tabla_ref, column(columna_ref))
+            existentes = set(
+                self.db.execute(select(destino.c[columna_ref]).where(destino.c[columna_ref].in_(ids))).scalars()
+            )
+            for i, fila in enumerate(filas):
+                if fila.get(campo) is not None and fila[campo] not in existentes:
+                    errores.setdefault(i, []).append(f"{campo}: {fila[campo]} no existe")
+        return errores
+
+    def insertar(self, filas: List[Dict[str, Any]], creado_por: str) -> List[UUID]:
+        """
+        Insertar asientos con INSERT multi-fila por lotes
+
+        Los IDs se generan aquí (sin RETURNING). Al rollup y a los
+        componentes del green score se suman los deltas de las filas
+        insertadas, en la misma transacción. No hace commit.
+
+        Args:
+            filas: dicts con columnas de asientos_verdes (sin id/periodo)
+            creado_por: usuario que carga
+
+        Returns:
+            IDs asignados, en el orden de filas
+        """
+        ahora = datetime.utcnow()
+        ids = [uuid.uuid4() for _ in filas]
+        valores = [
+            {
+                **fila,
+                "id": id_,
+                "periodo": periodo,
+                "estado": "confirmado",
+                "creado_por": creado_por,
+                "created_at": ahora,
+                "updated_at": ahora,
+            }
+            for fila, id_, periodo in zip(filas, ids, periodos(f["fecha"] for f in filas))
+        ]
+
+        tabla = AsientoModel.__table__
+        for i in range(0, len(valores), LOTE_INSERT):
+            self.db.execute(insert(tabla), valores[i:i + LOTE_INSERT])
+
+        cambios = [(1, {k: v.get(k) for k in ATRIBUTOS}) for v in valores]
+        connection = self.db.connection()
+        aplicar_rollup(connection, cambios)
+        aplicar_componentes(connection, cambios)
+        return ids
@@ -0,0 +1,185 @@
+"""
+KONTAX - Exportación del libro de asientos en streaming (CSV / NDJSON / Parquet)
+"""
+from sqlalchemy.orm import Query, sessionmaker
+from typing import Iterator, List
+import csv
+import io
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+from app.core.database import SessionLocal
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+
+
+FORMATOS_EXPORTACION = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Filas por vuelta del cursor del servidor (y por row group Parquet)
+LOTE_EXPORTACION = 5000
+
+COLUMNAS_EXPORTACION = [
+    AsientoModel.id,
+    AsientoModel.fecha,
+    AsientoModel.periodo,
+    AsientoModel.tipo,
+    AsientoModel.categoria,
+    AsientoModel.subcategoria,
+    AsientoModel.descripcion,
+    AsientoModel.cantidad_fisica,
+    AsientoModel.unidad_fisica,
+    AsientoModel.factor_valor,
+    AsientoModel.factor_unidad,
+    AsientoModel.emisiones_tco2e,
+    AsientoModel.consumo_agua_m3,
+    AsientoModel.residuos_kg,
+    AsientoModel.alcance_gei,
+    AsientoModel.debe_cuenta,
+    AsientoModel.debe_nombre,
+    AsientoModel.debe_monto,
+    AsientoModel.haber_cuenta,
+    AsientoModel.haber_nombre,
+    AsientoModel.haber_monto,
+    AsientoModel.taxonomia_clasificacion,
+    AsientoModel.estado,
+    AsientoModel.creado_por,
+    AsientoModel.verificado_por,
+    AsientoModel.created_at,
+]
+NOMBRES_EXPORTACION = [col.key for col in COLUMNAS_EXPORTACION]
+
+
+def _esquema_parquet() -> "pa.Schema":
+    tipos = {
+        "fecha": pa.timestamp("us"),
+        "created_at": pa.timestamp("us"),
+        "alcance_gei": pa.int32(),
+    }
+    numericas = {"cantidad_fisica", "factor_valor", "emisiones_tco2e", "consumo_agua_m3",
+                 "residuos_kg", "debe_monto", "haber_monto"}
+    return pa.schema([
+        (nombre, tipos.get(nombre, pa.float64() if nombre in numericas else pa.string()))
+        for nombre in NOMBRES_EXPORTACION
+    ])
+
+
+class _SalidaStream(io.RawIOBase):
+    """Sumidero append-only: ParquetWriter escribe aquí y se drena por lote"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicion = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._partes.append(bytes(data))
+        self._posicion += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def drenar(self) -> bytes:
+        data = b"".join(self._partes)
+        self._partes.clear()
+        return data
+
+
+class ExportacionService:
+    """
+    Exportar asientos filtrados con memoria constante
+
+    La consulta se recorre con un cursor del servidor (yield_per): en
+    memoria vive un lote. Cada exportación usa su propia sesión porque el
+    generador se consume después de cerrada la del request; sesiones
+    permite abrirla en una réplica de lectura.
+    """
+
+    def __init__(self, filtros: list, sesiones: sessionmaker = SessionLocal):
+        self.filtros = filtros
+        self.sesiones = sesiones
+
+    def lotes(self) -> Iterator[List[tuple]]:
+        """Filas del libro en lotes de LOTE_EXPORTACION, orden (fecha, id)"""
+        db = self.sesiones()
+        try:
+            query: Query = (
+                db.query(*COLUMNAS_EXPORTACION)
+                .filter(*self.filtros)
+                .order_by(AsientoModel.fecha, AsientoModel.id)
+                .execution_options(stream_results=True)
+                .yield_per(LOTE_EXPORTACION)
+            )
+            lote = []
+            for row in query:
+                lote.append(tuple(row))
+                if len(lote) >= LOTE_EXPORTACION:
+                    yield lote
+                    lote = []
+            if lote:
+                yield lote
+        finally:
+            db.close()
+
+    def exportar(self, formato: str) -> Iterator[bytes]:
+        if formato == "csv":
+            return self.csv()
+        if formato == "ndjson":
+            return self.ndjson()
+        if formato == "parquet":
+            return self.parquet()
+        raise ValueError(f"Formato inválido '{formato}'. Válidos: {list(FORMATOS_EXPORTACION)}")
+
+    def csv(self) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(NOMBRES_EXPORTACION)
+        for lote in self.lotes():
+            writer.writerows(lote)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue().encode("utf-8")
+
+    def ndjson(self) -> Iterator[bytes]:
+        for lote in self.lotes():
+            yield "".join(
+                json.dumps(dict(zip(NOMBRES_EXPORTACION, fila)), default=str, ensure_ascii=False) + "\n"
+                for fila in lote
+            ).encode("utf-8")
+
+    def parquet(self) -> Iterator[bytes]:
+        """Un row group por lote; el footer sale al final"""
+        if not HAS_PYARROW:
+            raise RuntimeError("Exportación Parquet requiere pyarrow")
+
+        esquema = _esquema_parquet()
+        salida = _SalidaStream()
+        writer = pq.ParquetWriter(pa.PythonFile(salida, mode="w"), esquema, compression="zstd")
+        try:
+            for lote in self.lotes():
+                columnas = list(zip(*lote))
+                arrays = [
+                    pa.array(
+                        [str(v) if v is not None else None for v in valores]
+                        if campo.type == pa.string() else valores,
+                        type=campo.type,
+                    )
+                    for campo, valores in zip(esquema, columnas)
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=esquema))
+                yield salida.drenar()
+        finally:
+            writer.close()
+        yield salida.drenar()
@@ -0,0 +1,673 @@
+"""
+KONTAX - Green Score Service: componentes agregados y cálculo del score
+"""
+from sqlalchemy import event, func, case, select, update, delete, cast, text, tuple_, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+from datetime import datetime
+import logging
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from app.core.database import SessionLocal
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.green_score import GreenScoreComponentes, GreenScoreSegmento, PERIODO_TOTAL
+from app.services.reporte_service import CUENTA_ACTIVOS_AMBIENTALES, CUENTA_PASIVOS_AMBIENTALES
+from app.services.rollup_service import (
+    Cambio,
+    asientos_cambiados,
+    cuenta,
+    deltas_consulta,
+    sumar_deltas,
+    sumar_en_tabla,
+)
+
+logger = logging.getLogger(__name__)
+
+
+COMPONENTES_KEYS = ["asientos", "verdes", "transicion", "activos_clp", "pasivos_clp", "emisiones_tco2e"]
+TENDENCIA_KEYS = ["tendencia_periodos", "tendencia_pendiente", "tendencia_relativa"]
+SEGMENTO_KEYS = ["categoria", "subcategoria", "cuenta_debe", "cuenta_haber"]
+
+# Ventana tendencia: últimos 12 meses, mínimo 6 con datos
+VENTANA_TENDENCIA_MESES = 12
+MIN_PERIODOS_TENDENCIA = 6
+
+
+def componentes_columns(asientos=None) -> list:
+    """Agregados de asientos validados que alimentan el score (una pasada; fuente como en rollup_columns)"""
+    a = (AsientoModel.__table__ if asientos is None else asientos).c
+    return [
+        func.count().label("asientos"),
+        func.coalesce(func.sum(case((a.taxonomia_clasificacion == "verde", 1), else_=0)), 0).label("verdes"),
+        func.coalesce(func.sum(case((a.taxonomia_clasificacion == "transicion", 1), else_=0)), 0).label("transicion"),
+        func.coalesce(func.sum(case(
+            (a.debe_cuenta.startswith(CUENTA_ACTIVOS_AMBIENTALES), a.debe_monto), else_=0
+        )), 0).label("activos_clp"),
+        func.coalesce(func.sum(case(
+            (a.haber_cuenta.startswith(CUENTA_PASIVOS_AMBIENTALES), a.haber_monto), else_=0
+        )), 0).label("pasivos_clp"),
+        func.coalesce(func.sum(a.emisiones_tco2e), 0).label("emisiones_tco2e"),
+    ]
+
+
+def segmento_columns(asientos=None) -> list:
+    """Claves de green_score_segmentos calculadas desde asientos_verdes (o la fuente dada)"""
+    a = (AsientoModel.__table__ if asientos is None else asientos).c
+    return [
+        a.categoria,
+        func.coalesce(a.subcategoria, "").label("subcategoria"),
+        func.coalesce(func.substr(a.debe_cuenta, 1, 4), "").label("cuenta_debe"),
+        func.coalesce(func.substr(a.haber_cuenta, 1, 4), "").label("cuenta_haber"),
+    ]
+
+
+def calcular_score(comp: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Green Score 0-100 a partir de los componentes agregados
+
+    Returns:
+        Dict con green_score, nivel, productos_elegibles y metricas
+    """
+    total = int(comp["asientos"])
+    verdes = int(comp["verdes"])
+    transicion = int(comp["transicion"])
+    activos = float(comp["activos_clp"])
+    pasivos = float(comp["pasivos_clp"])
+    tendencia_periodos = int(comp.get("tendencia_periodos") or 0)
+    tendencia_relativa = comp.get("tendencia_relativa")
+
+    # Score T-MAS (40 puntos max)
+    tmas_ratio = (verdes + transicion * 0.5) / total if total > 0 else 0
+    score_tmas = min(40, int(tmas_ratio * 40))
+
+    # Score tendencia emisiones (20 puntos max): -5%/mes o mejor = 20,
+    # +5%/mes o peor = 0. Sin MIN_PERIODOS_TENDENCIA meses no puntúa.
+    if tendencia_periodos >= MIN_PERIODOS_TENDENCIA and tendencia_relativa is not None:
+        score_tendencia = max(0, min(20, int((0.05 - tendencia_relativa) / 0.10 * 20)))
+    else:
+        score_tendencia = 0
+
+    # Score inversión (20 puntos max)
+    inversion_ratio = activos / pasivos if pasivos > 0 else 0
+    score_inversion = min(20, int(inversion_ratio * 20))
+
+    # Score cobertura reportería (10 puntos max) - más asientos = más cobertura
+    score_volumen = min(10, int(min(total / 50, 1) * 10))
+
+    # Score base certificaciones (10 puntos)
+    score_base = 10  # Base por tener contabilidad ambiental
+
+    green_score = min(100, score_tmas + score_tendencia + score_inversion + score_volumen + score_base)
+    nivel, productos = nivel_score(green_score)
+
+    return {
+        "green_score": green_score,
+        "nivel": nivel,
+        "productos_elegibles": productos,
+        "metricas": {
+            "total_asientos": total,
+            "asientos_verdes_tmas": verdes,
+            "asientos_transicion_tmas": transicion,
+            "ratio_tmas_verde": round(tmas_ratio, 3),
+            "activos_ambientales_clp": round(activos, 2),
+            "pasivos_ambientales_clp": round(pasivos, 2),
+            "tendencia_emisiones": {
+                "periodos": tendencia_periodos,
+                "pendiente_tco2e_mes": comp.get("tendencia_pendiente"),
+                "variacion_mensual": round(tendencia_relativa, 4) if tendencia_relativa is not None else None,
+            },
+            "componentes_score": {
+                "tmas": score_tmas,
+                "tendencia": score_tendencia,
+                "inversion": score_inversion,
+                "volumen": score_volumen,
+                "base": score_base,
+            },
+        },
+    }
+
+
+def nivel_score(green_score: int) -> Tuple[str, list]:
+    """Nivel y productos financieros elegibles según score"""
+    if green_score >= 80:
+        return "Excelente", [
+            "Bonos verdes",
+            "Tasa preferencial verde",
+            "Crédito inversión sostenible",
+            "Leasing verde",
+        ]
+    elif green_score >= 60:
+        return "Bueno", [
+            "Crédito verde",
+            "Leasing verde",
+            "Línea capital trabajo verde",
+        ]
+    elif green_score >= 40:
+        return "Transición", [
+            "Financiamiento mejora ambiental",
+            "Crédito transición energética",
+        ]
+    return "Inicial", ["Plan asesoría ambiental", "Diagnóstico gratuito"]
+
+
+def simular_componentes(
+    base: Dict[str, Any],
+    segmentos: List[Dict[str, Any]],
+    escenarios: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Componentes de cada escenario hipotético
+
+    Cada escenario es una lista de ajustes con filtro (categoria,
+    subcategoria, cuenta = prefijo debe/haber) y efecto:
+    - escala: multiplica las emisiones del segmento (0.7 = -30%); los
+      montos de activos/pasivos solo si el ajuste filtra por cuenta
+    - pct_verde: fracción de asientos no verdes que pasa a verde
+
+    Las emisiones pesan en el score vía la tendencia: la variación de
+    emisiones del escenario se supone lograda linealmente a lo largo de
+    la ventana de tendencia y se suma a la variación mensual actual. Sin
+    tendencia base (menos de MIN_PERIODOS_TENDENCIA meses) no cambia.
+
+    Todos los escenarios se evalúan juntos como matrices NumPy
+    (escenarios × segmentos).
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("Simulación green score requiere numpy")
+
+    n_esc, n_seg = len(escenarios), len(segmentos)
+    columna = lambda k: np.array([seg[k] for seg in segmentos], dtype=float)  # noqa: E731
+    asientos, verdes, transicion = columna("asientos"), columna("verdes"), columna("transicion")
+    activos, pasivos, emisiones = columna("activos_clp"), columna("pasivos_clp"), columna("emisiones_tco2e")
+
+    categorias = np.array([seg["categoria"] for seg in segmentos], dtype=object)
+    subcategorias = np.array([seg["subcategoria"] for seg in segmentos], dtype=object)
+    cuentas_debe = np.array([seg["cuenta_debe"] for seg in segmentos], dtype=str)
+    cuentas_haber = np.array([seg["cuenta_haber"] for seg in segmentos], dtype=str)
+
+    # escalas y fracción no-verde que se mantiene, por escenario y segmento
+    escala_emisiones = np.ones((n_esc, n_seg))
+    escala_montos = np.ones((n_esc, n_seg))
+    resto_no_verde = np.ones((n_esc, n_seg))
+    for i, escenario in enumerate(escenarios):
+        for ajuste in escenario.get("ajustes", []):
+            mask = np.ones(n_seg, dtype=bool)
+            if ajuste.get("categoria"):
+                mask &= categorias == ajuste["categoria"]
+            if ajuste.get("subcategoria"):
+                mask &= subcategorias == ajuste["subcategoria"]
+            if ajuste.get("cuenta"):
+                mask &= (
+                    np.char.startswith(cuentas_debe, ajuste["cuenta"])
+                    | np.char.startswith(cuentas_haber, ajuste["cuenta"])
+                )
+                escala_montos[i, mask] *= float(ajuste.get("escala", 1.0))
+            escala_emisiones[i, mask] *= float(ajuste.get("escala", 1.0))
+            resto_no_verde[i, mask] *= 1 - float(ajuste.get("pct_verde", 0.0))
+
+    no_verdes = asientos - verdes
+    sim_verdes = (verdes + (1 - resto_no_verde) * no_verdes).sum(axis=1)
+    sim_transicion = (transicion * resto_no_verde).sum(axis=1)
+    sim_activos = (escala_montos * activos).sum(axis=1)
+    sim_pasivos = (escala_montos * pasivos).sum(axis=1)
+    sim_emisiones = (escala_emisiones * emisiones).sum(axis=1)
+
+    emisiones_segmentos = emisiones.sum()
+    variacion = sim_emisiones / emisiones_segmentos - 1 if emisiones_segmentos > 0 else np.zeros(n_esc)
+    tendencia = base.get("tendencia_relativa")
+
+    return [
+        {
+            **base,
+            "verdes": int(round(sim_verdes[i])),
+            "transicion": int(round(sim_transicion[i])),
+            "activos_clp": float(sim_activos[i]),
+            "pasivos_clp": float(sim_pasivos[i]),
+            "emisiones_tco2e": float(sim_emisiones[i]),
+            "tendencia_relativa": (
+                tendencia + float(variacion[i]) / (VENTANA_TENDENCIA_MESES - 1) if tendencia is not None else None
+            ),
+        }
+        for i in range(n_esc)
+    ]
+
+
+def bloquear_entidad(connection, entity_id: UUID) -> None:
+    """
+    Advisory lock de transacción sobre los componentes de la entidad
+
+    La fila "*" suma todos los períodos: dos transacciones que tocan meses
+    distintos de la misma entidad se serializan aquí, y la segunda suma
+    viendo el mes ya commiteado por la primera (sin updates perdidos).
+    """
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:clave))"),
+        {"clave": f"greenscore:{entity_id}"},
+    )
+
+
+def recalcular_componentes(connection, entity_id: UUID, periodo: str) -> None:
+    """
+    Recalcular fila (entity_id, periodo) y la fila total de la entidad
+
+    Usa la conexión de la transacción en curso: los componentes quedan
+    consistentes con los asientos en el mismo commit. Los segmentos del
+    mes se reemplazan con una lectura de asientos y la fila del mes es
+    su suma.
+    """
+    tabla = GreenScoreComponentes.__table__
+    segmentos = GreenScoreSegmento.__table__
+    ahora = datetime.utcnow()
+    bloquear_entidad(connection, entity_id)
+
+    connection.execute(
+        delete(segmentos).where(
+            segmentos.c.entity_id == entity_id,
+            segmentos.c.periodo == periodo,
+        )
+    )
+    _insertar_segmentos(connection, entity_id, AsientoModel.periodo == periodo)
+    row = connection.execute(
+        select(*[func.coalesce(func.sum(segmentos.c[k]), 0).label(k) for k in COMPONENTES_KEYS]).where(
+            segmentos.c.entity_id == entity_id,
+            segmentos.c.periodo == periodo,
+        )
+    ).one()
+    _upsert(connection, entity_id, periodo, {k: getattr(row, k) or 0 for k in COMPONENTES_KEYS}, ahora)
+
+    total = connection.execute(
+        select(*[func.coalesce(func.sum(tabla.c[k]), 0).label(k) for k in COMPONENTES_KEYS]).where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo != PERIODO_TOTAL,
+        )
+    ).one()
+    _upsert(connection, entity_id, PERIODO_TOTAL, {k: getattr(total, k) or 0 for k in COMPONENTES_KEYS}, ahora)
+    actualizar_tendencia(connection, entity_id)
+
+
+def actualizar_tendencia(connection, entity_id: UUID) -> None:
+    """
+    Recalcular tendencia de emisiones de todos los períodos de la entidad
+
+    Pendiente de regresión (regr_slope) de emisiones mensuales sobre una
+    ventana RANGE de 12 meses, con funciones ventana sobre las filas de
+    green_score_componentes (no sobre asientos). La fila "*" toma la
+    tendencia del último mes cerrado: el mes en curso está incompleto y
+    su emisión parcial arrastraría la pendiente hacia abajo.
+
+    Es un UPDATE aparte (después del upsert de componentes), no parte de
+    la consulta de agregados: la ventana necesita las filas mensuales ya
+    actualizadas.
+    """
+    tabla = GreenScoreComponentes.__table__
+    mes = (
+        cast(func.substr(tabla.c.periodo, 1, 4), Integer) * 12
+        + cast(func.substr(tabla.c.periodo, 6, 2), Integer)
+    )
+    ventana = {"order_by": mes, "range_": (-(VENTANA_TENDENCIA_MESES - 1), 0)}
+
+    serie = (
+        select(
+            tabla.c.periodo,
+            func.regr_slope(tabla.c.emisiones_tco2e, mes).over(**ventana).label("pendiente"),
+            func.avg(tabla.c.emisiones_tco2e).over(**ventana).label("promedio"),
+            func.count().over(**ventana).label("periodos"),
+        )
+        .where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo != PERIODO_TOTAL,
+        )
+        .subquery()
+    )
+    connection.execute(
+        update(tabla)
+        .where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo == serie.c.periodo,
+        )
+        .values(
+            tendencia_periodos=serie.c.periodos,
+            tendencia_pendiente=serie.c.pendiente,
+            tendencia_relativa=case(
+                (serie.c.promedio > 0, serie.c.pendiente / serie.c.promedio),
+                else_=None,
+            ),
+        )
+    )
+
+    ultimo = (
+        select(tabla.c.tendencia_periodos, tabla.c.tendencia_pendiente, tabla.c.tendencia_relativa)
+        .where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo != PERIODO_TOTAL,
+            tabla.c.periodo < datetime.utcnow().strftime("%Y-%m"),
+        )
+        .order_by(tabla.c.periodo.desc())
+        .limit(1)
+        .subquery()
+    )
+    connection.execute(
+        update(tabla)
+        .where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo == PERIODO_TOTAL,
+        )
+        .values(
+            tendencia_periodos=func.coalesce(select(ultimo.c.tendencia_periodos).scalar_subquery(), 0),
+            tendencia_pendiente=select(ultimo.c.tendencia_pendiente).scalar_subquery(),
+            tendencia_relativa=select(ultimo.c.tendencia_relativa).scalar_subquery(),
+        )
+    )
+
+
+def backfill_componentes(connection, entity_id: UUID) -> None:
+    """Calcular segmentos y componentes de todos los períodos de la entidad (una lectura de asientos)"""
+    segmentos = GreenScoreSegmento.__table__
+    ahora = datetime.utcnow()
+    bloquear_entidad(connection, entity_id)
+
+    connection.execute(delete(segmentos).where(segmentos.c.entity_id == entity_id))
+    _insertar_segmentos(connection, entity_id)
+    rows = connection.execute(
+        select(segmentos.c.periodo, *[func.sum(segmentos.c[k]).label(k) for k in COMPONENTES_KEYS])
+        .where(segmentos.c.entity_id == entity_id)
+        .group_by(segmentos.c.periodo)
+    ).all()
+    total = dict.fromkeys(COMPONENTES_KEYS, 0)
+    for row in rows:
+        valores = {k: getattr(row, k) or 0 for k in COMPONENTES_KEYS}
+        _upsert(connection, entity_id, row.periodo, valores, ahora)
+        for k in COMPONENTES_KEYS:
+            total[k] += valores[k]
+    _upsert(connection, entity_id, PERIODO_TOTAL, total, ahora)
+    actualizar_tendencia(connection, entity_id)
+
+
+def _insertar_segmentos(connection, entity_id: UUID, *filtros) -> None:
+    """INSERT ... SELECT de segmentos desde los asientos validados de la entidad"""
+    claves = segmento_columns()
+    agrupado = (
+        select(AsientoModel.entity_id, AsientoModel.periodo, *claves, *componentes_columns())
+        .where(
+            AsientoModel.entity_id == entity_id,
+            AsientoModel.estado == "validado",
+            *filtros,
+        )
+        .group_by(AsientoModel.entity_id, AsientoModel.periodo, *claves)
+    )
+    connection.execute(
+        GreenScoreSegmento.__table__.insert().from_select(
+            ["entity_id", "periodo", *SEGMENTO_KEYS, *COMPONENTES_KEYS], agrupado
+        )
+    )
+
+
+def _tiene_componentes(connection, entity_id: UUID) -> bool:
+    """La entidad ya tiene fila total (sus períodos están calculados)"""
+    tabla = GreenScoreComponentes.__table__
+    return connection.execute(
+        select(tabla.c.entity_id).where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo == PERIODO_TOTAL,
+        )
+    ).first() is not None
+
+
+def entidades_sin_componentes(connection, entity_ids: List[UUID]) -> List[UUID]:
+    """Entidades de la lista que aún no tienen fila total"""
+    tabla = GreenScoreComponentes.__table__
+    con_total = {
+        row.entity_id
+        for row in connection.execute(
+            select(tabla.c.entity_id).where(
+                tabla.c.entity_id.in_(entity_ids),
+                tabla.c.periodo == PERIODO_TOTAL,
+            )
+        )
+    }
+    return [entity_id for entity_id in entity_ids if entity_id not in con_total]
+
+
+def _upsert(connection, entity_id: UUID, periodo: str, valores: Dict[str, float], ahora: datetime) -> None:
+    """INSERT ... ON CONFLICT (entity_id, periodo) DO UPDATE"""
+    stmt = pg_insert(GreenScoreComponentes.__table__).values(
+        entity_id=entity_id, periodo=periodo, updated_at=ahora, **valores
+    )
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["entity_id", "periodo"],
+            set_={**valores, "updated_at": ahora},
+        )
+    )
+
+
+def actualizar_componentes(connection, pendientes: Set[Tuple[UUID, str]]) -> None:
+    """
+    Recalcular componentes de varios (entidad, período)
+
+    Entidades sin componentes previos se calculan completas (backfill).
+    Orden fijo por entidad: los advisory locks se toman siempre en el
+    mismo orden (sin deadlocks).
+    """
+    backfilled = set()
+    for entity_id, periodo in sorted(pendientes, key=lambda t: (str(t[0]), t[1])):
+        if entity_id in backfilled:
+            continue
+        if _tiene_componentes(connection, entity_id):
+            recalcular_componentes(connection, entity_id, periodo)
+        else:
+            # Primera vez: calcular todos los períodos, no solo el tocado
+            backfill_componentes(connection, entity_id)
+            backfilled.add(entity_id)
+
+
+def clave_segmento(v: Dict[str, Any]) -> Optional[tuple]:
+    """Clave de green_score_segmentos de un asiento; None si no está validado"""
+    if v["estado"] != "validado":
+        return None
+    return (
+        v["entity_id"], v["periodo"], v["categoria"], v["subcategoria"] or "",
+        cuenta(v["debe_cuenta"]), cuenta(v["haber_cuenta"]),
+    )
+
+
+def medidas_componentes(v: Dict[str, Any]) -> Dict[str, float]:
+    """Aporte de un asiento a COMPONENTES_KEYS (mismo cálculo que componentes_columns)"""
+    return {
+        "asientos": 1,
+        "verdes": 1 if v["taxonomia_clasificacion"] == "verde" else 0,
+        "transicion": 1 if v["taxonomia_clasificacion"] == "transicion" else 0,
+        "activos_clp": (v["debe_monto"] or 0) if (v["debe_cuenta"] or "").startswith(CUENTA_ACTIVOS_AMBIENTALES) else 0,
+        "pasivos_clp": (v["haber_monto"] or 0) if (v["haber_cuenta"] or "").startswith(CUENTA_PASIVOS_AMBIENTALES) else 0,
+        "emisiones_tco2e": v["emisiones_tco2e"] or 0,
+    }
+
+
+def deltas_componentes(connection, asientos) -> Dict[tuple, Dict[str, float]]:
+    """Deltas de segmentos por alta de todas las filas validadas de una fuente (GROUP BY en la base)"""
+    claves = [asientos.c.entity_id, asientos.c.periodo, *segmento_columns(asientos)]
+    query = (
+        select(*claves, *componentes_columns(asientos))
+        .where(asientos.c.estado == "validado")
+        .group_by(*claves)
+    )
+    return deltas_consulta(connection, query, len(claves))
+
+
+def aplicar_componentes(connection, cambios: List[Cambio]) -> None:
+    """
+    Sumar a segmentos, fila del mes y fila "*" los deltas de los asientos
+    cambiados (sin releer asientos ni el mes)
+    """
+    sumar_componentes(connection, sumar_deltas(cambios, clave_segmento, medidas_componentes))
+
+
+def sumar_componentes(connection, segmentos: Dict[tuple, Dict[str, float]]) -> None:
+    """
+    Sumar deltas por clave de segmento (entity_id, periodo, SEGMENTO_KEYS)
+    a segmentos, fila del mes y fila "*"
+
+    Entidades sin componentes previos se calculan completas (backfill, que
+    ya ve los cambios de la transacción). La tendencia se recalcula solo
+    si cambiaron emisiones o meses con asientos.
+    """
+    if not segmentos:
+        return
+
+    con_deltas = set()
+    for entity_id in sorted({k[0] for k in segmentos}, key=str):
+        bloquear_entidad(connection, entity_id)
+        if _tiene_componentes(connection, entity_id):
+            con_deltas.add(entity_id)
+        else:
+            backfill_componentes(connection, entity_id)
+    segmentos = {k: d for k, d in segmentos.items() if k[0] in con_deltas}
+    if not segmentos:
+        return
+
+    filas: Dict[tuple, Dict[str, float]] = {}
+    for k, d in segmentos.items():
+        for clave in ((k[0], k[1]), (k[0], PERIODO_TOTAL)):
+            acumulado = filas.setdefault(clave, {})
+            for medida, valor in d.items():
+                acumulado[medida] = acumulado.get(medida, 0) + valor
+    filas = {k: d for k, d in filas.items() if any(d.values())}
+    meses = sorted({(k[0], k[1]) for k in segmentos}, key=lambda t: (str(t[0]), t[1]))
+
+    tabla = GreenScoreComponentes.__table__
+    tabla_segmentos = GreenScoreSegmento.__table__
+    sumar_en_tabla(connection, tabla_segmentos, ["entity_id", "periodo", *SEGMENTO_KEYS], segmentos)
+    sumar_en_tabla(connection, tabla, ["entity_id", "periodo"], filas, updated_at=datetime.utcnow())
+    connection.execute(
+        delete(tabla_segmentos).where(
+            tuple_(tabla_segmentos.c.entity_id, tabla_segmentos.c.periodo).in_(meses),
+            tabla_segmentos.c.asientos <= 0,
+        )
+    )
+    connection.execute(
+        delete(tabla).where(
+            tuple_(tabla.c.entity_id, tabla.c.periodo).in_(meses),
+            tabla.c.asientos <= 0,
+        )
+    )
+
+    for entity_id in sorted({
+        k[0] for k, d in filas.items()
+        if k[1] != PERIODO_TOTAL and (d.get("emisiones_tco2e") or d.get("asientos"))
+    }, key=str):
+        actualizar_tendencia(connection, entity_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _actualizar_componentes(session: Session, flush_context) -> None:
+    """Sumar a los componentes los deltas de los asientos del flush"""
+    cambios = asientos_cambiados(session)
+    if cambios:
+        aplicar_componentes(session.connection(), cambios)
+
+
+class GreenScoreService:
+    """Lectura de Green Score desde componentes persistidos"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def componentes(self, entity_id: UUID, periodo: Optional[str] = None) -> Dict[str, float]:
+        """
+        Componentes de la entidad (búsqueda por PK)
+
+        Si aún no existen (datos previos al mantenimiento incremental) se
+        calculan con una consulta agregada y se persisten. Desde una sesión
+        de réplica (solo lectura) ese cálculo se hace en el primario.
+        """
+        clave = periodo or PERIODO_TOTAL
+        comp = self.db.get(GreenScoreComponentes, (entity_id, clave))
+        if comp is None and self.db.info.get("replica"):
+            with SessionLocal() as primario:
+                return GreenScoreService(primario).componentes(entity_id, periodo)
+        if comp is None:
+            connection = self.db.connection()
+            if _tiene_componentes(connection, entity_id):
+                recalcular_componentes(connection, entity_id, periodo)
+            else:
+                backfill_componentes(connection, entity_id)
+            self.db.commit()
+            comp = self.db.get(GreenScoreComponentes, (entity_id, clave))
+        if not comp:
+            return dict.fromkeys(COMPONENTES_KEYS + TENDENCIA_KEYS, 0)
+        return {
+            **{k: getattr(comp, k) or 0 for k in COMPONENTES_KEYS},
+            **{k: getattr(comp, k) for k in TENDENCIA_KEYS},
+        }
+
+    def segmentos(self, entity_id: UUID, periodo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Componentes desglosados por categoria, subcategoria y cuentas
+
+        Lectura de green_score_segmentos (mantenidos junto a los
+        componentes, sin tocar asientos). Sin período se suman todos los
+        meses de la entidad.
+        """
+        seg = GreenScoreSegmento
+        claves = [getattr(seg, k) for k in SEGMENTO_KEYS]
+        query = (
+            self.db.query(*claves, *[func.sum(getattr(seg, k)).label(k) for k in COMPONENTES_KEYS])
+            .filter(seg.entity_id == entity_id)
+            .group_by(*claves)
+        )
+        if periodo:
+            query = query.filter(seg.periodo == periodo)
+
+        return [
+            {
+                **{k: getattr(row, k) for k in SEGMENTO_KEYS},
+                **{k: float(getattr(row, k) or 0) for k in COMPONENTES_KEYS},
+            }
+            for row in query
+        ]
+
+    def simular(
+        self,
+        entity_id: UUID,
+        escenarios: List[Dict[str, Any]],
+        periodo: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Score de escenarios hipotéticos sobre los componentes persistidos
+        (ver simular_componentes)
+        """
+        base = self.componentes(entity_id, periodo)
+        simulados = simular_componentes(base, self.segmentos(entity_id, periodo), escenarios)
+
+        score_base = calcular_score(base)
+        resultados = []
+        for i, (escenario, comp) in enumerate(zip(escenarios, simulados)):
+            score = calcular_score(comp)
+            resultados.append({
+                "nombre": escenario.get("nombre") or f"escenario_{i + 1}",
+                "green_score": score["green_score"],
+                "delta_score": score["green_score"] - score_base["green_score"],
+                "nivel": score["nivel"],
+                "productos_elegibles": score["productos_elegibles"],
+                "emisiones_tco2e": round(comp["emisiones_tco2e"], 3),
+                "delta_emisiones_tco2e": round(comp["emisiones_tco2e"] - float(base["emisiones_tco2e"]), 3),
+                "componentes_score": score["metricas"]["componentes_score"],
+            })
+
+        return {
+            "entity_id": str(entity_id),
+            "periodo": periodo,
+            "base": {
+                "green_score": score_base["green_score"],
+                "nivel": score_base["nivel"],
+                "emisiones_tco2e": round(float(base["emisiones_tco2e"]), 3),
+            },
+            "escenarios": resultados,
+        }
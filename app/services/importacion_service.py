@@ -0,0 +1,320 @@
+"""
+KONTAX - Importación de libros CSV/Parquet: validación vectorizada + COPY
+"""
+from sqlalchemy import DateTime, Float, Integer, String, column, literal, select, table, text
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+from uuid import UUID
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+import io
+import logging
+import os
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+from app.config import settings
+from app.core.sharding import verificar_escritura
+from app.integrations.minio_client import MinioClient
+from app.models.importacion_asientos import ImportacionAsientos
+from app.services.green_score_service import deltas_componentes, sumar_componentes
+from app.services.rollup_service import deltas_rollup, sumar_rollup
+
+logger = logging.getLogger(__name__)
+
+
+FORMATOS_IMPORTACION = ["csv", "parquet"]
+
+# Columnas aceptadas (encabezado = nombre de columna en asientos_verdes)
+COLUMNAS_TEXTO = [
+    "tipo", "categoria", "subcategoria", "descripcion", "unidad_fisica", "factor_unidad",
+    "debe_cuenta", "debe_nombre", "haber_cuenta", "haber_nombre", "taxonomia_clasificacion",
+]
+COLUMNAS_NUMERO = [
+    "cantidad_fisica", "factor_valor", "emisiones_tco2e", "consumo_agua_m3",
+    "residuos_kg", "debe_monto", "haber_monto",
+]
+COLUMNAS_OBLIGATORIAS = ["fecha", "tipo", "categoria", "descripcion", "cantidad_fisica", "unidad_fisica"]
+
+# Orden de columnas en la tabla staging (y en el CSV enviado a COPY)
+COLUMNAS_STAGING = ["fecha", "periodo", *COLUMNAS_TEXTO, *COLUMNAS_NUMERO, "alcance_gei"]
+
+FORMATOS_FECHA = ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d-%m-%Y", "%d/%m/%Y"]
+PATRON_NUMERO = r"^-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?$"
+PATRON_ENTERO = r"^-?[0-9]+$"
+
+# Filas rechazadas que se guardan como muestra en el job
+MAX_ERRORES_MUESTRA = 100
+
+# Tabla staging por conexión: vacía al terminar cada transacción (lote)
+STAGING_DDL = f"""
+CREATE TEMP TABLE IF NOT EXISTS asientos_import_staging (
+    fecha timestamp NOT NULL,
+    periodo varchar(7) NOT NULL,
+    {", ".join(f"{c} text" for c in COLUMNAS_TEXTO)},
+    {", ".join(f"{c} double precision" for c in COLUMNAS_NUMERO)},
+    alcance_gei integer
+) ON COMMIT DELETE ROWS
+"""
+
+_COLUMNAS_MERGE = ", ".join(COLUMNAS_STAGING)
+MERGE_SQL = f"""
+INSERT INTO asientos_verdes (
+    id, entity_id, estado, creado_por, metadata_json, created_at, updated_at, {_COLUMNAS_MERGE}
+)
+SELECT
+    gen_random_uuid(), :entity_id, 'confirmado', :creado_por, '{{}}'::json, :ahora, :ahora, {_COLUMNAS_MERGE}
+FROM asientos_import_staging
+"""
+
+
+STAGING = table(
+    "asientos_import_staging",
+    column("fecha", DateTime),
+    column("periodo", String),
+    *[column(c, String) for c in COLUMNAS_TEXTO],
+    *[column(c, Float) for c in COLUMNAS_NUMERO],
+    column("alcance_gei", Integer),
+)
+
+
+def asientos_staging(entity_id: UUID):
+    """Filas de staging como los asientos que genera MERGE_SQL (fuente de rollup_columns)"""
+    return select(
+        literal(entity_id, PG_UUID(as_uuid=True)).label("entity_id"),
+        literal("confirmado").label("estado"),
+        *STAGING.c,
+    ).subquery()
+
+
+def _texto(col) -> "pa.Array":
+    """Columna como texto sin espacios; vacío → null"""
+    if not pa.types.is_string(col.type):
+        col = pc.cast(col, pa.string())
+    col = pc.utf8_trim_whitespace(col)
+    return pc.if_else(pc.equal(pc.utf8_length(col), 0), pa.scalar(None, pa.string()), col)
+
+
+def _fecha(col) -> "pa.Array":
+    """Timestamp; formatos de FORMATOS_FECHA, inválidos → null"""
+    if pa.types.is_timestamp(col.type) or pa.types.is_date(col.type):
+        return pc.cast(col, pa.timestamp("us"))
+    col = _texto(col)
+    return pc.coalesce(*[
+        pc.strptime(col, format=formato, unit="us", error_is_null=True)
+        for formato in FORMATOS_FECHA
+    ])
+
+
+def _numero(col, tipo) -> "pa.Array":
+    """Número (float64 o int32); texto no numérico → null"""
+    if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+        return pc.cast(col, tipo, safe=False)
+    col = _texto(col)
+    patron = PATRON_ENTERO if pa.types.is_integer(tipo) else PATRON_NUMERO
+    ok = pc.fill_null(pc.match_substring_regex(col, patron), False)
+    return pc.cast(pc.if_else(ok, col, pa.scalar(None, pa.string())), tipo, safe=False)
+
+
+def _or_all(mascaras: List["pa.Array"]) -> "pa.Array":
+    resultado = mascaras[0]
+    for mascara in mascaras[1:]:
+        resultado = pc.or_(resultado, mascara)
+    return resultado
+
+
+def validar_lote(batch: "pa.RecordBatch") -> Tuple["pa.Table", Dict[str, "pa.Array"]]:
+    """
+    Validar y tipar un lote completo con kernels Arrow (sin bucle por fila)
+
+    Returns:
+        (tabla válida en orden COLUMNAS_STAGING, máscaras de error por columna)
+    """
+    n = batch.num_rows
+    nombres = set(batch.schema.names)
+
+    def fuente(nombre):
+        return batch.column(nombre) if nombre in nombres else pa.nulls(n, pa.string())
+
+    columnas = {"fecha": _fecha(fuente("fecha"))}
+    for nombre in COLUMNAS_TEXTO:
+        columnas[nombre] = _texto(fuente(nombre))
+    for nombre in COLUMNAS_NUMERO:
+        columnas[nombre] = _numero(fuente(nombre), pa.float64())
+    columnas["alcance_gei"] = _numero(fuente("alcance_gei"), pa.int32())
+
+    # Error: obligatoria vacía, o valor presente que no se pudo convertir
+    errores = {}
+    for nombre, tipada in columnas.items():
+        convertida = pc.is_valid(tipada)
+        if nombre in COLUMNAS_OBLIGATORIAS:
+            errores[nombre] = pc.invert(convertida)
+        else:
+            presente = pc.is_valid(_texto(fuente(nombre)))
+            errores[nombre] = pc.and_(presente, pc.invert(convertida))
+    alcance = columnas["alcance_gei"]
+    errores["alcance_gei"] = pc.or_(
+        errores["alcance_gei"],
+        pc.and_(pc.is_valid(alcance), pc.invert(pc.is_in(alcance, value_set=pa.array([1, 2, 3], pa.int32())))),
+    )
+
+    valida = pc.invert(_or_all(list(errores.values())))
+    columnas["periodo"] = pc.strftime(columnas["fecha"], format="%Y-%m")
+
+    tabla = pa.table({nombre: columnas[nombre] for nombre in COLUMNAS_STAGING}).filter(valida)
+    return tabla, errores
+
+
+def muestra_errores(errores: Dict[str, "pa.Array"], desde_fila: int, maximo: int) -> List[dict]:
+    """Primeras filas rechazadas del lote con las columnas que fallaron"""
+    if maximo <= 0:
+        return []
+    rechazo = _or_all(list(errores.values()))
+    indices = pc.indices_nonzero(rechazo).slice(0, maximo).to_pylist()
+    return [
+        {
+            "fila": desde_fila + i + 1,
+            "motivo": "columnas inválidas: " + ", ".join(
+                nombre for nombre, mascara in errores.items() if mascara[i].as_py()
+            ),
+        }
+        for i in indices
+    ]
+
+
+class ImportacionService:
+    """Carga de un libro por lotes: Arrow → COPY a staging → INSERT a asientos_verdes"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lotes(self, job: ImportacionAsientos) -> Iterator["pa.RecordBatch"]:
+        """
+        Lotes del archivo fuente con memoria acotada
+
+        CSV se lee en streaming desde MinIO; Parquet necesita acceso
+        aleatorio, se descarga a un temporal y se lee por row groups.
+        """
+        minio = MinioClient()
+        bucket = settings.MINIO_BUCKET_IMPORTACIONES
+
+        if job.formato == "csv":
+            resp = minio.abrir(bucket, job.objeto_key)
+            try:
+                reader = pacsv.open_csv(
+                    resp,
+                    read_options=pacsv.ReadOptions(block_size=32 * 1024 * 1024),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types={c: pa.string() for c in COLUMNAS_STAGING},
+                        strings_can_be_null=True,
+                    ),
+                )
+                for batch in reader:
+                    yield batch
+            finally:
+                resp.close()
+                resp.release_conn()
+            return
+
+        fd, path = tempfile.mkstemp(suffix=".parquet")
+        os.close(fd)
+        try:
+            minio.descargar(bucket, job.objeto_key, path)
+            archivo = pq.ParquetFile(path)
+            columnas = [c for c in archivo.schema_arrow.names if c in set(COLUMNAS_STAGING)]
+            yield from archivo.iter_batches(batch_size=settings.IMPORTACION_LOTE_FILAS, columns=columnas)
+        finally:
+            os.unlink(path)
+
+    def cargar_lote(self, job: ImportacionAsientos, tabla: "pa.Table") -> int:
+        """
+        COPY del lote a staging y merge a asientos_verdes (en la transacción en curso)
+
+        Rollup y green score suman los deltas del lote, agrupados sobre la
+        staging: el costo es el del lote, no el de los meses que toca.
+        """
+        if tabla.num_rows == 0:
+            return 0
+
+        buf = io.BytesIO()
+        pacsv.write_csv(tabla, buf, write_options=pacsv.WriteOptions(include_header=False))
+        buf.seek(0)
+
+        connection = self.db.connection()
+        connection.execute(text(STAGING_DDL))
+        raw = connection.connection
+        with raw.cursor() as cur:
+            cur.copy_expert(
+                f"COPY asientos_import_staging ({_COLUMNAS_MERGE}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        asientos = asientos_staging(job.entity_id)
+        sumar_rollup(connection, deltas_rollup(connection, asientos))
+        sumar_componentes(connection, deltas_componentes(connection, asientos))
+        connection.execute(
+            text(MERGE_SQL),
+            # Timestamps naive en UTC, como los defaults datetime.utcnow de los modelos
+            {"entity_id": job.entity_id, "creado_por": f"importacion:{job.id}", "ahora": datetime.utcnow()},
+        )
+        return tabla.num_rows
+
+    def procesar(self, job: ImportacionAsientos) -> None:
+        """
+        Procesar (o reanudar) una importación
+
+        Cada lote se valida, carga y confirma junto con el avance del job y
+        sus deltas de rollup y green score: lo confirmado nunca queda sin
+        derivados, y al reanudar se saltan las filas ya
+        confirmadas. Si la entidad
+        entra al corte de una migración de shard se corta con ShardBloqueado.
+        """
+        if not HAS_PYARROW:
+            raise RuntimeError("Importación de libros requiere pyarrow")
+
+        job.estado = "procesando"
+        job.error = None
+        self.db.commit()
+
+        checkpoint = job.filas_procesadas or 0
+        leidas = 0
+        for batch in self.lotes(job):
+            if leidas + batch.num_rows <= checkpoint:
+                leidas += batch.num_rows
+                continue
+            if leidas < checkpoint:
+                batch = batch.slice(checkpoint - leidas)
+                leidas = checkpoint
+
+            verificar_escritura(job.entity_id)
+            faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in batch.schema.names]
+            if faltantes:
+                raise ValueError(f"Faltan columnas obligatorias: {faltantes}")
+
+            tabla, errores = validar_lote(batch)
+            cargadas = self.cargar_lote(job, tabla)
+
+            muestra = list(job.errores_json or [])
+            muestra.extend(muestra_errores(errores, leidas, MAX_ERRORES_MUESTRA - len(muestra)))
+            periodos = set(job.periodos_json or [])
+            periodos.update(pc.unique(tabla.column("periodo")).to_pylist())
+
+            leidas += batch.num_rows
+            job.filas_procesadas = leidas
+            job.filas_cargadas = (job.filas_cargadas or 0) + cargadas
+            job.filas_rechazadas = (job.filas_rechazadas or 0) + batch.num_rows - cargadas
+            job.errores_json = muestra
+            job.periodos_json = sorted(periodos)
+            self.db.commit()
+            logger.info(f"Importación {job.id}: {leidas} filas procesadas")
+
+        job.estado = "completo"
+        job.completado_at = datetime.utcnow()
+        self.db.commit()
@@ -0,0 +1,133 @@
+"""
+KONTAX - Particiones asientos_verdes: creación anticipada y archivo por mes
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from datetime import date
+from typing import List, Optional
+import logging
+import re
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+TABLA = "asientos_verdes"
+
+# asientos_verdes_p2026_03 ↔ período 2026-03
+_PATRON_PARTICION = re.compile(rf"{TABLA}_p(\d{{4}})_(\d{{2}})")
+
+
+def nombre_particion(periodo: str) -> str:
+    """Nombre de la partición de un período YYYY-MM"""
+    return f"{TABLA}_p{periodo[:4]}_{periodo[5:7]}"
+
+
+def sumar_meses(periodo: str, meses: int) -> str:
+    """Período YYYY-MM desplazado en meses (negativo hacia atrás)"""
+    indice = int(periodo[:4]) * 12 + int(periodo[5:7]) - 1 + meses
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+def periodo_actual() -> str:
+    hoy = date.today()
+    return f"{hoy.year:04d}-{hoy.month:02d}"
+
+
+def particiones(connection: Connection) -> List[str]:
+    """Períodos con partición adjunta a asientos_verdes, en orden"""
+    nombres = connection.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = :tabla
+            """
+        ),
+        {"tabla": TABLA},
+    ).scalars()
+    periodos = []
+    for nombre in nombres:
+        match = _PATRON_PARTICION.fullmatch(nombre)
+        if match:
+            periodos.append(f"{match.group(1)}-{match.group(2)}")
+    return sorted(periodos)
+
+
+def crear_particion(connection: Connection, periodo: str) -> bool:
+    """
+    Crear la partición de un mes si no existe
+
+    Postgres rechaza crearla si asientos_verdes_default ya tiene filas del
+    mes: por eso se crean con ASIENTOS_PARTICIONES_ADELANTE meses de margen.
+
+    Returns:
+        True si se creó
+    """
+    nombre = nombre_particion(periodo)
+    existe = connection.execute(text("SELECT to_regclass(:nombre)"), {"nombre": nombre}).scalar()
+    if existe:
+        return False
+
+    connection.execute(
+        text(
+            f"CREATE TABLE {nombre} PARTITION OF {TABLA} "
+            f"FOR VALUES FROM ('{periodo}') TO ('{sumar_meses(periodo, 1)}')"
+        )
+    )
+    logger.info(f"Partición {nombre} creada")
+    return True
+
+
+def crear_particiones(connection: Connection, desde: str, hasta: str) -> List[str]:
+    """Crear particiones faltantes entre dos períodos (inclusive)"""
+    creadas = []
+    periodo = desde
+    while periodo <= hasta:
+        if crear_particion(connection, periodo):
+            creadas.append(periodo)
+        periodo = sumar_meses(periodo, 1)
+    return creadas
+
+
+def archivar_particion(connection: Connection, periodo: str, esquema: str) -> None:
+    """
+    Desacoplar la partición de un mes y moverla al esquema de archivo
+
+    DETACH CONCURRENTLY no bloquea lecturas/escrituras de la tabla, pero no
+    puede correr en transacción: connection debe estar en AUTOCOMMIT. La
+    tabla queda intacta en el esquema archivo (para dump o re-ATTACH).
+    """
+    nombre = nombre_particion(periodo)
+    connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {esquema}"))
+    connection.execute(text(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre} CONCURRENTLY"))
+    connection.execute(text(f"ALTER TABLE {nombre} SET SCHEMA {esquema}"))
+    logger.info(f"Partición {nombre} archivada en {esquema}")
+
+
+def mantener_particiones(
+    connection: Connection,
+    adelante: Optional[int] = None,
+    retencion: Optional[int] = None,
+) -> dict:
+    """
+    Mantención periódica: particiones para los próximos meses y archivo de
+    las que superan la retención. connection en AUTOCOMMIT.
+    """
+    adelante = settings.ASIENTOS_PARTICIONES_ADELANTE if adelante is None else adelante
+    retencion = settings.ASIENTOS_RETENCION_MESES if retencion is None else retencion
+
+    actual = periodo_actual()
+    creadas = crear_particiones(connection, actual, sumar_meses(actual, adelante))
+
+    archivadas = []
+    if retencion:
+        limite = sumar_meses(actual, -retencion)
+        for periodo in particiones(connection):
+            if periodo < limite:
+                archivar_particion(connection, periodo, settings.ASIENTOS_ESQUEMA_ARCHIVO)
+                archivadas.append(periodo)
+
+    return {"creadas": creadas, "archivadas": archivadas}
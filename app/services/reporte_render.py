@@ -0,0 +1,171 @@
+"""
+KONTAX - Render Reportes: PDF / XLSX en streaming con memoria acotada
+"""
+from sqlalchemy.orm import Session
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+import logging
+
+try:
+    from openpyxl import Workbook
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+from app.core.pdf import PdfStream
+from app.core.sharding import datos_entidad
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.reporte import Reporte as ReporteModel
+from app.services.reporte_service import expandir_periodo
+
+logger = logging.getLogger(__name__)
+
+
+FORMATOS = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Filas traídas por vuelta del cursor
+LOTE_LINEAS = 2000
+
+# A4 apaisado, en puntos
+PAGINA_PDF = (841.89, 595.28)
+
+COLUMNAS_LIBRO = [
+    ("Fecha", AsientoModel.fecha),
+    ("Tipo", AsientoModel.tipo),
+    ("Categoría", AsientoModel.categoria),
+    ("Descripción", AsientoModel.descripcion),
+    ("Cantidad", AsientoModel.cantidad_fisica),
+    ("Unidad", AsientoModel.unidad_fisica),
+    ("tCO2e", AsientoModel.emisiones_tco2e),
+    ("Alcance", AsientoModel.alcance_gei),
+    ("Cuenta debe", AsientoModel.debe_cuenta),
+    ("Monto debe", AsientoModel.debe_monto),
+    ("Cuenta haber", AsientoModel.haber_cuenta),
+    ("Monto haber", AsientoModel.haber_monto),
+]
+
+
+def objeto_key(reporte: ReporteModel, formato: str) -> str:
+    """Key del archivo renderizado en el bucket de reportes"""
+    return f"{reporte.entity_id}/{reporte.periodo}/{reporte.id}.{formato}"
+
+
+def _aplanar(data: Dict[str, Any], prefijo: str = "") -> List[Tuple[str, Any]]:
+    """Aplanar data_json a pares (clave.anidada, valor) para la portada"""
+    filas = []
+    for key, value in data.items():
+        nombre = f"{prefijo}{key}"
+        if isinstance(value, dict):
+            filas.extend(_aplanar(value, f"{nombre}."))
+        else:
+            filas.append((nombre, value))
+    return filas
+
+
+class ReporteRenderService:
+    """Render de reportes a PDF/XLSX leyendo el libro de asientos por lotes"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lineas_libro(self, reporte: ReporteModel) -> Iterator[tuple]:
+        """
+        Libro de asientos del reporte, solo columnas necesarias
+
+        Cursor del servidor (yield_per): en memoria vive un lote, no el año.
+        """
+        with datos_entidad(self.db, reporte.entity_id) as db:
+            query = (
+                db.query(*[col for _, col in COLUMNAS_LIBRO])
+                .filter(
+                    AsientoModel.entity_id == reporte.entity_id,
+                    AsientoModel.periodo.in_(expandir_periodo(reporte.periodo)),
+                    AsientoModel.estado == "validado",
+                )
+                .order_by(AsientoModel.fecha, AsientoModel.id)
+                .execution_options(stream_results=True)
+                .yield_per(LOTE_LINEAS)
+            )
+            for row in query:
+                yield tuple(row)
+
+    def render(self, reporte: ReporteModel, formato: str, out: BinaryIO) -> None:
+        """Renderizar reporte en el formato pedido sobre out"""
+        if formato == "pdf":
+            self.render_pdf(reporte, out)
+        elif formato == "xlsx":
+            self.render_xlsx(reporte, out)
+        else:
+            raise ValueError(f"Formato inválido '{formato}'. Válidos: {list(FORMATOS)}")
+
+    def render_xlsx(self, reporte: ReporteModel, out: BinaryIO) -> None:
+        """
+        XLSX en modo write-only: las filas se escriben a disco a medida
+        que llegan, sin mantener el libro en memoria.
+        """
+        if not HAS_OPENPYXL:
+            raise RuntimeError("Render XLSX requiere openpyxl")
+
+        wb = Workbook(write_only=True)
+
+        resumen = wb.create_sheet("Resumen")
+        resumen.append(["Reporte", reporte.tipo])
+        resumen.append(["Período", reporte.periodo])
+        for key, value in _aplanar(reporte.data_json or {}):
+            resumen.append([key, value])
+
+        libro = wb.create_sheet("Libro asientos")
+        libro.append([nombre for nombre, _ in COLUMNAS_LIBRO])
+        for linea in self.lineas_libro(reporte):
+            libro.append(list(linea))
+
+        wb.save(out)
+
+    def render_pdf(self, reporte: ReporteModel, out: BinaryIO) -> None:
+        """
+        PDF página a página: cada página se comprime y escribe en out al
+        cerrarse (PdfStream), las filas vienen del cursor por lotes. En
+        memoria vive un lote de filas y una página, no el documento.
+        """
+        ancho, alto = PAGINA_PDF
+        margen = 30
+        alto_linea = 11
+        pdf = PdfStream(out, PAGINA_PDF, titulo=f"KONTAX {reporte.tipo} {reporte.periodo}")
+
+        # Portada con resumen
+        y = alto - margen
+        pdf.set_fuente("Helvetica-Bold", 14)
+        pdf.texto(margen, y, f"KONTAX - {reporte.tipo} - {reporte.periodo}")
+        y -= 2 * alto_linea
+        pdf.set_fuente("Helvetica", 9)
+        for key, value in _aplanar(reporte.data_json or {}):
+            if y < margen:
+                pdf.nueva_pagina()
+                y = alto - margen
+            pdf.texto(margen, y, f"{key}: {value}")
+            y -= alto_linea
+        pdf.nueva_pagina()
+
+        # Libro de asientos
+        columnas_x = [margen + i * (ancho - 2 * margen) / len(COLUMNAS_LIBRO) for i in range(len(COLUMNAS_LIBRO))]
+        max_chars = int((ancho - 2 * margen) / len(COLUMNAS_LIBRO) / 4)
+
+        def encabezado() -> float:
+            pdf.set_fuente("Helvetica-Bold", 7)
+            for x, (nombre, _) in zip(columnas_x, COLUMNAS_LIBRO):
+                pdf.texto(x, alto - margen, nombre)
+            pdf.set_fuente("Helvetica", 7)
+            return alto - margen - alto_linea
+
+        y = encabezado()
+        for linea in self.lineas_libro(reporte):
+            if y < margen:
+                pdf.nueva_pagina()
+                y = encabezado()
+            for x, value in zip(columnas_x, linea):
+                pdf.texto(x, y, "" if value is None else str(value)[:max_chars])
+            y -= alto_linea
+
+        pdf.cerrar()
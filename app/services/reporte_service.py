@@ -0,0 +1,479 @@
+"""
+KONTAX - Reporte Service: agregación SQL de asientos verdes para reportes
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import UUID
+import hashlib
+import json
+import logging
+import re
+
+import redis
+
+from app.config import settings
+from app.core.redis import get_redis
+from app.core.sharding import datos_entidad, fan_out_entidades
+from app.models.asiento_rollup import AsientoRollup, AsientoRollupVersion
+from app.models.entity import Entity as EntityModel
+from app.models.reporte import Reporte as ReporteModel
+from app.models.reporte_cache import ReporteCache
+
+logger = logging.getLogger(__name__)
+
+
+# Key Redis del job en curso por fingerprint
+SINGLEFLIGHT_KEY = "kontax:reportes:inflight:{fingerprint}"
+
+# Borrar la key solo si sigue apuntando a nuestro reporte
+_LIBERAR_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Prefijos plan de cuentas verde
+CUENTA_ACTIVOS_AMBIENTALES = "1595"
+CUENTA_PASIVOS_AMBIENTALES = "2630"
+CUENTA_COSTOS_AMBIENTALES = "5190"
+
+
+def _sum_if(condicion, columna):
+    """SUM condicional (0 si no hay filas)"""
+    return func.coalesce(func.sum(case((condicion, columna), else_=0)), 0)
+
+
+def agregados_columns() -> list:
+    """
+    Columnas agregadas usadas por todos los builders de reportes.
+
+    Suman filas de asientos_rollup (ya agrupadas por mes, alcance y
+    prefijo de cuentas): el reporte completo sale de una fila sin leer
+    asientos_verdes.
+    """
+    r = AsientoRollup
+    return [
+        func.coalesce(func.sum(r.asientos), 0).label("asientos"),
+        func.coalesce(func.sum(r.emisiones_tco2e), 0).label("emisiones_tco2e"),
+        _sum_if(r.alcance_gei == 1, r.emisiones_tco2e).label("alcance_1_tco2e"),
+        _sum_if(r.alcance_gei == 2, r.emisiones_tco2e).label("alcance_2_tco2e"),
+        _sum_if(r.alcance_gei == 3, r.emisiones_tco2e).label("alcance_3_tco2e"),
+        _sum_if(r.cuenta_debe == CUENTA_ACTIVOS_AMBIENTALES, r.debe_monto).label("activos_clp"),
+        _sum_if(r.cuenta_haber == CUENTA_PASIVOS_AMBIENTALES, r.haber_monto).label("pasivos_clp"),
+        _sum_if(r.cuenta_debe == CUENTA_COSTOS_AMBIENTALES, r.debe_monto).label("costos_clp"),
+        func.coalesce(func.sum(r.energia_kwh), 0).label("energia_kwh"),
+    ]
+
+
+AGREGADOS_KEYS = [
+    "asientos",
+    "emisiones_tco2e",
+    "alcance_1_tco2e",
+    "alcance_2_tco2e",
+    "alcance_3_tco2e",
+    "activos_clp",
+    "pasivos_clp",
+    "costos_clp",
+    "energia_kwh",
+]
+
+
+def row_to_agregados(row) -> Dict[str, float]:
+    """Convertir fila agregada SQL a dict de cifras"""
+    agg = {key: float(getattr(row, key, 0) or 0) for key in AGREGADOS_KEYS}
+    agg["asientos"] = int(agg["asientos"])
+    return agg
+
+
+def sumar_agregados(partes: List[Dict[str, float]]) -> Dict[str, float]:
+    """Sumar agregados parciales (todas las cifras son aditivas)"""
+    total = {key: 0.0 for key in AGREGADOS_KEYS}
+    for parte in partes:
+        for key in AGREGADOS_KEYS:
+            total[key] += parte.get(key, 0)
+    total["asientos"] = int(total["asientos"])
+    return total
+
+
+def expandir_periodo(periodo: str) -> List[str]:
+    """
+    Meses YYYY-MM que componen un período
+
+    Formatos: YYYY-MM (mensual), YYYY-Qn (trimestral), YYYY (anual)
+
+    Raises:
+        ValueError: formato de período inválido
+    """
+    if re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", periodo):
+        return [periodo]
+
+    match = re.fullmatch(r"(\d{4})-Q([1-4])", periodo)
+    if match:
+        anio, trimestre = match.group(1), int(match.group(2))
+        return [f"{anio}-{mes:02d}" for mes in range(3 * trimestre - 2, 3 * trimestre + 1)]
+
+    if re.fullmatch(r"\d{4}", periodo):
+        return [f"{periodo}-{mes:02d}" for mes in range(1, 13)]
+
+    raise ValueError(f"Período inválido '{periodo}'. Formatos: YYYY-MM, YYYY-Qn, YYYY")
+
+
+def periodos_comparables(periodo: str) -> List[str]:
+    """
+    Períodos de comparación por defecto: período anterior y mismo período
+    del año anterior (para anual, solo el año anterior).
+    """
+    meses = expandir_periodo(periodo)
+    anio = int(periodo[:4])
+
+    if len(meses) == 12:
+        return [str(anio - 1)]
+
+    if len(meses) == 3:
+        trimestre = int(periodo[-1])
+        anterior = f"{anio - 1}-Q4" if trimestre == 1 else f"{anio}-Q{trimestre - 1}"
+        return [anterior, f"{anio - 1}-Q{trimestre}"]
+
+    mes = int(periodo[5:7])
+    anterior = f"{anio - 1}-12" if mes == 1 else f"{anio}-{mes - 1:02d}"
+    return [anterior, f"{anio - 1}-{mes:02d}"]
+
+
+def _delta(actual: float, anterior: float) -> Dict[str, Optional[float]]:
+    """Variación absoluta y porcentual entre dos cifras"""
+    return {
+        "actual": round(actual, 3),
+        "anterior": round(anterior, 3),
+        "delta": round(actual - anterior, 3),
+        "delta_pct": round((actual - anterior) / anterior * 100, 2) if anterior else None,
+    }
+
+
+class ReporteService:
+    """Servicio de cálculo de reportes sobre asientos verdes"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def agregar_periodo(self, entity_id: UUID, periodo: str) -> Dict[str, float]:
+        """
+        Calcular cifras del período con una sola consulta agregada
+
+        Trimestres y años suman las filas de rollup de sus meses.
+
+        Args:
+            entity_id: ID de la entidad
+            periodo: Período YYYY-MM, YYYY-Qn o YYYY
+
+        Returns:
+            Dict con totales (ver AGREGADOS_KEYS)
+        """
+        with datos_entidad(self.db, entity_id) as db:
+            row = (
+                db.query(*agregados_columns())
+                .filter(
+                    AsientoRollup.entity_id == entity_id,
+                    AsientoRollup.periodo.in_(expandir_periodo(periodo)),
+                    AsientoRollup.estado == "validado",
+                )
+                .one()
+            )
+        return row_to_agregados(row)
+
+    def agregar_portfolio(self, entity_ids: List[UUID], periodo: str) -> List[Dict[str, Any]]:
+        """
+        Agregados de varias entidades: una consulta agrupada por shard
+
+        Los datos de las entidades salen del principal y los rollups de cada
+        shard en paralelo. Entidades sin asientos validados en el período
+        vienen con ceros.
+
+        Returns:
+            Lista de dicts {entity_id, rut, razon_social, sector, **agregados}
+        """
+        entidades = (
+            self.db.query(EntityModel.id, EntityModel.rut, EntityModel.razon_social, EntityModel.sector)
+            .filter(EntityModel.id.in_(entity_ids))
+            .all()
+        )
+
+        def rollups_shard(db: Session, entity_ids: List[UUID]) -> Dict[UUID, Dict[str, float]]:
+            rows = (
+                db.query(AsientoRollup.entity_id, *agregados_columns())
+                .filter(
+                    AsientoRollup.entity_id.in_(entity_ids),
+                    AsientoRollup.periodo.in_(expandir_periodo(periodo)),
+                    AsientoRollup.estado == "validado",
+                )
+                .group_by(AsientoRollup.entity_id)
+            )
+            return {row.entity_id: row_to_agregados(row) for row in rows}
+
+        agregados: Dict[UUID, Dict[str, float]] = {}
+        for parte in fan_out_entidades(rollups_shard, [entity.id for entity in entidades], db=self.db).values():
+            agregados.update(parte)
+
+        return [
+            {
+                "entity_id": str(entity.id),
+                "rut": entity.rut,
+                "razon_social": entity.razon_social,
+                "sector": entity.sector,
+                **agregados.get(entity.id, sumar_agregados([])),
+            }
+            for entity in entidades
+        ]
+
+    def comparar(self, entity_id: UUID, periodo: str, otros: List[str]) -> Dict[str, Any]:
+        """
+        Variaciones de un período contra otros, por categoría, alcance GEI
+        y cuenta (prefijo 4 dígitos debe)
+
+        Una sola consulta agrupada por (mes, categoria, alcance, cuenta) sobre
+        el rollup de todos los meses involucrados; los períodos se arman
+        sumando meses.
+
+        Returns:
+            Dict con totales y desgloses por cada período comparado
+        """
+        meses_por_periodo = {p: expandir_periodo(p) for p in [periodo, *otros]}
+        todos_meses = sorted({m for meses in meses_por_periodo.values() for m in meses})
+        r = AsientoRollup
+        # Rollup guarda 0 / "" para sin alcance / sin cuenta
+        alcance = func.nullif(r.alcance_gei, 0)
+        cuenta = func.nullif(r.cuenta_debe, "")
+
+        with datos_entidad(self.db, entity_id) as db:
+            rows = (
+                db.query(
+                    r.periodo,
+                    r.categoria,
+                    alcance.label("alcance_gei"),
+                    cuenta.label("cuenta"),
+                    func.sum(r.asientos).label("asientos"),
+                    func.coalesce(func.sum(r.emisiones_tco2e), 0).label("emisiones_tco2e"),
+                    func.coalesce(func.sum(r.debe_monto), 0).label("monto_clp"),
+                )
+                .filter(
+                    r.entity_id == entity_id,
+                    r.periodo.in_(todos_meses),
+                    r.estado == "validado",
+                )
+                .group_by(r.periodo, r.categoria, alcance, cuenta)
+                .all()
+            )
+
+        medidas = ("asientos", "emisiones_tco2e", "monto_clp")
+        dimensiones = {"total": None, "categoria": "categoria", "alcance_gei": "alcance_gei", "cuenta": "cuenta"}
+
+        # {periodo: {dimension: {valor: {medida: suma}}}}
+        sumas = {
+            p: {dim: {} for dim in dimensiones}
+            for p in meses_por_periodo
+        }
+        for row in rows:
+            for p, meses in meses_por_periodo.items():
+                if row.periodo not in meses:
+                    continue
+                for dim, attr in dimensiones.items():
+                    valor = getattr(row, attr) if attr else "total"
+                    acc = sumas[p][dim].setdefault(valor, dict.fromkeys(medidas, 0.0))
+                    for medida in medidas:
+                        acc[medida] += float(getattr(row, medida) or 0)
+
+        vacio = dict.fromkeys(medidas, 0.0)
+
+        def comparar_dim(dim: str, otro: str) -> List[Dict[str, Any]]:
+            actual, anterior = sumas[periodo][dim], sumas[otro][dim]
+            return [
+                {
+                    dim: valor,
+                    **{
+                        medida: _delta(actual.get(valor, vacio)[medida], anterior.get(valor, vacio)[medida])
+                        for medida in medidas
+                    },
+                }
+                for valor in sorted(set(actual) | set(anterior), key=lambda v: (v is None, str(v)))
+            ]
+
+        return {
+            "entity_id": str(entity_id),
+            "periodo": periodo,
+            "comparaciones": [
+                {
+                    "periodo": otro,
+                    "totales": {
+                        medida: _delta(
+                            sumas[periodo]["total"].get("total", vacio)[medida],
+                            sumas[otro]["total"].get("total", vacio)[medida],
+                        )
+                        for medida in medidas
+                    },
+                    "por_categoria": comparar_dim("categoria", otro),
+                    "por_alcance_gei": comparar_dim("alcance_gei", otro),
+                    "por_cuenta": comparar_dim("cuenta", otro),
+                }
+                for otro in otros
+            ],
+        }
+
+    def generar(self, entity_id: UUID, periodo: str, tipo: str) -> Dict[str, Any]:
+        """Calcular data_json del reporte para entidad/período/tipo"""
+        return build_report(tipo, self.agregar_periodo(entity_id, periodo))
+
+    def fingerprint(
+        self,
+        entity_id: UUID,
+        periodo: str,
+        tipo: str,
+        parametros: Optional[dict] = None,
+    ) -> Tuple[str, int]:
+        """
+        Fingerprint de las entradas de un reporte
+
+        La versión de datos son las filas de asientos_rollup_versiones de
+        los meses del período (una por mes: asientos, versión, último
+        cambio) más la versión del catálogo de factores MMA: cualquier alta,
+        edición o cambio de estado de un asiento cambia el fingerprint.
+
+        Returns:
+            (sha256 hex, cantidad de asientos del período)
+        """
+        v = AsientoRollupVersion
+        with datos_entidad(self.db, entity_id) as db:
+            meses = (
+                db.query(v.periodo, v.asientos, v.version, v.updated_at)
+                .filter(
+                    v.entity_id == entity_id,
+                    v.periodo.in_(expandir_periodo(periodo)),
+                )
+                .order_by(v.periodo)
+                .all()
+            )
+        payload = {
+            "entity_id": str(entity_id),
+            "periodo": periodo,
+            "tipo": tipo,
+            "parametros": parametros or {},
+            "meses": [
+                [mes.periodo, mes.asientos, mes.version, mes.updated_at.isoformat() if mes.updated_at else None]
+                for mes in meses
+            ],
+            "factores": settings.MMA_FACTORES_VERSION,
+        }
+        raw = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest(), sum(mes.asientos for mes in meses)
+
+    def buscar_cache(self, fingerprint: str) -> Optional[ReporteModel]:
+        """Reporte completo más reciente generado con el mismo fingerprint"""
+        return (
+            self.db.query(ReporteModel)
+            .join(ReporteCache, ReporteCache.reporte_id == ReporteModel.id)
+            .filter(
+                ReporteCache.fingerprint == fingerprint,
+                ReporteModel.estado == "completo",
+            )
+            .order_by(ReporteModel.completado_at.desc())
+            .first()
+        )
+
+    def adquirir_generacion(self, fingerprint: str, reporte_id: UUID) -> str:
+        """
+        Registrar reporte_id como el job en curso para el fingerprint
+
+        SET NX en Redis, compartido entre procesos API: el primero gana y los
+        demás reciben su reporte_id para adjuntarse al mismo job. Si Redis no
+        está disponible se degrada a generar sin deduplicar.
+
+        Returns:
+            reporte_id del job dueño del fingerprint
+        """
+        key = SINGLEFLIGHT_KEY.format(fingerprint=fingerprint)
+        try:
+            r = get_redis()
+            if r.set(key, str(reporte_id), nx=True, ex=settings.REPORTES_SINGLEFLIGHT_TTL):
+                return str(reporte_id)
+            return r.get(key) or str(reporte_id)
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight reportes sin Redis: {e}")
+            return str(reporte_id)
+
+    def liberar_generacion(self, reporte_id: UUID) -> None:
+        """Liberar la key single-flight al terminar (completo o error)"""
+        cache = self.db.query(ReporteCache).filter(ReporteCache.reporte_id == reporte_id).first()
+        if not cache:
+            return
+        key = SINGLEFLIGHT_KEY.format(fingerprint=cache.fingerprint)
+        try:
+            get_redis().eval(_LIBERAR_SCRIPT, 1, key, str(reporte_id))
+        except redis.RedisError as e:
+            logger.warning(f"No se pudo liberar single-flight {key}: {e}")
+
+
+def build_report(tipo: str, agg: Dict[str, float]) -> Dict[str, Any]:
+    """Construir data_json según tipo a partir de los agregados"""
+    if tipo == "huella_carbono":
+        return _build_huella_carbono(agg)
+    elif tipo == "balance_ambiental":
+        return _build_balance_ambiental(agg)
+    elif tipo == "esg":
+        return _build_esg(agg)
+    return _build_generic(agg, tipo)
+
+
+def _build_huella_carbono(agg: Dict[str, float]) -> dict:
+    """Construir reporte Huella de Carbono GHG Protocol"""
+    alcance1 = agg["alcance_1_tco2e"]
+    alcance2 = agg["alcance_2_tco2e"]
+    alcance3 = agg["alcance_3_tco2e"]
+
+    return {
+        "estandar": "GHG Protocol Corporate Standard",
+        "alcance_1": {"total_tco2e": round(alcance1, 3), "fuentes": "Combustión directa, vehículos propios"},
+        "alcance_2": {"total_tco2e": round(alcance2, 3), "fuentes": "Electricidad comprada"},
+        "alcance_3": {"total_tco2e": round(alcance3, 3), "fuentes": "Transporte terceros, residuos, cadena valor"},
+        "total_tco2e": round(alcance1 + alcance2 + alcance3, 3),
+        "asientos_procesados": agg["asientos"],
+    }
+
+
+def _build_balance_ambiental(agg: Dict[str, float]) -> dict:
+    """Construir Balance Ambiental KONTAX"""
+    activos = agg["activos_clp"]
+    pasivos = agg["pasivos_clp"]
+    costos = agg["costos_clp"]
+
+    return {
+        "activos_ambientales_clp": round(activos, 2),
+        "pasivos_ambientales_clp": round(pasivos, 2),
+        "costos_ambientales_clp": round(costos, 2),
+        "patrimonio_ambiental_neto_clp": round(activos - pasivos, 2),
+        "asientos_procesados": agg["asientos"],
+    }
+
+
+def _build_esg(agg: Dict[str, float]) -> dict:
+    """Construir reporte ESG básico"""
+    return {
+        "estandar": "GRI / SASB",
+        "ambiental": {
+            "emisiones_totales_tco2e": round(agg["emisiones_tco2e"], 3),
+            "consumo_energia_kwh": round(agg["energia_kwh"], 2),
+        },
+        "social": {"nota": "Requiere datos adicionales no contables"},
+        "gobernanza": {"nota": "Requiere datos adicionales corporativos"},
+        "asientos_procesados": agg["asientos"],
+    }
+
+
+def _build_generic(agg: Dict[str, float], tipo: str) -> dict:
+    """Reporte genérico para tipos aún no implementados completamente"""
+    return {
+        "tipo": tipo,
+        "asientos_procesados": agg["asientos"],
+        "total_emisiones_tco2e": round(agg["emisiones_tco2e"], 3),
+        "estado": "generado_basico",
+        "nota": f"Reporte {tipo} generado con datos básicos de asientos verdes",
+    }
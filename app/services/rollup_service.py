@@ -0,0 +1,408 @@
+"""
+KONTAX - Rollup Service: sumas de asientos mantenidas por transacción
+"""
+from sqlalchemy import event, func, case, select, delete, inspect, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from app.models.asiento_rollup import AsientoRollup, AsientoRollupVersion
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+
+
+DIMENSIONES = ["entity_id", "periodo", "estado", "categoria", "alcance_gei", "cuenta_debe", "cuenta_haber"]
+MEDIDAS = ["asientos", "emisiones_tco2e", "consumo_agua_m3", "residuos_kg", "debe_monto", "haber_monto", "energia_kwh"]
+
+# session.info: valores previos de asientos editados/borrados en el flush en curso
+PREVIOS_KEY = "asientos_previos"
+
+
+def rollup_columns(asientos=None) -> list:
+    """
+    Dimensiones y medidas del rollup calculadas desde asientos_verdes
+
+    asientos: otra fuente con las columnas de asientos_verdes (p. ej. la
+    staging de importación); por defecto la tabla.
+    """
+    a = (AsientoModel.__table__ if asientos is None else asientos).c
+    return [
+        a.entity_id,
+        a.periodo,
+        func.coalesce(a.estado, "").label("estado"),
+        a.categoria,
+        func.coalesce(a.alcance_gei, 0).label("alcance_gei"),
+        func.coalesce(func.substr(a.debe_cuenta, 1, 4), "").label("cuenta_debe"),
+        func.coalesce(func.substr(a.haber_cuenta, 1, 4), "").label("cuenta_haber"),
+        func.count().label("asientos"),
+        func.coalesce(func.sum(a.emisiones_tco2e), 0).label("emisiones_tco2e"),
+        func.coalesce(func.sum(a.consumo_agua_m3), 0).label("consumo_agua_m3"),
+        func.coalesce(func.sum(a.residuos_kg), 0).label("residuos_kg"),
+        func.coalesce(func.sum(a.debe_monto), 0).label("debe_monto"),
+        func.coalesce(func.sum(a.haber_monto), 0).label("haber_monto"),
+        func.coalesce(
+            func.sum(case((a.tipo.contains("energia"), a.cantidad_fisica), else_=0)), 0
+        ).label("energia_kwh"),
+    ]
+
+
+# Columnas de asientos_verdes de las que dependen rollup y green score
+ATRIBUTOS = [
+    "entity_id", "periodo", "estado", "categoria", "subcategoria", "tipo", "alcance_gei",
+    "debe_cuenta", "haber_cuenta", "debe_monto", "haber_monto", "cantidad_fisica",
+    "emisiones_tco2e", "consumo_agua_m3", "residuos_kg", "taxonomia_clasificacion",
+]
+
+# (signo, valores del asiento): +1 el asiento aporta, -1 deja de aportar
+Cambio = Tuple[int, Dict[str, Any]]
+
+
+def recalcular_rollup(connection, entity_id: UUID, periodo: str) -> None:
+    """
+    Reemplazar las filas de rollup de (entity_id, periodo)
+
+    Corre en la transacción que modificó los asientos. El advisory lock
+    serializa transacciones concurrentes sobre el mismo mes: la segunda
+    espera el commit de la primera y recalcula viendo sus asientos.
+    Recorre el mes completo (reparaciones); las escrituras aplican
+    deltas (aplicar_rollup, sumar_rollup).
+    """
+    tabla = AsientoRollup.__table__
+    bloquear_mes(connection, entity_id, periodo)
+    connection.execute(
+        delete(tabla).where(
+            tabla.c.entity_id == entity_id,
+            tabla.c.periodo == periodo,
+        )
+    )
+    columnas = rollup_columns()
+    agrupado = (
+        select(*columnas)
+        .where(
+            AsientoModel.entity_id == entity_id,
+            AsientoModel.periodo == periodo,
+        )
+        .group_by(*columnas[:len(DIMENSIONES)])
+    )
+    connection.execute(tabla.insert().from_select(DIMENSIONES + MEDIDAS, agrupado))
+
+    versiones = AsientoRollupVersion.__table__
+    asientos = (
+        select(func.coalesce(func.sum(tabla.c.asientos), 0))
+        .where(tabla.c.entity_id == entity_id, tabla.c.periodo == periodo)
+        .scalar_subquery()
+    )
+    stmt = pg_insert(versiones).values(
+        entity_id=entity_id, periodo=periodo, asientos=asientos, version=1, updated_at=datetime.utcnow()
+    )
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["entity_id", "periodo"],
+            set_={
+                "asientos": stmt.excluded.asientos,
+                "version": versiones.c.version + 1,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+def bloquear_mes(connection, entity_id: UUID, periodo: str) -> None:
+    """Advisory lock de transacción sobre el rollup de (entity_id, periodo)"""
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:clave))"),
+        {"clave": f"rollup:{entity_id}:{periodo}"},
+    )
+
+
+def valores_asiento(obj: AsientoModel) -> Dict[str, Any]:
+    return {k: getattr(obj, k) for k in ATRIBUTOS}
+
+
+def cuenta(codigo: Optional[str]) -> str:
+    """Prefijo 4 dígitos de una cuenta ("" = sin cuenta)"""
+    return (codigo or "")[:4]
+
+
+def sumar_deltas(
+    cambios: List[Cambio],
+    clave: Callable[[Dict[str, Any]], Optional[tuple]],
+    medidas: Callable[[Dict[str, Any]], Dict[str, float]],
+) -> Dict[tuple, Dict[str, float]]:
+    """
+    Deltas con signo por clave; clave None = el asiento no aporta
+
+    Claves cuyos deltas se anulan (edición que no cambia nada agregado)
+    no aparecen.
+    """
+    deltas: Dict[tuple, Dict[str, float]] = {}
+    for signo, valores in cambios:
+        k = clave(valores)
+        if k is None:
+            continue
+        acumulado = deltas.setdefault(k, {})
+        for medida, valor in medidas(valores).items():
+            acumulado[medida] = acumulado.get(medida, 0) + signo * valor
+    return {k: d for k, d in deltas.items() if any(d.values())}
+
+
+def clave_rollup(v: Dict[str, Any]) -> tuple:
+    return (
+        v["entity_id"], v["periodo"], v["estado"] or "", v["categoria"],
+        v["alcance_gei"] or 0, cuenta(v["debe_cuenta"]), cuenta(v["haber_cuenta"]),
+    )
+
+
+def medidas_rollup(v: Dict[str, Any]) -> Dict[str, float]:
+    """Aporte de un asiento a MEDIDAS (mismo cálculo que rollup_columns)"""
+    return {
+        "asientos": 1,
+        "emisiones_tco2e": v["emisiones_tco2e"] or 0,
+        "consumo_agua_m3": v["consumo_agua_m3"] or 0,
+        "residuos_kg": v["residuos_kg"] or 0,
+        "debe_monto": v["debe_monto"] or 0,
+        "haber_monto": v["haber_monto"] or 0,
+        "energia_kwh": (v["cantidad_fisica"] or 0) if "energia" in (v["tipo"] or "") else 0,
+    }
+
+
+def sumar_en_tabla(connection, tabla, claves: List[str], deltas: Dict[tuple, Dict[str, float]], **extra) -> None:
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x
+
+    Filas en orden de clave: transacciones concurrentes toman los locks de
+    fila en el mismo orden (sin deadlocks).
+    """
+    if not deltas:
+        return
+    medidas = sorted({m for d in deltas.values() for m in d})
+    filas = [
+        {**dict(zip(claves, k)), **{m: d.get(m, 0) for m in medidas}, **extra}
+        for k, d in sorted(deltas.items(), key=lambda item: tuple(str(x) for x in item[0]))
+    ]
+    stmt = pg_insert(tabla).values(filas)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=claves,
+            set_={**{m: tabla.c[m] + stmt.excluded[m] for m in medidas}, **{k: stmt.excluded[k] for k in extra}},
+        )
+    )
+
+
+def deltas_consulta(connection, query, claves: int) -> Dict[tuple, Dict[str, float]]:
+    """Deltas desde una consulta agrupada: primeras `claves` columnas = clave, el resto medidas"""
+    deltas: Dict[tuple, Dict[str, float]] = {}
+    for row in connection.execute(query):
+        valores = row._mapping
+        medidas = {k: valores[k] for k in list(valores.keys())[claves:]}
+        if any(medidas.values()):
+            deltas[tuple(row[:claves])] = medidas
+    return deltas
+
+
+def deltas_rollup(connection, asientos) -> Dict[tuple, Dict[str, float]]:
+    """Deltas de rollup por alta de todas las filas de una fuente (GROUP BY en la base)"""
+    columnas = rollup_columns(asientos)
+    query = select(*columnas).group_by(*columnas[:len(DIMENSIONES)])
+    return deltas_consulta(connection, query, len(DIMENSIONES))
+
+
+def aplicar_rollup(connection, cambios: List[Cambio]) -> None:
+    """
+    Sumar al rollup los deltas de los asientos cambiados
+
+    Lee solo las filas tocadas, no el mes. Una edición que no cambia
+    nada agregado igual sube la versión de su mes.
+    """
+    meses: Dict[Tuple[UUID, str], int] = {}
+    for signo, valores in cambios:
+        mes = (valores["entity_id"], valores["periodo"])
+        meses[mes] = meses.get(mes, 0) + signo
+    sumar_rollup(connection, sumar_deltas(cambios, clave_rollup, medidas_rollup), meses)
+
+
+def sumar_rollup(
+    connection,
+    deltas: Dict[tuple, Dict[str, float]],
+    meses: Optional[Dict[Tuple[UUID, str], int]] = None,
+) -> None:
+    """
+    Sumar deltas por clave de rollup (DIMENSIONES)
+
+    meses: cambio en la cantidad de asientos de cada (entidad, período)
+    tocado (por defecto, desde los deltas); cada uno sube su versión.
+    Toma el lock de cada mes (el mismo de recalcular_rollup) y borra las
+    filas que quedan sin asientos.
+    """
+    if meses is None:
+        meses = {}
+        for k, d in deltas.items():
+            meses[(k[0], k[1])] = meses.get((k[0], k[1]), 0) + d.get("asientos", 0)
+    if not meses:
+        return
+    tabla = AsientoRollup.__table__
+    for entity_id, periodo in sorted(meses, key=lambda t: (str(t[0]), t[1])):
+        bloquear_mes(connection, entity_id, periodo)
+    sumar_en_tabla(connection, tabla, DIMENSIONES, deltas)
+    sumar_en_tabla(
+        connection,
+        AsientoRollupVersion.__table__,
+        ["entity_id", "periodo"],
+        {mes: {"asientos": n, "version": 1} for mes, n in meses.items()},
+        updated_at=datetime.utcnow(),
+    )
+    connection.execute(
+        delete(tabla).where(
+            tuple_(tabla.c.entity_id, tabla.c.periodo).in_(list(meses)),
+            tabla.c.asientos <= 0,
+        )
+    )
+
+
+def asientos_cambiados(session: Session) -> List[Cambio]:
+    """
+    Cambios del flush en curso (desde after_flush)
+
+    Nuevos: +valores actuales. Borrados: -valores previos. Editados:
+    -previos +actuales. Los previos se leen de la base en before_flush.
+    """
+    previos = session.info.get(PREVIOS_KEY, {})
+    cambios: List[Cambio] = []
+    for obj in session.new:
+        if isinstance(obj, AsientoModel):
+            cambios.append((1, valores_asiento(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, AsientoModel) and obj.id in previos:
+            cambios.append((-1, previos[obj.id]))
+            cambios.append((1, valores_asiento(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, AsientoModel) and obj.id in previos:
+            cambios.append((-1, previos[obj.id]))
+    return cambios
+
+
+def actualizar_rollup(connection, tocados: Set[Tuple[UUID, str]]) -> None:
+    """Recalcular rollup de varios (entidad, período), en orden fijo (sin deadlocks)"""
+    for entity_id, periodo in sorted(tocados, key=lambda t: (str(t[0]), t[1])):
+        recalcular_rollup(connection, entity_id, periodo)
+
+
+@event.listens_for(Session, "before_flush")
+def _leer_previos(session: Session, flush_context, instances) -> None:
+    """
+    Valores en la base de los asientos a editar o borrar
+
+    Una consulta por flush, solo si hay asientos persistentes modificados
+    (el historial de atributos no trae el valor previo de atributos que no
+    estaban cargados).
+    """
+    ids = [
+        obj.id
+        for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, AsientoModel)
+        and inspect(obj).persistent
+        and (obj in session.deleted or session.is_modified(obj))
+    ]
+    if not ids:
+        session.info.pop(PREVIOS_KEY, None)
+        return
+    tabla = AsientoModel.__table__
+    rows = session.connection().execute(
+        select(tabla.c.id, *[tabla.c[k] for k in ATRIBUTOS]).where(tabla.c.id.in_(ids))
+    )
+    session.info[PREVIOS_KEY] = {row.id: {k: row._mapping[k] for k in ATRIBUTOS} for row in rows}
+
+
+@event.listens_for(Session, "after_flush")
+def _actualizar_rollup(session: Session, flush_context) -> None:
+    """Sumar al rollup los deltas de los asientos del flush"""
+    cambios = asientos_cambiados(session)
+    if cambios:
+        aplicar_rollup(session.connection(), cambios)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _limpiar_previos(session: Session, flush_context) -> None:
+    session.info.pop(PREVIOS_KEY, None)
+
+
+class RollupService:
+    """Lecturas agregadas desde asientos_rollup"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def stats(self, entity_id: UUID, periodo: str, estado: str = "confirmado") -> Dict[str, Any]:
+        """
+        Totales, desglose por categoría y por alcance GEI en una consulta
+
+        GROUPING SETS ((), categoria, alcance_gei) sobre las filas del mes:
+        la fila con ambas dimensiones agrupadas es el total.
+        """
+        r = AsientoRollup
+        rows = (
+            self.db.query(
+                r.categoria,
+                r.alcance_gei,
+                func.grouping(r.categoria).label("sin_categoria"),
+                func.grouping(r.alcance_gei).label("sin_alcance"),
+                *[func.coalesce(func.sum(getattr(r, m)), 0).label(m) for m in MEDIDAS],
+            )
+            .filter(
+                r.entity_id == entity_id,
+                r.periodo == periodo,
+                r.estado == estado,
+            )
+            .group_by(func.grouping_sets(text("()"), r.categoria, r.alcance_gei))
+            .all()
+        )
+
+        totales = next((row for row in rows if row.sin_categoria and row.sin_alcance), None)
+        return {
+            "periodo": periodo,
+            "totales": {
+                "asientos": int(totales.asientos) if totales else 0,
+                "emisiones_tco2e": float(totales.emisiones_tco2e) if totales else 0.0,
+                "agua_m3": float(totales.consumo_agua_m3) if totales else 0.0,
+                "residuos_kg": float(totales.residuos_kg) if totales else 0.0,
+                "pasivos_clp": float(totales.debe_monto) if totales else 0.0,
+                "activos_clp": float(totales.haber_monto) if totales else 0.0,
+            },
+            "por_categoria": [
+                {
+                    "categoria": row.categoria,
+                    "asientos": int(row.asientos),
+                    "emisiones_tco2e": float(row.emisiones_tco2e),
+                }
+                for row in rows
+                if not row.sin_categoria
+            ],
+            "por_alcance_gei": [
+                {
+                    "alcance": row.alcance_gei,
+                    "emisiones_tco2e": float(row.emisiones_tco2e),
+                }
+                for row in rows
+                if not row.sin_alcance and row.alcance_gei
+            ],
+        }
+
+    def contar(
+        self,
+        entity_id: UUID,
+        estado: str,
+        periodo: Optional[str] = None,
+        categoria: Optional[str] = None,
+    ) -> int:
+        """Cantidad de asientos (total de listados paginados) sin COUNT sobre asientos"""
+        r = AsientoRollup
+        query = self.db.query(func.coalesce(func.sum(r.asientos), 0)).filter(
+            r.entity_id == entity_id,
+            r.estado == estado,
+        )
+        if periodo:
+            query = query.filter(r.periodo == periodo)
+        if categoria:
+            query = query.filter(r.categoria == categoria)
+        return int(query.scalar())
@@ -0,0 +1,319 @@
+"""
+KONTAX - Shard Service: ubicación de entidades y migración online entre shards
+"""
+from sqlalchemy import delete, func, inspect, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+import logging
+
+from app.config import settings
+from app.core.sharding import SHARD_PRINCIPAL, ShardSessions, invalidar, shard_de, shard_engines
+from app.models.asiento_rollup import AsientoRollup, AsientoRollupVersion
+from app.models.asiento_verde import AsientoVerde as AsientoModel
+from app.models.entity import Entity as EntityModel
+from app.models.entity_shard import EntityShard
+from app.models.evidence import Evidence
+from app.models.green_score import GreenScoreComponentes, GreenScoreSegmento
+from app.models.importacion_asientos import ImportacionAsientos
+
+logger = logging.getLogger(__name__)
+
+
+# Tablas con datos de la entidad, en orden de FK (se copian en este orden,
+# se borran en el inverso). entities va primero: en los shards es una copia
+# de la fila del principal que satisface las FK.
+TABLAS_ENTIDAD = [
+    EntityModel.__table__,
+    Evidence.__table__,
+    AsientoModel.__table__,
+    ImportacionAsientos.__table__,
+    GreenScoreComponentes.__table__,
+    GreenScoreSegmento.__table__,
+    AsientoRollup.__table__,
+    AsientoRollupVersion.__table__,
+]
+
+# Tablas derivadas (mantenidas por deltas, no por updated_at): se copian completas en el corte
+TABLAS_DERIVADAS = {
+    GreenScoreComponentes.__table__.name,
+    GreenScoreSegmento.__table__.name,
+    AsientoRollup.__table__.name,
+    AsientoRollupVersion.__table__.name,
+}
+
+# Holgura del delta por updated_at (relojes de procesos distintos)
+MARGEN_DELTA = timedelta(minutes=1)
+
+# Pasadas de delta antes del corte y filas que justifican otra pasada
+MAX_PASADAS_DELTA = 5
+DELTA_SUFICIENTE = 1000
+
+
+def _condicion(tabla, entity_id: UUID):
+    columna = tabla.c.id if tabla.name == EntityModel.__tablename__ else tabla.c.entity_id
+    return columna == entity_id
+
+
+def replicar_entidad(entity: EntityModel) -> None:
+    """Copiar (upsert) la fila de la entidad a su shard si no es el principal"""
+    shard = shard_de(entity.id)
+    if shard == SHARD_PRINCIPAL:
+        return
+    valores = {attr.key: getattr(entity, attr.key) for attr in inspect(EntityModel).column_attrs}
+    with ShardSessions[shard]() as sesion:
+        sesion.merge(EntityModel(**valores))
+        sesion.commit()
+
+
+class ShardService:
+    """Directorio entidad -> shard (sesión sobre la base principal)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def asignar(self, entity: EntityModel, shard: Optional[str] = None) -> str:
+        """
+        Ubicar una entidad nueva (SHARD_NUEVAS_ENTIDADES por defecto)
+
+        En el principal no se crea fila de directorio (sin fila = principal).
+        """
+        shard = shard or settings.SHARD_NUEVAS_ENTIDADES
+        if shard not in ShardSessions:
+            raise ValueError(f"Shard '{shard}' no configurado. Válidos: {list(ShardSessions)}")
+        if shard != SHARD_PRINCIPAL:
+            self.db.add(EntityShard(entity_id=entity.id, shard=shard, estado="activo"))
+            self.db.commit()
+            invalidar(entity.id)
+            replicar_entidad(entity)
+        return shard
+
+    def ubicacion(self, entity_id: UUID) -> Dict[str, Optional[str]]:
+        fila = self.db.get(EntityShard, entity_id)
+        if not fila:
+            return {"entity_id": str(entity_id), "shard": SHARD_PRINCIPAL, "estado": "activo"}
+        return {
+            "entity_id": str(entity_id),
+            "shard": fila.shard,
+            "estado": fila.estado,
+            "destino": fila.destino,
+            "error": fila.error,
+        }
+
+    def iniciar_migracion(self, entity_id: UUID, destino: str) -> EntityShard:
+        """
+        Marcar la entidad como moviendo hacia destino
+
+        Raises:
+            ValueError: destino inválido, igual al actual o migración en curso
+        """
+        if destino not in ShardSessions:
+            raise ValueError(f"Shard '{destino}' no configurado. Válidos: {list(ShardSessions)}")
+        fila = self.db.get(EntityShard, entity_id)
+        if fila is None:
+            fila = EntityShard(entity_id=entity_id, shard=SHARD_PRINCIPAL, estado="activo")
+            self.db.add(fila)
+        if fila.estado != "activo":
+            raise ValueError(f"Migración en curso hacia '{fila.destino}'")
+        if fila.shard == destino:
+            raise ValueError(f"La entidad ya está en '{destino}'")
+        fila.estado = "moviendo"
+        fila.destino = destino
+        fila.error = None
+        self.db.commit()
+        return fila
+
+    def abortar_migracion(self, entity_id: UUID, error: str) -> None:
+        """Volver a activo en el origen (lo copiado al destino se sobrescribe en el próximo intento)"""
+        fila = self.db.get(EntityShard, entity_id)
+        if not fila:
+            return
+        if fila.estado != "activo":
+            fila.estado = "activo"
+            fila.destino = None
+            fila.bloqueado_desde = None
+        fila.error = error[:500]
+        self.db.commit()
+        invalidar(entity_id)
+
+
+class MoverEntidadService:
+    """
+    Migración online de una entidad entre shards, en tres tareas encadenadas
+
+    1. copiar: con estado moviendo (escrituras activas) copia completa
+       (upsert por PK) y pasadas de delta por updated_at hasta que el delta
+       es chico; luego bloqueado, con bloqueado_desde en el directorio
+    2. cortar: cuando pasó esperas_corte() desde bloqueado_desde (todos los
+       procesos ven el bloqueo y terminaron sus escrituras), delta final,
+       tablas derivadas completas, borrado en destino de lo que ya no está
+       en origen y el directorio apunta al destino (activo)
+    3. limpiar_origen: tras otro TTL del directorio se borran los datos
+       del origen
+
+    Las esperas se programan con countdown (sin dormir en el worker) y
+    cada paso verifica contra el directorio que ya se cumplieron, así una
+    tarea reentregada o adelantada no corta antes de tiempo. Las lecturas
+    siguen en el origen hasta el cambio de directorio.
+    """
+
+    def __init__(self, db: Session, entity_id: UUID):
+        self.db = db
+        self.entity_id = entity_id
+        self.fila = db.get(EntityShard, entity_id)
+
+    @property
+    def origen(self) -> Engine:
+        return shard_engines[self.fila.shard]
+
+    @property
+    def destino(self) -> Engine:
+        return shard_engines[self.fila.destino]
+
+    def copiar(self) -> Tuple[Dict[str, int], Optional[datetime]]:
+        """
+        Copia con escrituras activas y bloqueo de la entidad
+
+        Returns:
+            (filas copiadas por tabla, desde del delta final). Si la tarea
+            se reentrega con la entidad ya bloqueada no se copia de nuevo y
+            desde es None: el corte copia todo.
+        """
+        if self.fila.estado == "bloqueado":
+            return {}, None
+        if self.fila.estado != "moviendo":
+            raise ValueError(f"Entidad {self.entity_id} sin migración en curso")
+        logger.info(f"Moviendo entidad {self.entity_id}: {self.fila.shard} -> {self.fila.destino}")
+
+        copiadas: Dict[str, int] = {}
+        desde = datetime.utcnow() - MARGEN_DELTA
+        for tabla in TABLAS_ENTIDAD:
+            if tabla.name not in TABLAS_DERIVADAS:
+                copiadas[tabla.name] = self._copiar(tabla)
+
+        for _ in range(MAX_PASADAS_DELTA):
+            inicio = datetime.utcnow() - MARGEN_DELTA
+            delta = sum(self._copiar(tabla, desde) for tabla in TABLAS_ENTIDAD if tabla.name not in TABLAS_DERIVADAS)
+            desde = inicio
+            if delta < DELTA_SUFICIENTE:
+                break
+
+        self._cambiar_estado(estado="bloqueado", bloqueado_desde=datetime.utcnow())
+        return copiadas, desde
+
+    def espera_corte(self) -> float:
+        """Segundos que faltan para cortar: TTL del directorio + SHARD_MOVER_ESPERA desde el bloqueo"""
+        transcurrido = (datetime.utcnow() - self.fila.bloqueado_desde).total_seconds()
+        return max(settings.SHARD_DIRECTORIO_TTL + settings.SHARD_MOVER_ESPERA - transcurrido, 0.0)
+
+    def cortar(self, desde: Optional[datetime]) -> Dict[str, int]:
+        """
+        Delta final con escrituras bloqueadas y cambio de directorio
+
+        Raises:
+            ValueError: la entidad no está bloqueada o aún no pasó la espera
+        """
+        if self.fila.estado != "bloqueado":
+            raise ValueError(f"Entidad {self.entity_id} no está en corte")
+        if self.espera_corte() > 0:
+            raise ValueError(f"Entidad {self.entity_id}: bloqueo aún no cubre el TTL del directorio")
+
+        copiadas: Dict[str, int] = {}
+        for tabla in TABLAS_ENTIDAD:
+            if tabla.name in TABLAS_DERIVADAS or desde is None:
+                copiadas[tabla.name] = self._copiar(tabla)
+            else:
+                self._copiar(tabla, desde)
+        for tabla in reversed(TABLAS_ENTIDAD):
+            self._reconciliar(tabla)
+
+        self._cambiar_estado(estado="activo", shard=self.fila.destino, destino=None, bloqueado_desde=None)
+        logger.info(f"Entidad {self.entity_id} movida a {self.fila.shard}: {copiadas}")
+        return copiadas
+
+    def espera_limpieza(self) -> float:
+        """Segundos que faltan para que ningún proceso lea del origen con el directorio viejo en caché"""
+        transcurrido = (datetime.utcnow() - self.fila.updated_at).total_seconds()
+        return max(settings.SHARD_DIRECTORIO_TTL - transcurrido, 0.0)
+
+    def limpiar_origen(self, origen: str) -> bool:
+        """
+        Borrar del shard origen los datos de la entidad (la fila entities
+        queda en el principal). No hace nada si la entidad no quedó activa
+        fuera del origen (migración abortada o de vuelta al origen).
+        """
+        if self.fila is None or self.fila.estado != "activo" or self.fila.shard == origen:
+            return False
+        with shard_engines[origen].begin() as connection:
+            for tabla in reversed(TABLAS_ENTIDAD):
+                if tabla.name == EntityModel.__tablename__ and origen == SHARD_PRINCIPAL:
+                    continue
+                connection.execute(delete(tabla).where(_condicion(tabla, self.entity_id)))
+        return True
+
+    def _cambiar_estado(self, **valores) -> None:
+        for campo, valor in valores.items():
+            setattr(self.fila, campo, valor)
+        self.db.commit()
+        invalidar(self.entity_id)
+
+    def _copiar(self, tabla, desde: Optional[datetime] = None) -> int:
+        """Upsert al destino de las filas de la entidad (o las cambiadas desde)"""
+        pk = [col.name for col in tabla.primary_key.columns]
+        query = select(tabla).where(_condicion(tabla, self.entity_id)).order_by(*tabla.primary_key.columns)
+        if desde is not None:
+            query = query.where(tabla.c.updated_at >= desde)
+
+        upsert = pg_insert(tabla)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=pk,
+            set_={col.name: upsert.excluded[col.name] for col in tabla.columns if col.name not in pk},
+        )
+
+        copiadas = 0
+        with self.origen.connect() as src:
+            result = src.execution_options(stream_results=True, yield_per=settings.SHARD_MOVER_LOTE).execute(query)
+            for lote in result.partitions():
+                with self.destino.begin() as dst:
+                    dst.execute(upsert, [dict(row._mapping) for row in lote])
+                copiadas += len(lote)
+        return copiadas
+
+    def _reconciliar(self, tabla) -> None:
+        """
+        Borrar en destino las filas que ya no están en origen
+
+        Tras los upserts el destino contiene al origen: por período (o por
+        tabla si no tiene) basta comparar conteos y solo se cruzan las
+        claves de los grupos que difieren.
+        """
+        condicion = _condicion(tabla, self.entity_id)
+        grupo = tabla.c.periodo if "periodo" in tabla.c else None
+        pk = list(tabla.primary_key.columns)
+
+        def conteos(engine: Engine) -> Dict[Optional[str], int]:
+            columnas = [grupo, func.count()] if grupo is not None else [func.count()]
+            query = select(*columnas).where(condicion)
+            if grupo is not None:
+                query = query.group_by(grupo)
+            with engine.connect() as connection:
+                return {
+                    (row[0] if grupo is not None else None): row[-1]
+                    for row in connection.execute(query)
+                }
+
+        origen, destino = conteos(self.origen), conteos(self.destino)
+        for valor, cantidad in destino.items():
+            if origen.get(valor) == cantidad:
+                continue
+            filtro = [condicion] + ([grupo == valor] if grupo is not None else [])
+            claves = select(*pk).where(*filtro)
+            with self.origen.connect() as src:
+                en_origen = {tuple(row) for row in src.execute(claves)}
+            with self.destino.begin() as dst:
+                sobrantes: List[tuple] = [tuple(row) for row in dst.execute(claves) if tuple(row) not in en_origen]
+                for i in range(0, len(sobrantes), settings.SHARD_MOVER_LOTE):
+                    dst.execute(delete(tabla).where(tuple_(*pk).in_(sobrantes[i:i + settings.SHARD_MOVER_LOTE])))
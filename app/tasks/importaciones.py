@@ -0,0 +1,65 @@
+"""
+KONTAX - Tasks Importaciones: carga masiva de libros de asientos
+"""
+from sqlalchemy.exc import OperationalError
+from minio.error import S3Error
+from typing import Optional
+from uuid import UUID
+import logging
+
+from app.config import settings
+from app.core.sharding import SHARD_PRINCIPAL, ShardBloqueado, ShardSessions, shard_de
+from app.models.importacion_asientos import ImportacionAsientos
+from app.services.importacion_service import ImportacionService
+from app.worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_importacion(job: ImportacionAsientos) -> None:
+    """Encolar (o reanudar) una importación persistida"""
+    importar_asientos.apply_async(args=[str(job.id), str(job.entity_id)], queue="importaciones")
+
+
+@celery_app.task(bind=True, name="asientos.importar", max_retries=settings.REPORTES_MAX_RETRIES)
+def importar_asientos(self, importacion_id: str, entity_id: Optional[str] = None) -> None:
+    """
+    Procesar una importación de libro CSV/Parquet.
+
+    El job y los asientos viven en el shard de la entidad (jobs encolados
+    sin entity_id: shard principal). Errores transitorios (DB, MinIO) se
+    reintentan: el job continúa desde el último lote confirmado. Otros
+    errores dejan el job en estado error, reanudable desde la API.
+    """
+    shard = shard_de(UUID(entity_id)) if entity_id else SHARD_PRINCIPAL
+    db = ShardSessions[shard]()
+    try:
+        job = db.query(ImportacionAsientos).filter(ImportacionAsientos.id == importacion_id).first()
+        if not job or job.estado == "completo":
+            return
+        ImportacionService(db).procesar(job)
+    except ShardBloqueado as e:
+        # Entidad cambiando de shard: continuar en el destino tras el corte
+        db.rollback()
+        raise self.retry(exc=e, countdown=settings.SHARD_MOVER_ESPERA, max_retries=None)
+    except (OperationalError, S3Error) as e:
+        db.rollback()
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Importación {importacion_id}: reintentando ({e})")
+            raise self.retry(exc=e, countdown=2 ** self.request.retries * 10)
+        _marcar_error(db, importacion_id, e)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error en importación {importacion_id}: {e}", exc_info=True)
+        _marcar_error(db, importacion_id, e)
+    finally:
+        db.close()
+
+
+def _marcar_error(db, importacion_id: str, exc: Exception) -> None:
+    """Dejar importación en estado error (conserva el avance confirmado)"""
+    job = db.query(ImportacionAsientos).filter(ImportacionAsientos.id == importacion_id).first()
+    if job:
+        job.estado = "error"
+        job.error = str(exc)[:500]
+        db.commit()
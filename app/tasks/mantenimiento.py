@@ -0,0 +1,174 @@
+"""
+KONTAX - Tasks Mantenimiento: tareas periódicas de base de datos (celery beat)
+"""
+from celery.exceptions import Retry
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+import logging
+
+from redis.exceptions import LockError
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.core.sharding import agrupar_por_shard, sesion_shard, shard_engines
+from app.models.entity import Entity as EntityModel
+from app.services.analitica_service import LOCK_ESPEJO, LOCK_ESPEJO_TTL, EspejoAnaliticoService
+from app.services.green_score_service import backfill_componentes, entidades_sin_componentes
+from app.services.particiones_service import mantener_particiones
+from app.services.shard_service import MoverEntidadService, ShardService
+from app.worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="mantenimiento.particiones")
+def mantener_particiones_asientos() -> dict:
+    """
+    Crear particiones de asientos_verdes para los próximos meses y archivar
+    las que superan ASIENTOS_RETENCION_MESES, en cada shard.
+    """
+    resultados = {}
+    for shard, shard_engine in shard_engines.items():
+        # DDL de particiones (DETACH CONCURRENTLY) fuera de transacción
+        with shard_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            resultados[shard] = mantener_particiones(connection)
+        logger.info(f"Particiones asientos_verdes [{shard}]: {resultados[shard]}")
+
+    return resultados
+
+
+@celery_app.task(name="green_score.backfill")
+def backfill_green_score() -> dict:
+    """
+    Calcular componentes del green score de las entidades que aún no los
+    tienen (asientos previos al mantenimiento incremental), en su shard.
+    Una transacción por entidad; sin pendientes es una lectura por shard.
+    """
+    db = SessionLocal()
+    try:
+        entity_ids = [row.id for row in db.query(EntityModel.id)]
+        calculadas = {}
+        for shard, ids in agrupar_por_shard(entity_ids).items():
+            with sesion_shard(db, shard) as sesion:
+                pendientes = entidades_sin_componentes(sesion.connection(), ids)
+                sesion.rollback()
+                for entity_id in pendientes:
+                    backfill_componentes(sesion.connection(), entity_id)
+                    sesion.commit()
+            calculadas[shard] = len(pendientes)
+            logger.info(f"Backfill green score [{shard}]: {len(pendientes)} entidades")
+        return calculadas
+    finally:
+        db.close()
+
+
+@celery_app.task(name="shards.mover_entidad")
+def mover_entidad(entity_id: str) -> dict:
+    """
+    Copiar los datos de una entidad al shard destino registrado en el
+    directorio y bloquearla; el corte se encadena con countdown hasta que
+    el bloqueo cubra el TTL del directorio (ver MoverEntidadService). Si
+    falla, la entidad vuelve a activo en el origen con el error registrado.
+    """
+    db = SessionLocal()
+    try:
+        service = MoverEntidadService(db, UUID(entity_id))
+        origen = service.fila.shard
+        copiadas, desde = service.copiar()
+        cortar_entidad.apply_async(
+            args=[entity_id, origen, desde.isoformat() if desde else None],
+            countdown=service.espera_corte(),
+            queue="importaciones",
+        )
+        return copiadas
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error moviendo entidad {entity_id}: {e}", exc_info=True)
+        ShardService(db).abortar_migracion(UUID(entity_id), str(e))
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, name="shards.cortar_entidad")
+def cortar_entidad(self, entity_id: str, origen: str, desde: Optional[str] = None) -> dict:
+    """
+    Corte de la migración: delta final y cambio de directorio al destino.
+    Si se ejecuta antes de que el bloqueo cubra el TTL del directorio se
+    reprograma por lo que falta; reentregada después del cambio solo
+    reprograma la limpieza del origen.
+    """
+    db = SessionLocal()
+    try:
+        service = MoverEntidadService(db, UUID(entity_id))
+        if service.fila.estado == "bloqueado":
+            espera = service.espera_corte()
+            if espera > 0:
+                raise self.retry(countdown=espera, max_retries=None)
+            copiadas = service.cortar(datetime.fromisoformat(desde) if desde else None)
+        elif service.fila.estado == "activo" and service.fila.shard != origen:
+            copiadas = {}
+        elif service.fila.estado == "activo":
+            logger.info(f"Corte de entidad {entity_id} omitido: migración abortada")
+            return {}
+        else:
+            raise ValueError(f"Entidad {entity_id} no está en corte")
+        limpiar_origen_entidad.apply_async(
+            args=[entity_id, origen], countdown=service.espera_limpieza(), queue="importaciones"
+        )
+        return copiadas
+    except Retry:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error en corte de entidad {entity_id}: {e}", exc_info=True)
+        ShardService(db).abortar_migracion(UUID(entity_id), str(e))
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, name="shards.limpiar_origen")
+def limpiar_origen_entidad(self, entity_id: str, origen: str) -> bool:
+    """
+    Borrar los datos de la entidad del shard origen una vez que ningún
+    proceso puede leerlo con el directorio viejo en caché.
+    """
+    db = SessionLocal()
+    try:
+        service = MoverEntidadService(db, UUID(entity_id))
+        espera = service.espera_limpieza() if service.fila else 0
+        if espera > 0:
+            raise self.retry(countdown=espera, max_retries=None)
+        return service.limpiar_origen(origen)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="analitica.refrescar")
+def refrescar_espejo_analitico(reconstruir: bool = False) -> dict:
+    """
+    Refrescar el espejo columnar de la analítica de cartera: delta por
+    updated_at (cada ANALITICA_REFRESCO_MINUTOS) o copia completa (diaria).
+    Si otro worker lo está actualizando, se omite.
+    """
+    if not settings.ANALITICA_HABILITADA:
+        return {"habilitada": False}
+
+    lock = get_redis().lock(LOCK_ESPEJO, timeout=LOCK_ESPEJO_TTL)
+    if not lock.acquire(blocking=False):
+        logger.info("Espejo analítico en actualización por otro worker")
+        return {"omitido": True}
+
+    db = SessionLocal()
+    try:
+        service = EspejoAnaliticoService(db)
+        return service.reconstruir() if reconstruir else service.refrescar()
+    finally:
+        db.close()
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Lock del espejo analítico expiró antes de terminar")
@@ -0,0 +1,200 @@
+"""
+KONTAX - Tasks Reportes: generación de reportes en worker Celery
+"""
+from sqlalchemy.exc import OperationalError
+from minio.error import S3Error
+from datetime import datetime
+import logging
+import tempfile
+
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.entity import Entity as EntityModel
+from app.models.portfolio_reporte import PortfolioReporte
+from app.models.reporte import Reporte as ReporteModel
+from app.integrations.minio_client import MinioClient
+from app.services.analitica_service import AnaliticaService, disponible as analitica_disponible
+from app.services.reporte_render import FORMATOS, ReporteRenderService, objeto_key
+from app.services.reporte_service import ReporteService, build_report, sumar_agregados
+from app.worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+# Prioridad por tipo (0-10, mayor = antes). Reportes livianos e interactivos
+# primero; IFRS / Ley REP son pesados y pueden esperar.
+PRIORIDAD_TIPO = {
+    "huella_carbono": 9,
+    "balance_ambiental": 9,
+    "esg": 6,
+    "dashboard_ods": 6,
+    "ifrs_s1": 3,
+    "ifrs_s2": 3,
+    "ley_rep": 3,
+}
+PRIORIDAD_PORTFOLIO = 1
+
+# Entidades por consulta agrupada en reportes portfolio
+LOTE_PORTFOLIO = 250
+
+
+def encolar_reporte(reporte: ReporteModel) -> None:
+    """Encolar generación de un reporte ya persistido en estado pendiente"""
+    generar_reporte.apply_async(
+        args=[str(reporte.id)],
+        queue="reportes",
+        priority=PRIORIDAD_TIPO.get(reporte.tipo, 5),
+    )
+
+
+@celery_app.task(bind=True, name="reportes.generar", max_retries=settings.REPORTES_MAX_RETRIES)
+def generar_reporte(self, reporte_id: str) -> None:
+    """
+    Generar data_json de un reporte.
+
+    Ciclo de vida Reporte.estado: pendiente → generando → completo | error.
+    Errores de conexión DB se reintentan con backoff; otros errores
+    marcan el reporte en estado error.
+    """
+    db = SessionLocal()
+    reporte = None
+    try:
+        reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
+        if not reporte or reporte.estado == "completo":
+            return
+
+        reporte.estado = "generando"
+        db.commit()
+
+        reporte.data_json = ReporteService(db).generar(reporte.entity_id, reporte.periodo, reporte.tipo)
+        reporte.estado = "completo"
+        reporte.completado_at = datetime.utcnow()
+        db.commit()
+    except OperationalError as e:
+        db.rollback()
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Reporte {reporte_id}: error DB, reintentando ({e})")
+            raise self.retry(exc=e, countdown=2 ** self.request.retries * 10)
+        _marcar_error(db, reporte_id, e)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error generando reporte {reporte_id}: {e}", exc_info=True)
+        _marcar_error(db, reporte_id, e)
+    else:
+        ReporteService(db).liberar_generacion(reporte_id)
+    finally:
+        db.close()
+
+
+def _marcar_error(db, reporte_id: str, exc: Exception) -> None:
+    """Dejar reporte en estado error con el mensaje"""
+    reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
+    if reporte:
+        reporte.estado = "error"
+        reporte.data_json = {"error": str(exc)}
+        db.commit()
+    ReporteService(db).liberar_generacion(reporte_id)
+
+
+@celery_app.task(bind=True, name="reportes.renderizar", max_retries=settings.REPORTES_MAX_RETRIES)
+def renderizar_reporte(self, reporte_id: str, formato: str) -> None:
+    """
+    Renderizar un reporte completo a PDF/XLSX y subirlo a MinIO.
+
+    El archivo se arma en un temporal en disco (no en memoria) y se sube
+    en partes S3 multipart al bucket MINIO_BUCKET_REPORTES.
+    """
+    db = SessionLocal()
+    try:
+        reporte = db.query(ReporteModel).filter(ReporteModel.id == reporte_id).first()
+        if not reporte or reporte.estado != "completo":
+            return
+
+        with tempfile.TemporaryFile() as tmp:
+            ReporteRenderService(db).render(reporte, formato, tmp)
+            tmp.seek(0)
+            MinioClient().subir_stream(
+                settings.MINIO_BUCKET_REPORTES,
+                objeto_key(reporte, formato),
+                tmp,
+                content_type=FORMATOS[formato],
+            )
+    except (OperationalError, S3Error) as e:
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Render {reporte_id}.{formato}: reintentando ({e})")
+            raise self.retry(exc=e, countdown=2 ** self.request.retries * 10)
+        logger.error(f"Error renderizando reporte {reporte_id}.{formato}: {e}")
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, name="reportes.portfolio", max_retries=settings.REPORTES_MAX_RETRIES)
+def generar_portfolio(self, portfolio_id: str) -> None:
+    """
+    Calcular reporte portfolio: todas las entidades activas de un período.
+
+    Una consulta agrupada por lote de LOTE_PORTFOLIO entidades;
+    entidades_procesadas se actualiza por lote para seguir el avance.
+    Si el job lo pide (usar_espejo) y el espejo está disponible se
+    responde desde el espejo columnar y se guarda su marca en
+    actualizado_al; si no, sobre Postgres.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(PortfolioReporte).filter(PortfolioReporte.id == portfolio_id).first()
+        if not job or job.estado == "completo":
+            return
+
+        entity_ids = [
+            row.id
+            for row in db.query(EntityModel.id)
+            .filter(EntityModel.estado == "activo")
+            .order_by(EntityModel.id)
+        ]
+        job.estado = "generando"
+        job.total_entidades = len(entity_ids)
+        job.entidades_procesadas = 0
+        db.commit()
+
+        if job.usar_espejo and analitica_disponible():
+            # Modo analítico: una consulta columnar, sin carga en Postgres
+            analitica = AnaliticaService()
+            resultados = analitica.agregar_portfolio(entity_ids, job.periodo)
+            job.actualizado_al = datetime.fromisoformat(analitica.actualizado_al)
+            job.entidades_procesadas = len(entity_ids)
+            db.commit()
+        else:
+            job.actualizado_al = None
+            service = ReporteService(db)
+            resultados = []
+            for i in range(0, len(entity_ids), LOTE_PORTFOLIO):
+                resultados.extend(service.agregar_portfolio(entity_ids[i:i + LOTE_PORTFOLIO], job.periodo))
+                job.entidades_procesadas = min(i + LOTE_PORTFOLIO, len(entity_ids))
+                db.commit()
+
+        resultados.sort(key=lambda r: r["rut"] or "")
+        job.resultados_json = resultados
+        job.resumen_json = build_report(job.tipo, sumar_agregados(resultados))
+        job.estado = "completo"
+        job.completado_at = datetime.utcnow()
+        db.commit()
+    except OperationalError as e:
+        db.rollback()
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries * 30)
+        _marcar_error_portfolio(db, portfolio_id, e)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error generando portfolio {portfolio_id}: {e}", exc_info=True)
+        _marcar_error_portfolio(db, portfolio_id, e)
+    finally:
+        db.close()
+
+
+def _marcar_error_portfolio(db, portfolio_id: str, exc: Exception) -> None:
+    """Dejar job portfolio en estado error"""
+    job = db.query(PortfolioReporte).filter(PortfolioReporte.id == portfolio_id).first()
+    if job:
+        job.estado = "error"
+        job.error = str(exc)[:500]
+        db.commit()
@@ -0,0 +1,73 @@
+"""
+KONTAX - Celery Worker
+
+Uso:
+    celery -A app.worker worker -Q reportes,importaciones -l info
+    celery -A app.worker beat -l info
+
+Cada hijo del prefork abre su pool: en el nodo del worker configurar
+DATABASE_PROCESOS_NODO = REPORTES_WORKER_CONCURRENCY.
+"""
+from celery import Celery
+from celery.schedules import crontab
+from kombu import Exchange, Queue
+
+from app.config import settings
+
+
+celery_app = Celery(
+    "kontax",
+    broker=settings.CELERY_BROKER_URL or settings.RABBITMQ_URL,
+    backend=settings.CELERY_RESULT_BACKEND or settings.REDIS_URL,
+    include=["app.tasks.reportes", "app.tasks.mantenimiento", "app.tasks.importaciones"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    timezone="America/Santiago",
+    # Cola reportes con prioridades (RabbitMQ x-max-priority)
+    task_queues=[
+        Queue(
+            "reportes",
+            Exchange("reportes"),
+            routing_key="reportes",
+            queue_arguments={"x-max-priority": 10},
+        ),
+        # Importaciones masivas aparte: no bloquean reportes interactivos
+        Queue("importaciones", Exchange("importaciones"), routing_key="importaciones"),
+    ],
+    task_default_queue="reportes",
+    task_default_priority=5,
+    # Un job a la vez por proceso, ack al terminar: un reinicio no pierde reportes
+    worker_concurrency=settings.REPORTES_WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Tareas periódicas
+    beat_schedule={
+        "particiones-asientos": {
+            "task": "mantenimiento.particiones",
+            "schedule": crontab(hour=3, minute=0),
+        },
+        # Componentes green score de entidades sin ellos (idempotente; correr
+        # también a mano tras desplegar: celery -A app.worker call green_score.backfill)
+        "green-score-backfill": {
+            "task": "green_score.backfill",
+            "schedule": crontab(hour=3, minute=30),
+        },
+        # Espejo analítico (no-op sin ANALITICA_HABILITADA); cola de cargas masivas
+        "analitica-refrescar": {
+            "task": "analitica.refrescar",
+            "schedule": settings.ANALITICA_REFRESCO_MINUTOS * 60,
+            "options": {"queue": "importaciones"},
+        },
+        "analitica-reconstruir": {
+            "task": "analitica.refrescar",
+            "schedule": crontab(hour=4, minute=0),
+            "kwargs": {"reconstruir": True},
+            "options": {"queue": "importaciones"},
+        },
+    },
+)
@@ -0,0 +1,37 @@
+"""
+CompressedJSON: JSON plano bajo el umbral, zlib sobre él, ida y vuelta sin pérdida
+"""
+from app.core.types import COMPRESS_MIN_BYTES, CompressedJSON
+
+tipo = CompressedJSON()
+
+
+def _ida_y_vuelta(valor):
+    guardado = tipo.process_bind_param(valor, None)
+    return guardado, tipo.process_result_value(guardado, None)
+
+
+def test_none():
+    assert tipo.process_bind_param(None, None) is None
+    assert tipo.process_result_value(None, None) is None
+
+
+def test_payload_chico_sin_comprimir():
+    valor = {"entity_id": "abc", "emisiones_tco2e": 1.5}
+    guardado, leido = _ida_y_vuelta(valor)
+    assert guardado[:1] == b"j"
+    assert leido == valor
+
+
+def test_payload_grande_comprimido():
+    valor = [{"entity_id": f"e{i}", "rut": "76.123.456-7", "emisiones_tco2e": i * 0.5} for i in range(500)]
+    guardado, leido = _ida_y_vuelta(valor)
+    assert guardado[:1] == b"z"
+    assert len(guardado) < COMPRESS_MIN_BYTES * 4
+    assert leido == valor
+
+
+def test_lee_memoryview():
+    # psycopg entrega bytea como memoryview
+    guardado = tipo.process_bind_param({"a": [1, 2, 3]}, None)
+    assert tipo.process_result_value(memoryview(guardado), None) == {"a": [1, 2, 3]}
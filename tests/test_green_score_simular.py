@@ -0,0 +1,91 @@
+"""
+Simulación de escenarios green score (matrices escenarios × segmentos)
+"""
+import pytest
+
+from app.services.green_score_service import VENTANA_TENDENCIA_MESES, calcular_score, simular_componentes
+
+
+def _segmento(categoria, subcategoria, cuenta_debe="", cuenta_haber="", **valores):
+    return {
+        "categoria": categoria,
+        "subcategoria": subcategoria,
+        "cuenta_debe": cuenta_debe,
+        "cuenta_haber": cuenta_haber,
+        **{k: 0.0 for k in ["asientos", "verdes", "transicion", "activos_clp", "pasivos_clp", "emisiones_tco2e"]},
+        **valores,
+    }
+
+
+SEGMENTOS = [
+    _segmento("combustible", "diesel", "5190", "2105", asientos=40, emisiones_tco2e=80.0),
+    _segmento("energia", "electricidad", "5190", "2105", asientos=40, verdes=10, transicion=10, emisiones_tco2e=20.0),
+    _segmento("inversion", "", "1595", "2630", asientos=20, verdes=20, activos_clp=500.0, pasivos_clp=1000.0),
+]
+
+BASE = {
+    "asientos": 100,
+    "verdes": 30,
+    "transicion": 10,
+    "activos_clp": 500.0,
+    "pasivos_clp": 1000.0,
+    "emisiones_tco2e": 100.0,
+    "tendencia_periodos": 12,
+    "tendencia_pendiente": 0.0,
+    "tendencia_relativa": 0.0,
+}
+
+
+def test_sin_ajustes_reproduce_base():
+    (comp,) = simular_componentes(BASE, SEGMENTOS, [{"ajustes": []}])
+    assert comp == BASE
+    assert calcular_score(comp)["green_score"] == calcular_score(BASE)["green_score"]
+
+
+def test_escala_emisiones_mueve_tendencia_y_no_montos():
+    (comp,) = simular_componentes(
+        BASE, SEGMENTOS, [{"ajustes": [{"categoria": "combustible", "subcategoria": "diesel", "escala": 0.7}]}]
+    )
+    # -30% de 80 tCO2e = -24 sobre 100: -24% repartido en la ventana
+    assert comp["emisiones_tco2e"] == pytest.approx(76.0)
+    assert comp["tendencia_relativa"] == pytest.approx(-0.24 / (VENTANA_TENDENCIA_MESES - 1))
+    assert comp["activos_clp"] == BASE["activos_clp"]
+    assert comp["pasivos_clp"] == BASE["pasivos_clp"]
+    base = calcular_score(BASE)["metricas"]["componentes_score"]
+    sim = calcular_score(comp)["metricas"]["componentes_score"]
+    assert sim["tendencia"] > base["tendencia"]
+    assert sim["inversion"] == base["inversion"]
+
+
+def test_escala_con_cuenta_ajusta_montos():
+    (comp,) = simular_componentes(BASE, SEGMENTOS, [{"ajustes": [{"cuenta": "1595", "escala": 2.0}]}])
+    assert comp["activos_clp"] == pytest.approx(1000.0)
+    assert comp["pasivos_clp"] == pytest.approx(2000.0)
+    assert comp["emisiones_tco2e"] == pytest.approx(100.0)
+
+
+def test_sin_tendencia_base_no_se_inventa():
+    base = {**BASE, "tendencia_periodos": 2, "tendencia_relativa": None}
+    (comp,) = simular_componentes(base, SEGMENTOS, [{"ajustes": [{"categoria": "combustible", "escala": 0.0}]}])
+    assert comp["tendencia_relativa"] is None
+    assert calcular_score(comp)["metricas"]["componentes_score"]["tendencia"] == 0
+
+
+def test_pct_verde_y_escenarios_independientes():
+    escenarios = [
+        {"ajustes": [{"categoria": "energia", "pct_verde": 0.5}]},
+        {"ajustes": [{"categoria": "energia", "pct_verde": 1.0}]},
+        {"ajustes": []},
+    ]
+    medio, todo, nada = simular_componentes(BASE, SEGMENTOS, escenarios)
+    # energía: 30 no verdes, de los que 10 son transición
+    assert (medio["verdes"], medio["transicion"]) == (45, 5)
+    assert (todo["verdes"], todo["transicion"]) == (60, 0)
+    assert (nada["verdes"], nada["transicion"]) == (30, 10)
+
+
+def test_ajustes_se_componen_sobre_el_mismo_segmento():
+    (comp,) = simular_componentes(
+        BASE, SEGMENTOS, [{"ajustes": [{"subcategoria": "diesel", "escala": 0.5}, {"categoria": "combustible", "escala": 0.5}]}]
+    )
+    assert comp["emisiones_tco2e"] == pytest.approx(40.0)
@@ -0,0 +1,85 @@
+"""
+Validación vectorizada de lotes de importación: tipado, rechazos y muestra de errores
+"""
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from app.services.importacion_service import COLUMNAS_STAGING, muestra_errores, validar_lote
+
+
+def _fila(**valores):
+    base = {
+        "fecha": "2026-03-15",
+        "tipo": "consumo_energia",
+        "categoria": "energia",
+        "descripcion": "Factura electricidad",
+        "cantidad_fisica": "100.5",
+        "unidad_fisica": "kWh",
+    }
+    base.update(valores)
+    return base
+
+
+def _lote(*filas):
+    columnas = sorted({c for fila in filas for c in fila})
+    return pa.RecordBatch.from_pydict(
+        {c: pa.array([fila.get(c) for fila in filas], pa.string()) for c in columnas}
+    )
+
+
+def test_fila_valida_tipada_en_orden_staging():
+    tabla, errores = validar_lote(_lote(_fila(alcance_gei="2", debe_monto="1e3", haber_cuenta=" 210501 ")))
+    assert tabla.schema.names == COLUMNAS_STAGING
+    (fila,) = tabla.to_pylist()
+    assert fila["fecha"] == datetime(2026, 3, 15)
+    assert fila["periodo"] == "2026-03"
+    assert fila["cantidad_fisica"] == 100.5
+    assert fila["debe_monto"] == 1000.0
+    assert fila["alcance_gei"] == 2
+    assert fila["haber_cuenta"] == "210501"
+    assert not any(mascara[0].as_py() for mascara in errores.values())
+
+
+@pytest.mark.parametrize("fecha", ["2026-03-15 10:30:00", "2026-03-15T10:30:00", "15-03-2026", "15/03/2026"])
+def test_formatos_de_fecha(fecha):
+    tabla, _ = validar_lote(_lote(_fila(fecha=fecha)))
+    assert tabla.column("periodo").to_pylist() == ["2026-03"]
+
+
+def test_rechazos_por_columna():
+    tabla, errores = validar_lote(
+        _lote(
+            _fila(),
+            _fila(descripcion="  "),
+            _fila(cantidad_fisica="cien"),
+            _fila(alcance_gei="4"),
+            _fila(fecha="2026/13/45"),
+            _fila(debe_monto="1.000,5"),
+        )
+    )
+    assert tabla.num_rows == 1
+    assert errores["descripcion"].to_pylist() == [False, True, False, False, False, False]
+    assert errores["cantidad_fisica"].to_pylist() == [False, False, True, False, False, False]
+    assert errores["alcance_gei"].to_pylist() == [False, False, False, True, False, False]
+    assert errores["fecha"].to_pylist() == [False, False, False, False, True, False]
+    assert errores["debe_monto"].to_pylist() == [False, False, False, False, False, True]
+
+
+def test_opcional_ausente_o_vacio_no_es_error():
+    tabla, errores = validar_lote(_lote(_fila(debe_monto=""), _fila()))
+    assert tabla.num_rows == 2
+    assert tabla.column("debe_monto").to_pylist() == [None, None]
+    assert errores["consumo_agua_m3"].to_pylist() == [False, False]
+
+
+def test_muestra_errores_numera_filas_del_archivo():
+    _, errores = validar_lote(_lote(_fila(), _fila(tipo=None, cantidad_fisica="x"), _fila(), _fila(alcance_gei="0")))
+    assert muestra_errores(errores, desde_fila=10, maximo=5) == [
+        {"fila": 12, "motivo": "columnas inválidas: tipo, cantidad_fisica"},
+        {"fila": 14, "motivo": "columnas inválidas: alcance_gei"},
+    ]
+    assert len(muestra_errores(errores, desde_fila=0, maximo=1)) == 1
+    assert muestra_errores(errores, desde_fila=0, maximo=0) == []
@@ -0,0 +1,45 @@
+"""
+Forma de sentencias SQL y detección de lentas y candidatos N+1 por request
+"""
+from app.config import settings
+from app.core.instrumentation import SQLStats, forma_sentencia
+
+
+def test_parametros_de_todos_los_estilos():
+    assert forma_sentencia("SELECT * FROM entities WHERE id = %(id_1)s") == "SELECT * FROM entities WHERE id = ?"
+    assert forma_sentencia("SELECT * FROM entities WHERE id = %s") == "SELECT * FROM entities WHERE id = ?"
+    assert forma_sentencia("SELECT * FROM entities WHERE id = $1") == "SELECT * FROM entities WHERE id = ?"
+    assert forma_sentencia("SELECT * FROM entities WHERE id = :id") == "SELECT * FROM entities WHERE id = ?"
+
+
+def test_literales_y_espacios():
+    forma = forma_sentencia("SELECT *\n  FROM asientos_verdes_p2026_03\n WHERE estado = 'it''s'  AND monto > 10.5")
+    assert forma == "SELECT * FROM asientos_verdes_p2026_03 WHERE estado = ? AND monto > ?"
+
+
+def test_listas_in_de_distinto_largo_tienen_la_misma_forma():
+    dos = forma_sentencia("SELECT * FROM factors WHERE id IN (%(id_1)s, %(id_2)s)")
+    cinco = forma_sentencia("SELECT * FROM factors WHERE id IN (%s, %s, %s, %s, %s)")
+    assert dos == cinco == "SELECT * FROM factors WHERE id IN (?, ...)"
+
+
+def test_candidatos_n1_desde_el_umbral(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_N1_UMBRAL", 3)
+    monkeypatch.setattr(settings, "SQL_SLOW_MS", 10_000)
+    stats = SQLStats()
+    for i in range(3):
+        stats.registrar(f"SELECT * FROM evidences WHERE id = '{i}'", 0.001)
+    for _ in range(2):
+        stats.registrar("SELECT * FROM entities WHERE id = %(id)s", 0.001)
+    assert stats.sentencias == 5
+    assert stats.candidatos_n1() == [("SELECT * FROM evidences WHERE id = ?", 3)]
+    assert stats.lentas == []
+
+
+def test_lentas_sobre_sql_slow_ms(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_SLOW_MS", 100)
+    stats = SQLStats()
+    stats.registrar("SELECT 1", 0.05)
+    stats.registrar("SELECT pg_sleep(%s)", 0.2)
+    assert stats.lentas == [("SELECT pg_sleep(?)", 0.2)]
+    assert stats.tiempo == 0.25
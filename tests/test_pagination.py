@@ -0,0 +1,82 @@
+"""
+Cursor opaco (fecha, id) y página keyset
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import Column, DateTime, MetaData, Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.pagination import decode_cursor, encode_cursor, keyset_page
+
+tabla = Table("items", MetaData(), Column("id", UUID(as_uuid=True)), Column("fecha", DateTime))
+
+
+class QueryStub:
+    """Stand-in de Query: registra filtros y devuelve las filas en orden"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.filtros = []
+        self.limite = None
+
+    def filter(self, condicion):
+        self.filtros.append(condicion)
+        return self
+
+    def order_by(self, *columnas):
+        return self
+
+    def limit(self, n):
+        self.limite = n
+        return self
+
+    def all(self):
+        return self.filas[:self.limite]
+
+
+def _filas(n):
+    inicio = datetime(2026, 3, 1)
+    return [SimpleNamespace(id=uuid4(), fecha=inicio - timedelta(hours=i)) for i in range(n)]
+
+
+def test_cursor_ida_y_vuelta():
+    fecha, id_ = datetime(2026, 3, 1, 12, 30, 15, 123456), uuid4()
+    cursor = encode_cursor(fecha, id_)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (fecha, id_)
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", encode_cursor(datetime(2026, 1, 1), uuid4())[:-4], "WzFd"])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError, match="Cursor inválido"):
+        decode_cursor(cursor)
+
+
+def test_pagina_con_siguiente():
+    filas = _filas(5)
+    query = QueryStub(filas)
+    items, siguiente = keyset_page(query, tabla.c.fecha, tabla.c.id, None, 3)
+    assert items == filas[:3]
+    assert query.limite == 4
+    assert query.filtros == []
+    assert decode_cursor(siguiente) == (filas[2].fecha, filas[2].id)
+
+
+def test_ultima_pagina_sin_cursor():
+    filas = _filas(3)
+    items, siguiente = keyset_page(QueryStub(filas), tabla.c.fecha, tabla.c.id, None, 3)
+    assert items == filas
+    assert siguiente is None
+
+
+def test_cursor_filtra_por_tupla():
+    fecha, id_ = datetime(2026, 3, 1), uuid4()
+    query = QueryStub(_filas(1))
+    keyset_page(query, tabla.c.fecha, tabla.c.id, encode_cursor(fecha, id_), 10)
+    (condicion,) = query.filtros
+    sql = str(condicion.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("(items.fecha, items.id) < (")
@@ -0,0 +1,55 @@
+"""
+Tamaño de pools: presupuesto del nodo repartido entre procesos y engines
+"""
+import pytest
+
+from app.config import settings
+from app.core.pool import MIN_CONEXIONES_ENGINE, engine_kwargs, tamano_pool
+
+
+@pytest.fixture
+def nodo(monkeypatch):
+    def configurar(conexiones, procesos, replicas=0, shards=0):
+        monkeypatch.setattr(settings, "DATABASE_CONEXIONES_NODO", conexiones)
+        monkeypatch.setattr(settings, "DATABASE_PROCESOS_NODO", procesos)
+        monkeypatch.setattr(settings, "DATABASE_REPLICA_URLS", [f"postgresql://replica{i}/kontax" for i in range(replicas)])
+        monkeypatch.setattr(settings, "DATABASE_SHARDS", {f"s{i}": f"postgresql://shard{i}/kontax" for i in range(shards)})
+    return configurar
+
+
+def test_solo_primario_reparte_entre_procesos(nodo):
+    nodo(60, 4)
+    assert tamano_pool() == (8, 7)
+
+
+@pytest.mark.parametrize("conexiones,procesos,replicas,shards", [(60, 4, 0, 0), (60, 4, 2, 0), (100, 3, 1, 2), (61, 2, 2, 1)])
+def test_total_del_nodo_no_pasa_el_presupuesto(nodo, conexiones, procesos, replicas, shards):
+    nodo(conexiones, procesos, replicas, shards)
+    pool_size, max_overflow = tamano_pool()
+    assert procesos * (1 + replicas + shards) * (pool_size + max_overflow) <= conexiones
+
+
+def test_replicas_y_shards_achican_cada_pool(nodo):
+    nodo(60, 2)
+    solo = sum(tamano_pool())
+    nodo(60, 2, replicas=1, shards=1)
+    assert sum(tamano_pool()) == solo // 3
+
+
+def test_minimo_por_engine(nodo):
+    nodo(10, 8, replicas=2)
+    assert sum(tamano_pool()) == MIN_CONEXIONES_ENGINE
+
+
+def test_procesos_desde_web_concurrency(nodo, monkeypatch):
+    nodo(60, None)
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert tamano_pool() == (10, 10)
+
+
+def test_pgbouncer_sin_pre_ping(nodo, monkeypatch):
+    nodo(60, 1)
+    monkeypatch.setattr(settings, "DATABASE_PGBOUNCER", True)
+    assert engine_kwargs()["pool_pre_ping"] is False
+    monkeypatch.setattr(settings, "DATABASE_PGBOUNCER", False)
+    assert engine_kwargs()["pool_pre_ping"] is True
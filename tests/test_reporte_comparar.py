@@ -0,0 +1,30 @@
+"""
+Períodos de comparación por defecto (anterior y mismo período del año anterior)
+"""
+import pytest
+
+from app.services.reporte_service import _delta, periodos_comparables
+
+
+@pytest.mark.parametrize("periodo,esperado", [
+    ("2026-05", ["2026-04", "2025-05"]),
+    ("2026-01", ["2025-12", "2025-01"]),
+    ("2026-Q3", ["2026-Q2", "2025-Q3"]),
+    ("2026-Q1", ["2025-Q4", "2025-Q1"]),
+    ("2026", ["2025"]),
+])
+def test_periodos_comparables(periodo, esperado):
+    assert periodos_comparables(periodo) == esperado
+
+
+def test_periodos_comparables_invalido():
+    with pytest.raises(ValueError):
+        periodos_comparables("2026-Q0")
+
+
+def test_delta():
+    assert _delta(12.0, 10.0) == {"actual": 12.0, "anterior": 10.0, "delta": 2.0, "delta_pct": 20.0}
+
+
+def test_delta_sin_anterior():
+    assert _delta(5.0, 0.0)["delta_pct"] is None
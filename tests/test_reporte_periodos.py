@@ -0,0 +1,49 @@
+"""
+Períodos de reportes: expansión a meses y suma de agregados parciales
+"""
+import pytest
+
+from app.services.reporte_service import AGREGADOS_KEYS, expandir_periodo, sumar_agregados
+
+
+def test_expandir_mes():
+    assert expandir_periodo("2026-03") == ["2026-03"]
+
+
+@pytest.mark.parametrize("periodo,meses", [
+    ("2026-Q1", ["2026-01", "2026-02", "2026-03"]),
+    ("2026-Q2", ["2026-04", "2026-05", "2026-06"]),
+    ("2026-Q4", ["2026-10", "2026-11", "2026-12"]),
+])
+def test_expandir_trimestre(periodo, meses):
+    assert expandir_periodo(periodo) == meses
+
+
+def test_expandir_anio():
+    meses = expandir_periodo("2025")
+    assert len(meses) == 12
+    assert meses[0] == "2025-01"
+    assert meses[-1] == "2025-12"
+
+
+@pytest.mark.parametrize("periodo", ["2026-13", "2026-00", "2026-Q5", "26-01", "2026-1", "", "2026-03-01"])
+def test_expandir_invalido(periodo):
+    with pytest.raises(ValueError):
+        expandir_periodo(periodo)
+
+
+def test_sumar_agregados():
+    total = sumar_agregados([
+        {"asientos": 2, "emisiones_tco2e": 1.5, "alcance_1_tco2e": 1.0},
+        {"asientos": 3, "emisiones_tco2e": 2.5, "energia_kwh": 10.0},
+    ])
+    assert total["asientos"] == 5
+    assert isinstance(total["asientos"], int)
+    assert total["emisiones_tco2e"] == 4.0
+    assert total["alcance_1_tco2e"] == 1.0
+    assert total["energia_kwh"] == 10.0
+    assert set(total) == set(AGREGADOS_KEYS)
+
+
+def test_sumar_agregados_vacio():
+    assert sumar_agregados([]) == {**dict.fromkeys(AGREGADOS_KEYS, 0.0), "asientos": 0}
@@ -0,0 +1,151 @@
+"""
+Render de reportes y subida a MinIO (cliente S3 reemplazado por un stand-in en memoria)
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+import io
+import tempfile
+
+import pytest
+from minio.error import S3Error
+
+from app.integrations import minio_client
+from app.integrations.minio_client import MinioClient
+from app.services.reporte_render import COLUMNAS_LIBRO, FORMATOS, ReporteRenderService, objeto_key
+
+
+class MinioStub:
+    """Stand-in de minio.Minio: buckets en memoria, multipart por partes"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.partes = {}
+
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self.buckets[bucket] = {}
+
+    def put_object(self, bucket, key, data, length, part_size, content_type):
+        assert length == -1, "subida de largo desconocido (multipart)"
+        partes = []
+        while True:
+            parte = data.read(part_size)
+            if not parte:
+                break
+            partes.append(parte)
+        self.buckets[bucket][key] = (b"".join(partes), content_type)
+        self.partes[(bucket, key)] = len(partes)
+
+    def stat_object(self, bucket, key):
+        if key not in self.buckets.get(bucket, {}):
+            raise S3Error(
+                response=None, code="NoSuchKey", message="no existe", resource=key, request_id="", host_id="",
+            )
+        return SimpleNamespace(size=len(self.buckets[bucket][key][0]))
+
+    def presigned_get_object(self, bucket, key, expires):
+        return f"http://minio.test/{bucket}/{key}?X-Amz-Expires={int(expires.total_seconds())}"
+
+
+def _reporte():
+    return SimpleNamespace(
+        id=uuid4(),
+        entity_id=uuid4(),
+        periodo="2026-Q1",
+        tipo="huella_carbono",
+        estado="completo",
+        data_json={"total_tco2e": 12.5, "alcance_1": {"total_tco2e": 4.0}},
+    )
+
+
+def _lineas(n):
+    inicio = datetime(2026, 1, 1)
+    return [
+        (inicio + timedelta(hours=i), "consumo_energia", "energia", f"Consumo {i}", 100.0, "kWh",
+         0.04, 2, "5190", 1000.0, "2105", 1000.0)
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def render(monkeypatch):
+    service = ReporteRenderService(db=None)
+    monkeypatch.setattr(service, "lineas_libro", lambda reporte: iter(_lineas(500)))
+    return service
+
+
+@pytest.fixture
+def minio(monkeypatch):
+    monkeypatch.setattr(minio_client, "Minio", lambda *args, **kwargs: MinioStub())
+    monkeypatch.setattr(minio_client, "PART_SIZE", 16 * 1024)
+    return MinioClient()
+
+
+def test_columnas_libro_coinciden_con_lineas():
+    assert len(_lineas(1)[0]) == len(COLUMNAS_LIBRO)
+
+
+def test_render_formato_invalido(render):
+    with pytest.raises(ValueError):
+        render.render(_reporte(), "docx", io.BytesIO())
+
+
+@pytest.mark.parametrize("formato,firma", [("pdf", b"%PDF"), ("xlsx", b"PK")])
+def test_render_subida_y_url(render, minio, formato, firma):
+    reporte = _reporte()
+    key = objeto_key(reporte, formato)
+
+    with tempfile.TemporaryFile() as tmp:
+        render.render(reporte, formato, tmp)
+        tmp.seek(0)
+        minio.subir_stream("kontax-reportes", key, tmp, content_type=FORMATOS[formato])
+
+    contenido, content_type = minio.client.buckets["kontax-reportes"][key]
+    assert contenido.startswith(firma)
+    assert content_type == FORMATOS[formato]
+    assert minio.existe("kontax-reportes", key)
+
+    url = minio.url_descarga("kontax-reportes", key, 15)
+    assert url.startswith(f"http://minio.test/kontax-reportes/{key}")
+    assert "X-Amz-Expires=900" in url
+
+
+def test_pdf_grande_sube_en_varias_partes(render, minio, monkeypatch):
+    monkeypatch.setattr(render, "lineas_libro", lambda reporte: iter(_lineas(5000)))
+    reporte = _reporte()
+    key = objeto_key(reporte, "pdf")
+
+    with tempfile.TemporaryFile() as tmp:
+        render.render(reporte, "pdf", tmp)
+        tmp.seek(0)
+        minio.subir_stream("kontax-reportes", key, tmp, content_type=FORMATOS["pdf"])
+
+    assert minio.client.partes[("kontax-reportes", key)] > 1
+
+
+def test_existe_objeto_faltante(minio):
+    minio.client.make_bucket("kontax-reportes")
+    assert not minio.existe("kontax-reportes", "no/existe.pdf")
+
+
+def test_pdf_legible_pagina_a_pagina(render, monkeypatch):
+    pypdf = pytest.importorskip("pypdf")
+    lineas = _lineas(100)
+    lineas[0] = lineas[0][:3] + ("Año (base) \\ ñandú\r\nok",) + lineas[0][4:]
+    monkeypatch.setattr(render, "lineas_libro", lambda reporte: iter(lineas))
+
+    out = io.BytesIO()
+    render.render(_reporte(), "pdf", out)
+    out.seek(0)
+    pdf = pypdf.PdfReader(out, strict=True)
+
+    # Portada + 100 filas a 48 por página
+    assert len(pdf.pages) == 1 + 3
+    assert pdf.metadata.title == "KONTAX huella_carbono 2026-Q1"
+    assert "alcance_1.total_tco2e: 4.0" in pdf.pages[0].extract_text()
+    libro = pdf.pages[1].extract_text()
+    assert "Descripción" in libro
+    assert "Año (base) \\ ñ" in libro
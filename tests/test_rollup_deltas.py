@@ -0,0 +1,111 @@
+"""
+Deltas con signo de rollup y componentes green score desde asientos cambiados
+"""
+from uuid import uuid4
+
+import pytest
+
+from app.services.green_score_service import clave_segmento, medidas_componentes
+from app.services.rollup_service import ATRIBUTOS, clave_rollup, medidas_rollup, sumar_deltas
+
+ENTIDAD = uuid4()
+
+
+def _asiento(**valores):
+    base = dict.fromkeys(ATRIBUTOS)
+    base.update(
+        entity_id=ENTIDAD,
+        periodo="2026-03",
+        estado="confirmado",
+        categoria="energia",
+        tipo="consumo_energia",
+        cantidad_fisica=100.0,
+        emisiones_tco2e=2.0,
+        debe_cuenta="519001",
+        debe_monto=1000.0,
+        haber_cuenta="210501",
+        haber_monto=1000.0,
+    )
+    base.update(valores)
+    return base
+
+
+def test_alta_suma_una_fila():
+    deltas = sumar_deltas([(1, _asiento())], clave_rollup, medidas_rollup)
+    ((clave, medidas),) = deltas.items()
+    assert clave == (ENTIDAD, "2026-03", "confirmado", "energia", 0, "5190", "2105")
+    assert medidas["asientos"] == 1
+    assert medidas["energia_kwh"] == 100.0
+    assert medidas["emisiones_tco2e"] == 2.0
+
+
+def test_edicion_sin_cambios_agregados_no_genera_deltas():
+    asiento = _asiento()
+    assert sumar_deltas([(-1, asiento), (1, dict(asiento))], clave_rollup, medidas_rollup) == {}
+
+
+def test_cambio_de_estado_mueve_entre_claves():
+    antes, despues = _asiento(), _asiento(estado="validado")
+    deltas = sumar_deltas([(-1, antes), (1, despues)], clave_rollup, medidas_rollup)
+    assert deltas[clave_rollup(antes)]["asientos"] == -1
+    assert deltas[clave_rollup(despues)]["asientos"] == 1
+    assert deltas[clave_rollup(despues)]["debe_monto"] == 1000.0
+
+
+def test_edicion_de_medida_aplica_diferencia():
+    deltas = sumar_deltas(
+        [(-1, _asiento(emisiones_tco2e=2.0)), (1, _asiento(emisiones_tco2e=5.0))], clave_rollup, medidas_rollup
+    )
+    ((medidas),) = deltas.values()
+    assert medidas["asientos"] == 0
+    assert medidas["emisiones_tco2e"] == pytest.approx(3.0)
+
+
+def test_valores_nulos_como_en_rollup_columns():
+    v = _asiento(estado=None, alcance_gei=None, debe_cuenta=None, tipo="transporte", emisiones_tco2e=None)
+    assert clave_rollup(v)[2:] == ("", "energia", 0, "", "2105")
+    medidas = medidas_rollup(v)
+    assert medidas["energia_kwh"] == 0
+    assert medidas["emisiones_tco2e"] == 0
+
+
+def test_componentes_solo_de_validados():
+    cambios = [
+        (1, _asiento()),
+        (1, _asiento(estado="validado", taxonomia_clasificacion="verde", debe_cuenta="159501", haber_cuenta="263001")),
+    ]
+    deltas = sumar_deltas(cambios, clave_segmento, medidas_componentes)
+    ((clave, medidas),) = deltas.items()
+    assert clave == (ENTIDAD, "2026-03", "energia", "", "1595", "2630")
+    assert medidas == {
+        "asientos": 1,
+        "verdes": 1,
+        "transicion": 0,
+        "activos_clp": 1000.0,
+        "pasivos_clp": 1000.0,
+        "emisiones_tco2e": 2.0,
+    }
+
+
+def test_anular_validado_resta_componentes():
+    validado = _asiento(estado="validado", taxonomia_clasificacion="transicion")
+    deltas = sumar_deltas([(-1, validado), (1, {**validado, "estado": "anulado"})], clave_segmento, medidas_componentes)
+    ((medidas),) = deltas.values()
+    assert medidas["asientos"] == -1
+    assert medidas["transicion"] == -1
+    assert medidas["emisiones_tco2e"] == -2.0
+
+
+def test_deltas_desde_consulta_agrupada():
+    from sqlalchemy import create_engine, text
+
+    from app.services.rollup_service import deltas_consulta
+
+    with create_engine("sqlite://").connect() as connection:
+        query = text(
+            "SELECT 'a' AS entidad, '2026-03' AS periodo, 3 AS asientos, 1.5 AS emisiones_tco2e "
+            "UNION ALL SELECT 'a', '2026-04', 0, 0.0"
+        )
+        assert deltas_consulta(connection, query, 2) == {
+            ("a", "2026-03"): {"asientos": 3, "emisiones_tco2e": 1.5},
+        }